@@ -0,0 +1,43 @@
+"""
+Compare the installed json backends on history, events and results payloads.
+
+    python -m benchmarks.bench_codec
+"""
+import random
+import timeit
+
+from benchmarks.frames import block, history_body, response
+from vbet.utils import codec
+from vbet.utils.parser import Resource
+
+
+def payloads():
+    rng = random.Random(7)
+    return {
+        'history': response(1, Resource.HISTORY, history_body(rng, 5030, 10, 31)),
+        'events': response(2, Resource.EVENTS, [block(rng, 5030, 10, 31, False)]),
+        'results': response(3, Resource.RESULTS, [block(rng, 5030, 10, 31, True)]),
+    }
+
+
+def main(repeat: int = 5, number: int = 50):
+    samples = {name: codec.dumps_str(payload) for name, payload in payloads().items()}
+    for name, frame in samples.items():
+        print(f'{name} ({len(frame) / 1024:.1f} KiB)')
+        timings = {}
+        for backend in codec.available_backends():
+            codec.select_backend(backend)
+            data = codec.loads(frame)
+            decode = min(timeit.repeat(lambda: codec.loads(frame), repeat=repeat, number=number)) / number
+            encode = min(timeit.repeat(lambda: codec.dumps(data), repeat=repeat, number=number)) / number
+            timings[backend] = (decode, encode)
+        stdlib_decode, stdlib_encode = timings[codec.STDLIB]
+        for backend, (decode, encode) in timings.items():
+            print(f'  {backend:7} decode {decode * 1e6:9.1f} us ({stdlib_decode / decode:5.2f}x)  '
+                  f'encode {encode * 1e6:9.1f} us ({stdlib_encode / encode:5.2f}x)')
+    codec.select_backend()
+    print(f'selected backend: {codec.BACKEND}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the legacy resource dispatch (linear Resources scan + list.index + getattr) against the
+precomputed registry over a recorded frame stream.
+
+    python -m benchmarks.bench_dispatch
+"""
+import timeit
+from typing import Any, Dict, Optional, Tuple
+
+from benchmarks.frames import record_stream
+from vbet.utils.parser import bind_resource_callbacks, inspect_websocket_response, Resources
+
+
+def legacy_inspect_websocket_response(payload: Dict) -> Optional[Tuple[int, str, int, bool, Any]]:
+    res: Dict = payload.get('res', {})
+    xs: Optional[int] = payload.get('xs', None)
+    status_code: Optional[int] = res.get('statusCode', None)
+    valid_response: bool = res.get('validResponse', False)
+    resource: Optional[str] = res.get('resource', None)
+    body: Optional[Any] = res.get('body', None)
+    _resource: Optional[str] = None
+    for k, v in Resources.items():
+        if v == resource:
+            _resource = k
+            break
+    if _resource:
+        _resource = resource
+        return xs, _resource, status_code, valid_response, body
+
+
+def legacy_map_resource_to_name(resource: str):
+    return list(Resources.keys())[list(Resources.values()).index(resource)]
+
+
+class Target:
+    def __init__(self):
+        self.count = 0
+        self.callbacks = bind_resource_callbacks(self)
+
+    def events_callback(self, xs, valid_response, body):
+        self.count += 1
+
+    def results_callback(self, xs, valid_response, body):
+        self.count += 1
+
+    def history_callback(self, xs, valid_response, body):
+        self.count += 1
+
+
+def legacy_dispatch(target: Target, stream):
+    for frame in stream:
+        data = legacy_inspect_websocket_response(frame)
+        if isinstance(data, tuple):
+            (xs, resource, status_code, valid_response, body) = data
+            try:
+                callback = getattr(target, f'{legacy_map_resource_to_name(resource)}_callback')
+            except AttributeError:
+                pass
+            else:
+                callback(xs, resource, body)
+
+
+def registry_dispatch(target: Target, stream):
+    callbacks = target.callbacks
+    for frame in stream:
+        data = inspect_websocket_response(frame)
+        if isinstance(data, tuple):
+            (xs, resource, status_code, valid_response, body) = data
+            callback = callbacks.get(resource, None)
+            if callback is not None:
+                callback(xs, resource, body)
+
+
+def main(frames: int = 5000, repeat: int = 5, number: int = 20):
+    stream = record_stream(frames)
+    legacy_target, registry_target = Target(), Target()
+    legacy_dispatch(legacy_target, stream)
+    registry_dispatch(registry_target, stream)
+    assert legacy_target.count == registry_target.count
+
+    legacy = min(timeit.repeat(lambda: legacy_dispatch(legacy_target, stream), repeat=repeat, number=number))
+    registry = min(timeit.repeat(lambda: registry_dispatch(registry_target, stream), repeat=repeat, number=number))
+    total = frames * number
+    print(f'frames={frames} x {number}')
+    print(f'legacy   : {legacy / total * 1e9:8.1f} ns/frame')
+    print(f'registry : {registry / total * 1e9:8.1f} ns/frame  ({legacy / registry:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
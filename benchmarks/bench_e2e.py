@@ -0,0 +1,205 @@
+"""
+End to end load test of live users playing against the local provider simulator. For each user count it reports
+percentiles of the time from UserManager.create_user to the first /tickets/send frame, the time from a results
+response to the next events request of the same competition, and how many tickets missed their block.
+
+    python -m benchmarks.bench_e2e --users 1 10 100 500 --output bench_e2e.json
+
+Latencies are measured where the simulator sees the frames, so they include the local round trip.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import vbet
+from vbet.core import settings
+
+# Set before the game modules are imported, the provider url is resolved at import time
+settings.API_NAME = settings.SIMULATOR
+settings.LOG_LEVEL = 'WARNING'
+settings.FILE_LOG_LEVEL = 'WARNING'
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+
+    def rank(q: float) -> Optional[float]:
+        if not values:
+            return None
+        return round(values[min(len(values) - 1, math.ceil(q * len(values)) - 1)], 4)
+
+    return {'count': len(values), 'p50': rank(0.5), 'p90': rank(0.9), 'p99': rank(0.99),
+            'max': round(values[-1], 4) if values else None}
+
+
+def configure(port: int, data_dir: str):
+    settings.SIMULATOR_PORT = port
+    settings.WSS_URL = f'ws://{settings.SIMULATOR_HOST}:{port}/vs'
+    settings.TMP_DIR = data_dir
+    settings.DATA_DIR = f'{data_dir}/data'
+    settings.CACHE_DIR = f'{data_dir}/cache'
+    for game in settings.LIVE_GAMES:
+        os.makedirs(f'{settings.CACHE_DIR}/{game}', exist_ok=True)
+    os.makedirs(settings.DATA_DIR, exist_ok=True)
+
+
+def create_simulator(*args, **kwargs):
+    from vbet.simulator.server import ProviderSimulator
+    from vbet.utils.parser import Resource
+
+    class TracedSimulator(ProviderSimulator):
+        """
+        Simulator recording when each unit sends its first ticket and how long competitions take to ask for the
+        next block once they have the results.
+        """
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.first_ticket: Dict[str, float] = {}
+            self.results_sent: Dict[Tuple[str, int], float] = {}
+            self.result_gaps: List[float] = []
+            self.ticket_errors: Dict[int, int] = {}
+            self.tickets_accepted: int = 0
+
+        async def login(self, session: Dict, query: Dict) -> Tuple[bool, Any]:
+            session['hash'] = query.get('onlineHash', None)
+            return await super().login(session, query)
+
+        async def tickets(self, session: Dict, body: Dict) -> Tuple[bool, Any]:
+            valid_response, response = await super().tickets(session, body)
+            if valid_response:
+                self.tickets_accepted += 1
+            else:
+                error_code = response.get('errorCode')
+                self.ticket_errors[error_code] = self.ticket_errors.get(error_code, 0) + 1
+            return valid_response, response
+
+        async def respond(self, websocket, session: Dict, frame: Dict):
+            request = frame.get('req')
+            resource = request.get('resource')
+            online_hash = session.get('hash', None)
+            received = time.perf_counter()
+            if resource == Resource.TICKETS:
+                self.first_ticket.setdefault(online_hash, received)
+            elif resource == Resource.EVENTS:
+                key = (online_hash, (request.get('query') or {}).get('contentId'))
+                sent = self.results_sent.pop(key, None)
+                if sent is not None:
+                    self.result_gaps.append(received - sent)
+            await super().respond(websocket, session, frame)
+            if resource == Resource.RESULTS:
+                key = (online_hash, (request.get('query') or {}).get('contentId'))
+                self.results_sent[key] = time.perf_counter()
+
+    return TracedSimulator(*args, **kwargs)
+
+
+async def run(users: int, games: List[int], duration: float, block_time: float, seed: int,
+              latency: Tuple[float, float]) -> Dict:
+    import aiohttp
+    from vbet.core.user_manager import UserManager
+    from vbet.game.league_cache import league_cache
+
+    simulator = create_simulator(settings.SIMULATOR_HOST, settings.SIMULATOR_PORT, seed, block_time, True,
+                                 latency=latency, credit=10 ** 9)
+    await simulator.start()
+    manager = UserManager(None)
+    manager.users.clear()
+    created: Dict[str, float] = {}
+    start = time.perf_counter()
+    for index in range(1, users + 1):
+        # The simulator login hash is simulator-{unit_id}
+        created[f'simulator-{index}'] = time.perf_counter()
+        manager.create_user(f'bench{index}', {'games': list(games), 'http': aiohttp.ClientSession(),
+                                              'token': 'simulator', 'unit_id': index, 'demo': False})
+    setup_time = time.perf_counter() - start
+    await asyncio.sleep(duration)
+
+    window = {'sent': 0, 'dropped': 0, 'missed': 0}
+    for user in manager.users.values():
+        for game_id in games:
+            for key, value in user.ticket_manager.get_window_stats(game_id).items():
+                window[key] += value
+    first_ticket = [simulator.first_ticket[online_hash] - created_time
+                    for online_hash, created_time in created.items() if online_hash in simulator.first_ticket]
+    missed = window['dropped'] + window['missed']
+    report = {
+        'users': users,
+        'playlists': len(games),
+        'competitions': users * len(games),
+        'duration': duration,
+        'create_users': round(setup_time, 4),
+        'time_to_first_ticket': percentiles(first_ticket),
+        'users_without_ticket': users - len(first_ticket),
+        'result_to_next_events': percentiles(simulator.result_gaps),
+        'tickets': {'accepted': simulator.tickets_accepted, 'errors': simulator.ticket_errors, **window},
+        'missed_ratio': round(missed / max(1, window['sent'] + window['dropped']), 4)
+    }
+
+    await asyncio.wait([asyncio.ensure_future(user.exit()) for user in manager.users.values()], timeout=30)
+    # Every run starts cold, nothing is shared with the next user count
+    league_cache.leagues.clear()
+    await simulator.close()
+    return report
+
+
+def print_report(report: Dict):
+    def row(name: str, stats: Dict):
+        values = ' '.join(f'{key} {"-" if stats[key] is None else stats[key]:>8}' for key in ['p50', 'p90', 'p99'])
+        print(f'  {name:<24}{values}  (n={stats["count"]})')
+
+    print(f'{report["users"]} users x {report["playlists"]} playlists ({report["competitions"]} competitions)')
+    row('time to first ticket s', report['time_to_first_ticket'])
+    row('result to next events s', report['result_to_next_events'])
+    tickets = report['tickets']
+    print(f'  tickets sent {tickets["sent"]} accepted {tickets["accepted"]} dropped {tickets["dropped"]} '
+          f'missed {tickets["missed"]} errors {tickets["errors"]} missed ratio {report["missed_ratio"]}')
+
+
+def main(args: List[str]):
+    arg_parser = argparse.ArgumentParser(description='End to end benchmark against the provider simulator')
+    arg_parser.add_argument('-u', '--users', default=[1, 10, 100, 500], nargs='+', type=int,
+                            help='User counts to run. Default 1 10 100 500')
+    arg_parser.add_argument('-g', '--games', default=settings.LIVE_GAMES, nargs='+', type=int,
+                            help='Playlists per user. Default all live games')
+    arg_parser.add_argument('-d', '--duration', default=60, type=float, help='Seconds per run. Default 60')
+    arg_parser.add_argument('-b', '--block-time', default=5, type=float, help='Seconds per block. Default 5')
+    arg_parser.add_argument('-l', '--latency', default=[0, 0], nargs=2, type=float, metavar=('MIN', 'MAX'),
+                            help='Simulator response latency range in seconds. Default 0 0')
+    arg_parser.add_argument('-s', '--seed', default=0, type=int, help='League seed. Default 0')
+    arg_parser.add_argument('-p', '--port', default=settings.SIMULATOR_PORT, type=int,
+                            help=f'Simulator port. Default {settings.SIMULATOR_PORT}')
+    arg_parser.add_argument('-m', '--max-missed', default=0.01, type=float,
+                            help='Missed ticket ratio a user count is sustained under. Default 0.01')
+    arg_parser.add_argument('-o', '--output', default='bench_e2e.json', help='Json report. Default bench_e2e.json')
+    args = arg_parser.parse_args(args)
+    logging.basicConfig(level=logging.WARNING)
+
+    reports = []
+    with tempfile.TemporaryDirectory(prefix='vbet-bench-') as data_dir:
+        for users in args.users:
+            configure(args.port, f'{data_dir}/{users}')
+            report = asyncio.run(run(users, args.games, args.duration, args.block_time, args.seed,
+                                     tuple(args.latency)))
+            print_report(report)
+            reports.append(report)
+
+    # Largest user count whose tickets still made their block
+    sustained = max([report['users'] for report in reports if report['missed_ratio'] <= args.max_missed], default=0)
+    print(f'sustained {sustained} users x {len(args.games)} playlists')
+
+    with open(args.output, 'w') as fp:
+        json.dump({'version': vbet.__VERSION__, 'time': int(time.time()), 'block_time': args.block_time,
+                   'latency': args.latency, 'seed': args.seed, 'max_missed': args.max_missed,
+                   'sustained_users': sustained, 'runs': reports}, fp, indent=2)
+    print(f'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
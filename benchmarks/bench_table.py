@@ -0,0 +1,123 @@
+"""
+Replay a full 38 week season through LeagueTable.feed_result and compare the incremental standings with the
+legacy full recompute, and the dict storage against the compact array backend (speed and retained memory).
+
+    python -m benchmarks.bench_table
+"""
+import timeit
+import tracemalloc
+from operator import itemgetter
+
+from benchmarks.frames import season
+from vbet.game.table import CompactLeagueTable, LeagueTable
+
+
+class LegacyLeagueTable(LeagueTable):
+    def parse_week(self, week, week_data):
+        for event in week_data.values():
+            team_a = event.get('A')
+            team_b = event.get('B')
+            score = event.get('score')
+            t = self.raw_table.get(team_a, {})
+            s = self.raw_table.get(team_b, {})
+            home = score[0]
+            away = score[1]
+            if home == away:
+                x, y = 1, 1
+            elif home > away:
+                x, y = 3, 0
+            else:
+                x, y = 0, 3
+            t[week] = [x, home, away, team_b, 0]
+            s[week] = [y, away, home, team_a, 1]
+            self.raw_table[team_a] = t
+            self.raw_table[team_b] = s
+
+    def get_league_table(self):
+        _table = {}
+        for team, team_data in self.raw_table.items():
+            points, gf, ga, won, lost, draw, streak = 0, 0, 0, 0, 0, 0, []
+            for week, week_data in sorted(team_data.items(), key=itemgetter(0)):
+                p = week_data[0]
+                points += p
+                streak.append(p)
+                gf += week_data[1]
+                ga += week_data[2]
+                if p == 3:
+                    won += 1
+                elif p == 1:
+                    draw += 1
+                else:
+                    lost += 1
+            _table[team] = {'team': team, 'pos': 0, 'points': points, 'won': won, 'draw': draw, 'lost': lost,
+                            'gf': gf, 'ga': ga, 'gd': gf - ga, 'streak': streak}
+        data = [_ for _ in _table.values()]
+        i = 0
+        while i < len(data):
+            o = 0
+            while o < len(data):
+                data_1, data_2 = data[i], data[o]
+                if data_2['points'] < data_1['points']:
+                    data[i], data[o] = data_2, data_1
+                elif data_1['points'] == data_2['points'] and data_2['gd'] > data_1['gd']:
+                    data[i], data[o] = data_2, data_1
+                o += 1
+            i += 1
+        for pos, team_data in enumerate(data):
+            team_data['pos'] = pos + 1
+        self.ready_table = {td.get('team'): td for td in data}
+        self._table = data
+
+
+def replay(table_cls, season_data):
+    table = table_cls(38)
+    table.on_event(1, 38)
+    for week in season_data:
+        table.feed_result(week['e_block_id'], 1, week['week'], week['results'], week['results_ids'],
+                          week['winning_ids'])
+    return table
+
+
+def retained_memory(table_cls, season_data, tables: int = 50) -> float:
+    """
+    Bytes retained per table, the pools handed to feed_result are released so only what the table keeps counts.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [replay(table_cls, season()) for _ in range(tables)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / tables
+
+
+def main(repeat: int = 5, number: int = 20):
+    season_data = season()
+    legacy, incremental = replay(LegacyLeagueTable, season_data), replay(LeagueTable, season_data)
+    compact = replay(CompactLeagueTable, season_data)
+    for team, team_data in legacy.ready_table.items():
+        assert team_data['points'] == incremental.ready_table[team]['points'] == compact.ready_table[team]['points']
+        assert team_data['streak'] == incremental.ready_table[team]['streak'] == compact.ready_table[team]['streak']
+
+    print(f'season replay 38 weeks x {number}')
+    results = {}
+    for name, table_cls in (('legacy', LegacyLeagueTable), ('incremental', LeagueTable),
+                            ('compact', CompactLeagueTable)):
+        results[name] = min(timeit.repeat(lambda: replay(table_cls, season_data), repeat=repeat,
+                                          number=number)) / number
+    for name, elapsed in results.items():
+        print(f'  {name:12} {elapsed * 1e3:8.2f} ms/season ({results["legacy"] / elapsed:5.2f}x)')
+
+    print('retained memory per season table')
+    for name, table_cls in (('dict', LeagueTable), ('compact', CompactLeagueTable)):
+        print(f'  {name:12} {retained_memory(table_cls, season_data) / 1024:8.1f} KiB')
+
+    print('accessors x 1000')
+    for name, table in (('dict', incremental), ('compact', compact)):
+        elapsed = timeit.timeit(lambda: (table.get_raw_team_data('ARS'), table.get_last_matches('ARS'),
+                                         table.get_week_results(20)), number=1000) / 1000
+        print(f'  {name:12} {elapsed * 1e6:8.1f} us')
+
+
+if __name__ == '__main__':
+    main()
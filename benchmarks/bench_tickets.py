@@ -0,0 +1,95 @@
+"""
+Load test the TicketManager scheduling path with thousands of tickets and compare one tick of the legacy
+ticket_scanner/poll_ticket walk with the status indexed scheduler.
+
+    python -m benchmarks.bench_tickets
+"""
+import asyncio
+import random
+import time
+import timeit
+
+from vbet.game.tickets import Ticket, TicketManager
+
+
+class LoadUser:
+    username = 'bench'
+    competition_align = False
+    game_map = []
+
+
+def legacy_tick(manager: TicketManager, credit: float, queued: list):
+    # Body of the removed ticket_scanner loop followed by the legacy poll_ticket
+    for competition_tickets in manager.active_tickets.values():
+        for ticket in competition_tickets.values():
+            if ticket.status == Ticket.ERROR_CREDIT and credit > ticket.stake:
+                pass
+            if ticket.status == Ticket.VOID or (ticket.status == Ticket.SUCCESS and ticket.resolved):
+                pass
+    for competition_tickets in manager.active_tickets.values():
+        for ticket in competition_tickets.values():
+            if ticket.status == Ticket.READY or ticket.status == Ticket.FAILED:
+                if len(queued) < 50:
+                    queued.append(ticket)
+
+
+async def load(count: int, games: int, blocked: int, ready: int):
+    manager = TicketManager(LoadUser())
+    manager.ticket_sender_future.cancel()
+    rng = random.Random(3)
+    tickets = []
+    start = time.perf_counter()
+    for i in range(count):
+        ticket = Ticket(14000 + i % games, 'ozil')
+        ticket.stake = rng.randint(5, 500)
+        manager.register_ticket(ticket)
+        await manager.add_tickets([ticket])
+        tickets.append(ticket)
+    add_time = time.perf_counter() - start
+    # Drain the queue and settle most tickets as sent/succeeded
+    while not manager.ticket_queue.empty():
+        manager.ticket_queue.get_nowait()
+    for ticket in tickets[ready + blocked:]:
+        ticket.status = Ticket.SUCCESS
+    for ticket in tickets[ready:ready + blocked]:
+        ticket.status = Ticket.ERROR_CREDIT
+    for ticket in tickets[:ready]:
+        ticket.status = Ticket.FAILED
+    await asyncio.sleep(0)
+    return manager, add_time
+
+
+def main(count: int = 5000, games: int = 10, blocked: int = 50, ready: int = 50, number: int = 200):
+    async def run():
+        manager, add_time = await load(count, games, blocked, ready)
+        print(f'{count} tickets over {games} competitions ({ready} retrying, {blocked} credit blocked)')
+        print(f'  add_tickets       {add_time / count * 1e6:8.2f} us/ticket')
+
+        legacy = min(timeit.repeat(lambda: legacy_tick(manager, 100, []), repeat=5, number=number)) / number
+
+        async def poll():
+            await manager.poll_ticket()
+            while not manager.ticket_queue.empty():
+                manager.ticket_queue.get_nowait()
+
+        start = time.perf_counter()
+        for _ in range(number):
+            await poll()
+            for ticket in list(manager.status_index.get(Ticket.WAITING, ())):
+                ticket.status = Ticket.FAILED
+        indexed = (time.perf_counter() - start) / number
+
+        start = time.perf_counter()
+        for _ in range(number):
+            manager.on_credit(0)
+        credit = (time.perf_counter() - start) / number
+        print(f'  legacy tick       {legacy * 1e6:8.1f} us (runs every second, idle or not)')
+        print(f'  indexed poll      {indexed * 1e6:8.1f} us (runs on status changes only) {legacy / indexed:5.1f}x')
+        print(f'  credit wake       {credit * 1e6:8.1f} us (visits {blocked} blocked tickets)')
+        manager.exit()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
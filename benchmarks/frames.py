@@ -0,0 +1,117 @@
+"""
+Synthetic provider frames shaped like the responses recorded from the live websocket.
+"""
+import random
+import time
+from typing import Dict, List
+
+from vbet.utils.parser import Resource
+
+TEAMS = ['ARS', 'AVL', 'BOU', 'BRI', 'BUR', 'CHE', 'CRY', 'EVE', 'LEE', 'LEI', 'LIV', 'MCI', 'MUN', 'NEW', 'NOR',
+         'SOU', 'TOT', 'WAT', 'WHU', 'WOL']
+
+ODD_COUNT = 187
+
+
+def participants(rng: random.Random, home: int, away: int) -> List[Dict]:
+    return [
+        {'id': 1000 + home, 'fifaCode': TEAMS[home], 'name': TEAMS[home], 'stats': {'form': rng.random()}},
+        {'id': 1000 + away, 'fifaCode': TEAMS[away], 'name': TEAMS[away], 'stats': {'form': rng.random()}}
+    ]
+
+
+def won_markets(home_goals: int, away_goals: int) -> List[str]:
+    scores = {(0, 0): 15, (1, 0): 16, (2, 0): 17, (0, 1): 22, (1, 1): 23, (2, 1): 24, (1, 2): 29, (2, 2): 30,
+              (3, 1): 25, (0, 2): 28, (3, 0): 18, (0, 3): 33, (3, 2): 31, (1, 3): 34, (2, 3): 35, (3, 3): 36}
+    won = [scores[(home_goals, away_goals)]]
+    won.append(0 if home_goals > away_goals else 1 if away_goals > home_goals else 2)
+    won.append(43 + min(home_goals + away_goals, 6))
+    won.append(51 if home_goals + away_goals > 1 else 50)
+    won.append(75 if home_goals and away_goals else 74)
+    return [str(_) for _ in won]
+
+
+def event(rng: random.Random, event_id: int, home: int, away: int, result: bool) -> Dict:
+    data = {
+        'participants': participants(rng, home, away),
+        'oddValues': [f'{rng.uniform(1.01, 40):.2f}' for _ in range(ODD_COUNT)],
+        'stats': {'lastResults': [[rng.randint(0, 4), rng.randint(0, 4)] for _ in range(5)]}
+    }
+    payload = {'eventId': event_id, 'data': data}
+    if result:
+        home_goals, away_goals = rng.randint(0, 3), rng.randint(0, 3)
+        payload['result'] = {
+            'wonMarkets': won_markets(home_goals, away_goals),
+            'data': {
+                'videoURL': f'https://video/{event_id}/{1000 + home}/{1000 + away}/x.mp4',
+                'halfLostMarkets': [], 'halfWonMarkets': [], 'refundMarkets': []
+            }
+        }
+    return payload
+
+
+def block(rng: random.Random, e_block_id: int, league: int, week: int, result: bool) -> Dict:
+    order = list(range(len(TEAMS)))
+    rng.shuffle(order)
+    events = []
+    for i in range(0, len(order), 2):
+        events.append(event(rng, e_block_id * 100 + i, order[i], order[i + 1], result))
+    return {'eBlockId': e_block_id, 'eventTime': int(time.time()),
+            'data': {'leagueId': league, 'matchDay': week}, 'events': events}
+
+
+def response(xs: int, resource: str, body) -> Dict:
+    return {'type': 'RESPONSE', 'xs': xs,
+            'res': {'statusCode': 200, 'validResponse': True, 'resource': resource, 'body': body}}
+
+
+def history_body(rng: random.Random, e_block_id: int, league: int, week: int, n: int = 10) -> List[Dict]:
+    return [block(rng, e_block_id - i, league, week - i, True) for i in range(min(n, week - 1), 0, -1)]
+
+
+def record_stream(count: int, seed: int = 1) -> List[Dict]:
+    """
+    Build a frame stream with the same resource mix a competition socket sees over a season.
+    """
+    rng = random.Random(seed)
+    stream = []
+    xs = 0
+    league, week, e_block_id = 10, 1, 5000
+    while len(stream) < count:
+        xs += 1
+        stream.append(response(xs, Resource.EVENTS, [block(rng, e_block_id, league, week, False)]))
+        xs += 1
+        stream.append(response(xs, Resource.SYNC, {'sessionStatus': {'credit': 1000, 'jackpots': []}}))
+        xs += 1
+        stream.append(response(xs, Resource.STATS, [{'eBlockId': e_block_id}]))
+        if week % 10 == 0:
+            xs += 1
+            stream.append(response(xs, Resource.HISTORY, history_body(rng, e_block_id, league, week)))
+        xs += 1
+        stream.append(response(xs, Resource.RESULTS, [block(rng, e_block_id, league, week, True)]))
+        week += 1
+        e_block_id += 1
+        if week > 38:
+            league, week = league + 1, 1
+    return stream[:count]
+
+
+def season(seed: int = 1, weeks: int = 38) -> List[Dict]:
+    """
+    Parsed week results in the shape LeagueTable.feed_result expects, one dict per week.
+    """
+    rng = random.Random(seed)
+    season_data = []
+    for week in range(1, weeks + 1):
+        order = list(range(len(TEAMS)))
+        rng.shuffle(order)
+        results, results_ids, winning_ids = {}, {}, {}
+        for i in range(0, len(order), 2):
+            event_id = week * 100 + i
+            score = (rng.randint(0, 4), rng.randint(0, 3))
+            results[event_id] = {'id': event_id, 'A': TEAMS[order[i]], 'B': TEAMS[order[i + 1]], 'score': score}
+            results_ids[event_id] = [int(_) for _ in won_markets(min(score[0], 3), min(score[1], 3))]
+            winning_ids[event_id] = {'half_lost': [], 'half_won': [], 'refund_stake': []}
+        season_data.append({'e_block_id': 5000 + week, 'week': week, 'results': results, 'results_ids': results_ids,
+                            'winning_ids': winning_ids})
+    return season_data
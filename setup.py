@@ -19,7 +19,8 @@ setuptools.setup(
     url="https://github.com/updatedennismwangi/vbet.git",
     packages=setuptools.find_packages(),
     install_requires=required,
-    scripts=['bin/vrun', 'bin/vshell'],
+    extras_require={'fast': ['orjson']},
+    scripts=['bin/vrun', 'bin/vshell', 'bin/vsim'],
     classifiers=[
         "Programming Language :: Python :: 3.8",
         "Operating System :: Unix",
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Dict
+
+from vbet.core import settings
+from vbet.game.competition import LeagueCompetition
+from vbet.game.league_cache import league_cache
+from vbet.game.socket import Request, Socket
+from vbet.simulator.server import ProviderSimulator
+from vbet.utils.parser import Resource
+
+
+def covered(anchors, block):
+    return any(1 <= anchor - block <= LeagueCompetition.HISTORY_SPAN for anchor in anchors)
+
+
+class TestHistoryPlan:
+    def test_plan_covers_missing_weeks(self):
+        missing = list(range(1, 31))
+        anchors = LeagueCompetition.plan_history(5030, 31, missing, {})
+        assert anchors == [5030, 5020, 5010]
+        assert all(covered(anchors, 5030 - (31 - week)) for week in missing)
+
+    def test_plan_uses_known_blocks(self):
+        # Weeks 1 - 20 cached, only the recent range is requested
+        blocks = {5000 + week: week for week in range(1, 21)}
+        assert LeagueCompetition.plan_history(5030, 30, [25, 29], blocks) == [5030]
+        assert LeagueCompetition.plan_history(5030, 30, [2], blocks) == [5010]
+
+
+def test_history_windows_leave_no_gap():
+    async def run():
+        simulator = ProviderSimulator(seed=3, start_week=35)
+        valid, blocks = await simulator.events({}, {'contentId': settings.PREMIER, 'n': 1})
+        e_block_id, week = blocks[0]['eBlockId'], blocks[0]['data']['matchDay']
+        missing = list(range(1, week))
+        windows = []
+        for anchor in LeagueCompetition.plan_history(e_block_id, week, missing, {}):
+            valid, history = await simulator.history({}, {'contentId': settings.PREMIER, 'eBlockId': anchor,
+                                                          'n': -LeagueCompetition.HISTORY_SPAN})
+            windows.append([item['data']['matchDay'] for item in history])
+        return missing, windows
+
+    missing, windows = asyncio.run(run())
+    for newer, older in zip(windows, windows[1:]):
+        assert older[0] == newer[-1] - 1
+    assert set(missing) <= {week for window in windows for week in window}
+
+
+class FakeUser:
+    username = 'test'
+
+    def __init__(self):
+        self.socket = Socket(self, 1)
+        self.socket.connected = True
+        self.socket.send_queue = asyncio.PriorityQueue(maxsize=1)
+
+    def request(self, game_id: int, resource: str, body: Dict) -> Request:
+        return self.socket.request(resource, body)
+
+
+def test_fetch_retries_when_send_queue_is_full():
+    async def run():
+        user = FakeUser()
+        competition = LeagueCompetition(user, settings.LALIGA)
+        responses = []
+
+        async def events_callback(xs, valid_response, body):
+            responses.append((xs in competition.event_xs, valid_response, body))
+
+        competition.callbacks[Resource.EVENTS] = events_callback
+        # Frame nobody writes, every request after it fails with queue full
+        user.socket.send(Resource.SYNC, {})
+        await competition._fetch(Resource.EVENTS, {'n': 1}, competition.event_xs, {'n': 1})
+        return user, responses
+
+    user, responses = asyncio.run(run())
+    # The first attempt and every retry were dropped, the callback retry logic gets the failure
+    assert user.socket.xs == 1 + settings.REQUEST_RETRIES
+    assert responses == [(True, False, None)]
+
+
+def test_lost_socket_releases_league_fetch():
+    async def run():
+        user = FakeUser()
+        fetcher, waiter = LeagueCompetition(user, settings.LALIGA), LeagueCompetition(user, settings.LALIGA)
+        for competition in (fetcher, waiter):
+            competition.subscribe_league(1)
+        league_data = fetcher.league_data
+        league_data.begin_fetch(fetcher)
+        fetcher.caching = True
+        user.socket.connected = False
+        await fetcher._fetch(Resource.HISTORY, {'n': -10}, fetcher.history_xs, {})
+        taken_over = league_data.fetched.is_set() and league_data.begin_fetch(waiter)
+        for competition in (fetcher, waiter):
+            league_cache.release(competition, competition.league_data)
+        return fetcher, taken_over
+
+    fetcher, taken_over = asyncio.run(run())
+    assert taken_over
+    assert not fetcher.caching and fetcher.history_xs == {}
@@ -0,0 +1,22 @@
+from vbet.game.markets import get_correct_score, get_market_info, MarketIndex, Markets
+from vbet.game.players.base import Player
+
+
+class TestMarketIndex:
+    def test_index_covers_all_markets(self):
+        assert len(MarketIndex) == sum(len(market_data) for market_data in Markets.values())
+
+    def test_correct_score(self):
+        assert get_correct_score(['0', '24', '45', '51']) == (2, 1)
+        assert get_correct_score(['42']) == (0, 6)
+        assert get_correct_score(['0', '51']) is None
+
+    def test_goal_lines(self):
+        assert get_market_info('51').goal_line == 1.5
+        assert get_market_info('237').goal_line == 1.75
+        assert get_market_info('46').goal_line == 3
+        assert get_market_info('0').goal_line is None
+
+    def test_player_market_info(self):
+        assert Player.get_market_info('195') == ('Handicap_Away_0_75', 'Home_Plus_0_75', 139)
+        assert Player.get_market_info('999') == (None, None, None)
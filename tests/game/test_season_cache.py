@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+from vbet.core import settings
+from vbet.game.season_cache import SeasonCache
+
+
+def test_week_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', str(tmp_path))
+    week_data = {
+        'e_block_id': 5031,
+        'matches': {701: {'A': 'ARS', 'B': 'CHE', 'odds': [1.5, 3.2], 'index': 0, 'participants': []}},
+        'results': {701: {'id': 701, 'A': 'ARS', 'B': 'CHE', 'score': (2, 1)}},
+        'results_ids': {701: [0, 24, 45]},
+        'winning_ids': {701: {'half_lost': [], 'half_won': [], 'refund_stake': []}}
+    }
+
+    async def run():
+        cache = SeasonCache(14036)
+        await cache.write_week(88, 4, week_data)
+        await cache.write_week(89, 1, {'e_block_id': 5040})
+        preloaded = SeasonCache(14036)
+        preloaded.preload()
+        return await preloaded.load(88)
+
+    weeks = asyncio.run(run())
+    assert weeks == {4: week_data}
+
+
+def test_shared_cache_preloads_and_writes_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(SeasonCache, 'shared_caches', {})
+
+    async def run():
+        cache = SeasonCache.shared(14036)
+        cache.preload()
+        preload_future = cache.preload_future
+        SeasonCache.shared(14036).preload()
+        # Competitions of one playlist storing the same week at once
+        await asyncio.gather(*[cache.write_week(88, 4, {'e_block_id': 5031, 'writer': writer}) for writer in range(3)])
+        return cache, preload_future, await SeasonCache(14036).read_league(88)
+
+    cache, preload_future, weeks = asyncio.run(run())
+    assert SeasonCache.shared(14036) is cache and cache.preload_future is preload_future
+    assert cache.pending_writes == {}
+    assert weeks[4]['e_block_id'] == 5031
+
+
+def test_prune_by_newest_week_and_skip_foreign_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'SEASON_CACHE_LEAGUES', 2)
+
+    async def run():
+        cache = SeasonCache(14036)
+        for league in (88, 89):
+            await cache.write_week(league, 1, {'e_block_id': league})
+        # League 88 was used last although its directory is the oldest
+        for league, mtime in ((88, 2000), (89, 1000)):
+            os.utime(f'{cache.directory}/{league}/1.json', (mtime, mtime))
+        os.utime(f'{cache.directory}/88', (500, 500))
+        os.utime(f'{cache.directory}/89', (900, 900))
+        (tmp_path / '14036' / '88' / 'notes.json').write_text('{}')
+        await cache.write_week(90, 1, {'e_block_id': 90})
+        return cache.get_leagues(), await cache.read_league(88), os.listdir(f'{cache.directory}/90')
+
+    leagues, weeks, files = asyncio.run(run())
+    assert leagues == [88, 90]
+    assert list(weeks) == [1]
+    # Nothing is left aside once the week is renamed in place
+    assert files == ['1.json']
@@ -0,0 +1,224 @@
+import asyncio
+
+import pytest
+import websockets
+
+from vbet.core import settings
+from vbet.game.socket import REQUEST_LATENCY, Socket
+from vbet.utils import exceptions
+from vbet.utils.metrics import registry
+from vbet.utils.parser import decode_json, encode_json, Resource
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, data):
+        self.sent.append(data)
+
+
+def make_socket() -> Socket:
+    socket = Socket(None, 14036)
+    socket.connected = True
+    socket._socket = FakeWebSocket()
+    return socket
+
+
+def response(xs: int, resource: str, body) -> str:
+    return encode_json({'xs': xs, 'res': {'statusCode': 200, 'validResponse': True, 'resource': resource,
+                                          'body': body}})
+
+
+def test_request_resolved_by_xs():
+    async def run():
+        socket = make_socket()
+        first = socket.request(Resource.EVENTS, {'n': 1})
+        second = socket.request(Resource.RESULTS, {'n': 1})
+        await socket.process_message(response(second.xs, Resource.RESULTS, [2]))
+        await socket.process_message(response(first.xs, Resource.EVENTS, [1]))
+        assert await first == (True, [1])
+        assert await second == (True, [2])
+        assert socket.requests == {}
+
+    asyncio.run(run())
+
+
+def test_large_frames_are_decoded_off_the_loop(monkeypatch):
+    decoded = []
+
+    async def decode_json_pool(message):
+        decoded.append(len(message))
+        return decode_json(message)
+
+    async def run():
+        monkeypatch.setattr('vbet.game.socket.decode_json_pool', decode_json_pool)
+        socket = make_socket()
+        small = socket.request(Resource.EVENTS, {'n': 1})
+        large = socket.request(Resource.EVENTS, {'n': 1})
+        message = response(small.xs, Resource.EVENTS, [1])
+        monkeypatch.setattr(settings, 'DECODE_OFFLOAD_SIZE', len(message))
+        await socket.process_message(message)
+        await socket.process_message(response(large.xs, Resource.EVENTS, ['x' * 100]))
+        return socket, await small, await large
+
+    socket, small, large = asyncio.run(run())
+    assert small == (True, [1]) and large == (True, ['x' * 100])
+    assert socket.messages == 2 and socket.offloaded_messages == 1 and len(decoded) == 1
+
+
+def test_request_latency_by_mode():
+    async def run():
+        socket = make_socket()
+        request = socket.request(Resource.EVENTS, {'n': 1})
+        await socket.process_message(response(request.xs, Resource.EVENTS, [1]))
+        await request
+
+    enabled = registry.enabled
+    registry.enabled = True
+    try:
+        REQUEST_LATENCY.reset()
+        asyncio.run(run())
+        assert REQUEST_LATENCY.get(('competition',)).count == 1
+        assert REQUEST_LATENCY.get(('ticket',)) is None
+    finally:
+        registry.enabled = enabled
+        REQUEST_LATENCY.reset()
+
+
+def test_request_timeout_and_close():
+    async def run():
+        socket = make_socket()
+        expired = socket.request(Resource.HISTORY, {'n': -10}, timeout=0.01)
+        with pytest.raises(exceptions.RequestTimeout):
+            await expired
+        pending = socket.request(Resource.EVENTS, {'n': 1})
+        socket.fail_requests()
+        with pytest.raises(exceptions.SocketClosed):
+            await pending
+        socket.connected = False
+        with pytest.raises(exceptions.SocketClosed):
+            await socket.request(Resource.EVENTS, {'n': 1})
+        assert socket.requests == {}
+
+    asyncio.run(run())
+
+
+class ClosedWebSocket:
+    async def send(self, data):
+        raise websockets.ConnectionClosed(1006, "")
+
+
+def test_writer_priority_order():
+    async def run():
+        socket = make_socket()
+        socket.send(Resource.SYNC, {})
+        socket.send(Resource.EVENTS, {'n': 1})
+        socket.send(Resource.TICKETS, body={})
+        socket.writer_future = asyncio.create_task(socket.writer())
+        await asyncio.sleep(0)
+        socket.stop_writer()
+        return [decode_json(frame)['req']['resource'] for frame in socket._socket.sent]
+
+    assert asyncio.run(run()) == [Resource.TICKETS, Resource.EVENTS, Resource.SYNC]
+
+
+def test_writer_failure_callbacks():
+    async def run():
+        socket = make_socket()
+        socket._socket = ClosedWebSocket()
+        failed = []
+        xs = socket.send(Resource.TICKETS, body={}, on_error=lambda _xs, err: failed.append((_xs, type(err))))
+        request = socket.request(Resource.EVENTS, {'n': 1})
+        await socket.writer()
+        with pytest.raises(exceptions.SocketClosed):
+            await request
+        await asyncio.sleep(0)
+        return xs, failed
+
+    xs, failed = asyncio.run(run())
+    assert failed == [(xs, exceptions.SocketClosed)]
+
+
+def test_writer_reports_written_frames():
+    async def run():
+        socket = make_socket()
+        written = []
+        xs = socket.send(Resource.TICKETS, body={}, on_written=written.append)
+        socket.writer_future = asyncio.create_task(socket.writer())
+        await asyncio.sleep(0)
+        socket.stop_writer()
+        return xs, written
+
+    xs, written = asyncio.run(run())
+    assert written == [xs]
+
+
+class BlockedWebSocket:
+    async def send(self, data):
+        await asyncio.Event().wait()
+
+
+class BrokenWebSocket:
+    async def send(self, data):
+        raise RuntimeError('broken')
+
+
+class FakeUser:
+    username = 'test'
+
+
+def test_writer_fails_taken_frames_when_stopped_or_broken():
+    async def run(websocket):
+        socket = make_socket()
+        socket.user = FakeUser()
+        socket._socket = websocket
+        failed = []
+        sent = [socket.send(Resource.TICKETS, body={}, on_error=lambda _xs, err: failed.append((_xs, type(err))))
+                for _ in range(3)]
+        socket.writer_future = asyncio.create_task(socket.writer())
+        await asyncio.sleep(0)
+        socket.stop_writer()
+        with pytest.raises((asyncio.CancelledError, RuntimeError)):
+            await socket.writer_future
+        await asyncio.sleep(0)
+        return failed == [(xs, exceptions.SocketClosed) for xs in sent]
+
+    assert asyncio.run(run(BlockedWebSocket()))
+    assert asyncio.run(run(BrokenWebSocket()))
+
+
+class HashUser:
+    username = 'test'
+    user_id = 1
+    http = None
+
+
+class ClosingWebSocket:
+    async def close(self):
+        pass
+
+
+def test_socket_reuses_its_online_hash(monkeypatch):
+    fetched = []
+
+    async def login_hash(username, user_id, socket_id, http):
+        fetched.append(socket_id)
+        return f'hash-{len(fetched)}'
+
+    async def run():
+        monkeypatch.setattr('vbet.game.socket.login_hash', login_hash)
+        socket, other = Socket(HashUser(), 1), Socket(HashUser(), 2)
+        hashes = []
+        for _ in range(2):
+            socket.online_hash = await socket.get_online_hash()
+            hashes.append(socket.online_hash)
+        hashes.append(await other.get_online_hash())
+        socket._socket = ClosingWebSocket()
+        await socket.login_failed({})
+        hashes.append(await socket.get_online_hash())
+        return hashes
+
+    # Reconnects reuse the hash, other sockets and rejected hashes fetch a new one
+    assert asyncio.run(run()) == ['hash-1', 'hash-1', 'hash-2', 'hash-3']
+    assert fetched == [1, 2, 1]
@@ -0,0 +1,84 @@
+import asyncio
+from typing import List
+
+from vbet.game.socket_pool import SocketHealth, TicketSocketPool
+
+
+class FakeSocket:
+    def __init__(self, socket_id: int):
+        self.socket_id = socket_id
+        self.authorized = True
+        self.alive = True
+
+    async def exit(self):
+        self.alive = False
+
+
+class FakeUser:
+    username = 'test'
+
+
+def add_online_sockets(pool: TicketSocketPool, sockets: List):
+    for socket in sockets:
+        pool.sockets[socket.socket_id] = socket
+        pool.health[socket.socket_id] = SocketHealth()
+        pool.on_online(socket.socket_id)
+
+
+def make_pool(count: int) -> TicketSocketPool:
+    pool = TicketSocketPool(FakeUser())
+    pool.opened = 0
+
+    def open_socket():
+        pool.opened += 1
+
+    pool.open_socket = open_socket
+    add_online_sockets(pool, [FakeSocket(socket_id) for socket_id in range(count)])
+    return pool
+
+
+def test_acquire_prefers_healthy_idle_socket():
+    async def run():
+        pool = make_pool(3)
+        pool.release(0, 0.1)
+        pool.release(1, 2.0)
+        pool.release(2, 0.3)
+        first = await pool.acquire()
+        second = await pool.acquire()
+        pool.release(second.socket_id, failed=True)
+        third = await pool.acquire()
+        return first.socket_id, second.socket_id, third.socket_id
+
+    # Socket 1 is slower than 0 but 0 already has a ticket in flight and 2 just failed
+    assert asyncio.run(run()) == (0, 2, 1)
+
+
+def test_degraded_socket_is_replaced():
+    async def run():
+        pool = make_pool(2)
+        pool.health[0].failures = 3
+        pool.maintain()
+        socket = await pool.acquire()
+        await asyncio.sleep(0)
+        return pool, socket.socket_id
+
+    pool, socket_id = asyncio.run(run())
+    assert pool.retiring == {0}
+    assert pool.opened == 1
+    assert socket_id == 1
+    assert not pool.sockets[0].alive
+
+
+def test_adjacent_sockets_are_retired():
+    async def run():
+        degraded, idle = make_pool(4), make_pool(4)
+        degraded.health[0].failures = degraded.health[1].failures = 3
+        idle.health[0].last_used = idle.health[1].last_used = 0
+        degraded.maintain()
+        idle.maintain()
+        await asyncio.sleep(0)
+        return degraded, idle
+
+    degraded, idle = asyncio.run(run())
+    assert degraded.retiring == idle.retiring == {0, 1}
+    assert not idle.sockets[0].alive and not idle.sockets[1].alive
@@ -0,0 +1,84 @@
+import random
+
+from vbet.game.table import CompactLeagueTable, LeagueTable
+
+TEAMS = ['ARS', 'CHE', 'LIV', 'MCI', 'MUN', 'TOT']
+
+
+def make_week(rng: random.Random, week: int):
+    order = TEAMS[:]
+    rng.shuffle(order)
+    results = {}
+    for i in range(0, len(order), 2):
+        event_id = week * 100 + i
+        results[event_id] = {'id': event_id, 'A': order[i], 'B': order[i + 1],
+                             'score': (rng.randint(0, 3), rng.randint(0, 3))}
+    return results
+
+
+def feed(table: LeagueTable, week: int, results):
+    table.feed_result(week + 1000, 1, week, results, {}, {})
+
+
+def expected_points(season):
+    points = {team: 0 for team in TEAMS}
+    for results in season.values():
+        for event in results.values():
+            home, away = event['score']
+            points[event['A']] += 3 if home > away else 1 if home == away else 0
+            points[event['B']] += 3 if away > home else 1 if home == away else 0
+    return points
+
+
+class TestLeagueTable:
+    table_cls = LeagueTable
+
+    def setup_method(self):
+        self.table = self.table_cls(10)
+        self.table.on_event(1, 10)
+
+    def test_standings_match_full_recompute(self):
+        rng = random.Random(3)
+        season = {week: make_week(rng, week) for week in range(1, 10)}
+        # Out of order feed as during history back-fill
+        for week in sorted(season, reverse=True):
+            feed(self.table, week, season[week])
+        points = expected_points(season)
+        for team, team_data in self.table.ready_table.items():
+            assert team_data['points'] == points[team]
+            assert len(team_data['streak']) == 9
+            raw_data = self.table.get_raw_team_data(team)
+            assert team_data['streak'] == [raw_data[week][0] for week in range(1, 10)]
+        assert self.table.get_week_results(4) == season[4]
+
+    def test_ranking_order(self):
+        rng = random.Random(5)
+        for week in range(1, 8):
+            feed(self.table, week, make_week(rng, week))
+        keys = [(t['points'], t['gd'], t['gf']) for t in self.table.table]
+        assert keys == sorted(keys, reverse=True)
+        assert [t['pos'] for t in self.table.table] == list(range(1, len(TEAMS) + 1))
+
+    def test_refeed_week_replaces_previous(self):
+        feed(self.table, 1, {1: {'id': 1, 'A': 'ARS', 'B': 'CHE', 'score': (2, 0)}})
+        feed(self.table, 1, {1: {'id': 1, 'A': 'ARS', 'B': 'CHE', 'score': (0, 1)}})
+        ars = self.table.ready_table['ARS']
+        assert (ars['points'], ars['won'], ars['lost'], ars['gd'], ars['streak']) == (0, 0, 1, -1, [0])
+        assert self.table.table[0]['team'] == 'CHE'
+
+
+class TestCompactLeagueTable(TestLeagueTable):
+    table_cls = CompactLeagueTable
+
+    def test_accessors_match_dict_backend(self):
+        rng = random.Random(11)
+        table = LeagueTable(10)
+        table.on_event(1, 10)
+        for week in range(1, 6):
+            results = make_week(rng, week)
+            feed(table, week, results)
+            feed(self.table, week, results)
+        for team in TEAMS:
+            assert self.table.get_raw_team_data(team) == table.get_raw_team_data(team)
+            assert self.table.get_last_matches(team) == table.get_last_matches(team)
+        assert self.table.get_raw_team_data('XXX') is None
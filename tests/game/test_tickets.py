@@ -0,0 +1,314 @@
+import asyncio
+import time
+
+from vbet.core import settings
+from vbet.game.tickets import (Bet, ERRORS, Event, GLOBAL_RATE, global_limiter, QUEUE_DEPTH, Ticket, TicketManager,
+                               USER_RATE, WeekSettlement, WINDOW)
+from vbet.utils import exceptions
+from vbet.utils.metrics import registry
+from .test_socket_pool import add_online_sockets
+
+
+class FakeAccount:
+    def __init__(self, credit: float):
+        self.balance = credit
+        self.checks = 0
+
+    @property
+    async def credit(self):
+        self.checks += 1
+        return self.balance
+
+
+class FakeSocket:
+    def __init__(self, socket_id: int):
+        self.socket_id = socket_id
+        self.authorized = True
+        self.alive = True
+        self.sent = []
+        self.unwritten = []
+        self.xs = 0
+
+    def send(self, resource, query=None, body=None, on_error=None, on_written=None):
+        self.xs += 1
+        self.sent.append(body)
+        self.unwritten.append((self.xs, on_written))
+        return self.xs
+
+    def write(self, count=None):
+        # What the writer does once a frame is on the websocket
+        count = len(self.unwritten) if count is None else count
+        frames, self.unwritten = self.unwritten[:count], self.unwritten[count:]
+        for xs, on_written in frames:
+            if on_written is not None:
+                on_written(xs)
+
+    async def sync(self):
+        pass
+
+
+class FakeUser:
+    username = 'test'
+    competition_align = False
+    game_map = []
+    demo = False
+    jackpot_ready = False
+
+    def __init__(self, credit: float = 0):
+        self.account_manager = FakeAccount(credit)
+
+    @staticmethod
+    def resource_tickets(content):
+        return content
+
+
+def make_ticket(manager: TicketManager, key: int, deadline=None) -> Ticket:
+    ticket = Ticket(1, 'test')
+    ticket.ticket_key = key
+    ticket.deadline = deadline
+    ticket.listener = manager.on_ticket_status
+    return ticket
+
+
+def test_queue_is_earliest_deadline_first():
+    async def run():
+        manager = TicketManager(FakeUser())
+        now = time.time()
+        manager.schedule_ticket(make_ticket(manager, 0))
+        manager.schedule_ticket(make_ticket(manager, 1, now + 20))
+        manager.schedule_ticket(make_ticket(manager, 2, now + 10))
+        manager.schedule_ticket(make_ticket(manager, 3))
+        return [manager.ticket_queue.get_nowait()[1] for _ in range(4)]
+
+    # On demand tickets have no deadline and keep their order behind the scheduled ones
+    assert asyncio.run(run()) == [2, 1, 0, 3]
+
+
+def test_window_missed():
+    ticket = Ticket(1, 'test')
+    assert not TicketManager.is_window_missed(ticket)
+    ticket.deadline = time.time() + settings.TICKET_DEADLINE_MARGIN / 2
+    assert TicketManager.is_window_missed(ticket)
+    ticket.deadline = time.time() + settings.TICKET_DEADLINE_MARGIN + 5
+    assert not TicketManager.is_window_missed(ticket)
+
+
+def test_limiter_backs_off_on_throttle():
+    async def run():
+        manager = TicketManager(FakeUser())
+        rate = manager.limiter.rate
+        manager.limiter.success()
+        increased = manager.limiter.rate
+        manager.limiter.throttle()
+        return rate, increased, manager.limiter.rate, manager.get_rate_stats()
+
+    rate, increased, throttled, stats = asyncio.run(run())
+    assert increased > rate
+    assert throttled == max(settings.TICKET_RATE_MIN, increased / 2)
+    assert stats['queue'] == 0 and stats['user']['rate'] == round(throttled, 3)
+
+
+def test_rate_metrics_follow_the_limiters():
+    async def run():
+        manager = make_manager(1000, 1)
+        await manager.add_tickets([make_staked_ticket(manager, 1, 1, 100)])
+        manager.limiter.throttle()
+        manager.update_rate_metrics()
+        return manager
+
+    manager = asyncio.run(run())
+    assert USER_RATE.get(('test',)) == manager.limiter.rate
+    assert GLOBAL_RATE.get() == global_limiter.rate
+    assert QUEUE_DEPTH.get(('test',)) == 1
+
+
+def test_limiter_lends_token_to_urgent_ticket():
+    async def run():
+        manager = TicketManager(FakeUser())
+        await manager.limiter.acquire()
+        start = time.monotonic()
+        await manager.limiter.acquire(max_wait=0.05)
+        return time.monotonic() - start, manager.limiter.tokens
+
+    waited, tokens = asyncio.run(run())
+    assert waited < 0.5
+    assert tokens < 0
+
+
+def make_staked_ticket(manager: TicketManager, key: int, game_id: int, stake: float) -> Ticket:
+    ticket = Ticket(game_id, 'test')
+    event = Event(1, 1, 1, [])
+    event.add_bet(Bet(1, '1', 1.5, 'test', stake))
+    ticket.add_event(event)
+    ticket.stake = stake
+    ticket.ticket_key = key
+    ticket.content = {'key': key}
+    return ticket
+
+
+def make_manager(credit: float, sockets: int) -> TicketManager:
+    # Batches are sent by the test instead of the sender task
+    manager = TicketManager(FakeUser(credit))
+    manager.ticket_sender_future.cancel()
+    add_online_sockets(manager.pool, [FakeSocket(socket_id) for socket_id in range(sockets)])
+    return manager
+
+
+def test_block_is_sent_as_one_batch():
+    async def run():
+        manager = make_manager(250, 3)
+        tickets = [make_staked_ticket(manager, key, 1, 100) for key in range(1, 4)]
+        other = make_staked_ticket(manager, 4, 2, 100)
+        await manager.add_tickets(tickets + [other])
+        batch = await manager.collect_batch(manager.ticket_queue.get_nowait())
+        await manager.send_tickets(batch)
+        return manager, tickets, batch
+
+    manager, tickets, batch = asyncio.run(run())
+    assert batch == tickets
+    # The other competition stays queued for the next batch
+    assert manager.ticket_queue.qsize() == 1
+    assert manager.user.account_manager.checks == 1
+    assert [ticket.status for ticket in tickets] == [Ticket.SENT, Ticket.SENT, Ticket.ERROR_CREDIT]
+    assert tickets[0].socket_id != tickets[1].socket_id
+
+
+def test_lost_socket_voids_its_tickets():
+    async def run():
+        manager = make_manager(1000, 2)
+        completed = []
+        manager.user.tickets_complete = completed.append
+        tickets = [make_staked_ticket(manager, key, 1, 100) for key in range(1, 3)]
+        await manager.add_tickets(tickets)
+        await manager.send_tickets(await manager.collect_batch(manager.ticket_queue.get_nowait()))
+        first, second = tickets
+        found = manager.find_ticket_by_xs(first.socket_id, first.xs)
+        again = manager.find_ticket_by_xs(first.socket_id, first.xs)
+        first.status = Ticket.SUCCESS
+        manager.pool.sockets[second.socket_id].write()
+        await manager.socket_lost(second.socket_id)
+        return found, again, second, completed
+
+    found, again, second, completed = asyncio.run(run())
+    assert found is not None and again is None
+    assert second.status == Ticket.VOID
+    assert completed == [1]
+
+
+def test_lost_socket_resends_unwritten_tickets():
+    async def run():
+        manager = make_manager(1000, 1)
+        socket = manager.pool.sockets[0]
+        tickets = [make_staked_ticket(manager, key, 1, 100) for key in range(1, 3)]
+        await manager.add_tickets(tickets)
+        await manager.send_tickets(await manager.collect_batch(manager.ticket_queue.get_nowait()))
+        rates = manager.limiter.rate, global_limiter.rate
+        # Only the first frame left the send queue before the connection dropped
+        socket.write(1)
+        await manager.socket_lost(0)
+        await asyncio.sleep(0)
+        return manager, tickets, rates
+
+    manager, (written, queued), rates = asyncio.run(run())
+    assert written.status == Ticket.VOID
+    assert queued.status == Ticket.WAITING and manager.ticket_queue.qsize() == 1
+    assert (manager.limiter.rate, global_limiter.rate) == rates
+    assert manager.pool.health[0].failures == 0
+
+
+def test_local_send_failure_is_not_throttled():
+    async def run():
+        manager = make_manager(1000, 1)
+        ticket = make_staked_ticket(manager, 1, 1, 100)
+        await manager.add_tickets([ticket])
+        await manager.send_tickets(await manager.collect_batch(manager.ticket_queue.get_nowait()))
+        rates = manager.limiter.rate, global_limiter.rate
+        await manager.ticket_send_failed(0, ticket.xs, exceptions.SendFailed(0, ticket.xs, 'tickets', 'queue full'))
+        await asyncio.sleep(0)
+        return manager, ticket, rates
+
+    manager, ticket, rates = asyncio.run(run())
+    assert (manager.limiter.rate, global_limiter.rate) == rates
+    assert manager.pool.health[0].failures == 0 and manager.pool.health[0].inflight == 0
+    # Queued again for the next batch
+    assert ticket.status == Ticket.WAITING and manager.ticket_queue.qsize() == 1
+
+
+def test_missed_ticket_metrics():
+    async def run():
+        manager = make_manager(1000, 1)
+        completed = []
+        manager.user.tickets_complete = completed.append
+        ticket = make_staked_ticket(manager, 1, 1, 100)
+        await manager.add_tickets([ticket])
+        await manager.send_tickets(await manager.collect_batch(manager.ticket_queue.get_nowait()))
+        await manager.ticket_failed(602, manager.find_ticket_by_xs(ticket.socket_id, ticket.xs))
+        return manager
+
+    enabled = registry.enabled
+    registry.enabled = True
+    try:
+        ERRORS.reset()
+        WINDOW.reset()
+        manager = asyncio.run(run())
+        assert manager.get_window_stats(1) == {'sent': 1, 'dropped': 0, 'missed': 1}
+        assert WINDOW.get((1, 'sent')) == WINDOW.get((1, 'missed')) == 1
+        assert ERRORS.get((602,)) == 1
+    finally:
+        registry.enabled = enabled
+        ERRORS.reset()
+        WINDOW.reset()
+
+
+def test_week_settlement():
+    ticket = Ticket(1, 'test')
+    event = Event(10, 1, 3, [])
+    event.add_bet(Bet(1, '1', 2.0, 'won', 100))
+    event.add_bet(Bet(2, '1', 3.0, 'lost', 100))
+    event.add_bet(Bet(3, '2', 2.0, 'refund', 100))
+    event.add_bet(Bet(4, '2', 2.0, 'half won', 100))
+    ticket.add_event(event)
+    assert not ticket.settle({})
+    weeks = {3: WeekSettlement({10: [1, 5], 11: []},
+                               {10: {'refund_stake': ['3'], 'half_won': ['4'], 'half_lost': []}})}
+    assert ticket.settle(weeks)
+    assert ticket.total_won == 200 + 100 + 100
+
+
+def test_full_queue_tickets_are_polled_after_a_batch(monkeypatch):
+    monkeypatch.setattr(settings, 'TICKET_QUEUE_SIZE', 1)
+
+    async def run():
+        manager = make_manager(1000, 1)
+        tickets = [make_staked_ticket(manager, key, key, 100) for key in range(1, 3)]
+        await manager.add_tickets(tickets)
+        states = [[ticket.status for ticket in tickets]]
+        # What the listener does around each batch
+        await manager.collect_batch(manager.ticket_queue.get_nowait())
+        await manager.poll_ticket()
+        states.append([ticket.status for ticket in tickets])
+        return states, manager.ticket_queue.qsize()
+
+    states, queued = asyncio.run(run())
+    assert states == [[Ticket.WAITING, Ticket.READY], [Ticket.WAITING, Ticket.WAITING]]
+    assert queued == 1
+
+
+def test_credit_wakes_tickets_up():
+    async def run():
+        manager = make_manager(1000, 1)
+        ticket = make_staked_ticket(manager, 1, 1, 100)
+        await manager.add_tickets([ticket])
+        manager.ticket_queue.get_nowait()
+        ticket.status = Ticket.ERROR_CREDIT
+        manager.on_credit(50)
+        await asyncio.sleep(0)
+        states = [ticket.status]
+        manager.on_credit(500)
+        await asyncio.sleep(0)
+        states.append(ticket.status)
+        return states, manager.ticket_queue.qsize()
+
+    states, queued = asyncio.run(run())
+    # Scheduled by the status change, no poll needed
+    assert states == [Ticket.ERROR_CREDIT, Ticket.WAITING] and queued == 1
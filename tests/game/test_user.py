@@ -0,0 +1,74 @@
+import asyncio
+
+from vbet.core import settings
+from vbet.game.socket import Socket
+from vbet.game.user import User
+
+
+class FakeCompetition:
+    def __init__(self, game_id: int, closing: bool = False):
+        self.game_id = game_id
+        self.closing = closing
+        self.online = False
+        self.lost = False
+
+
+def make_user(monkeypatch) -> User:
+    # Sockets are only routed, nothing connects
+    monkeypatch.setattr(Socket, 'connect', lambda socket: None)
+    user = User(None, 'test', False)
+    user.ticket_manager.ticket_sender_future.cancel()
+    return user
+
+
+def test_playlists_share_live_competition_sockets(monkeypatch):
+    monkeypatch.setattr(settings, 'PLAYLISTS_PER_SOCKET', 2)
+
+    async def run():
+        user = make_user(monkeypatch)
+        user.sockets[-1] = Socket(user, -1)
+        routed = [user.assign_socket(game_id).socket_id for game_id in (1, 2, 3)]
+        user.sockets[3].alive = False
+        routed.append(user.assign_socket(4).socket_id)
+        return user, routed
+
+    user, routed = asyncio.run(run())
+    # The standby socket is never bound and the exited socket 3 is not reused
+    assert routed == [1, 1, 3, 4]
+    assert user.game_sockets == {1: 1, 2: 1, 3: 3, 4: 4}
+
+
+def test_socket_released_with_its_last_competition(monkeypatch):
+    monkeypatch.setattr(settings, 'PLAYLISTS_PER_SOCKET', 2)
+
+    async def run():
+        user = make_user(monkeypatch)
+        for game_id in (1, 2):
+            user.competitions[game_id] = FakeCompetition(game_id)
+            user.assign_socket(game_id)
+        socket = user.sockets[1]
+        user.competitions[1].closing = True
+        await user.release_socket(1)
+        shared_alive = socket.alive
+        user.competitions[2].closing = True
+        await user.release_socket(2)
+        return shared_alive, socket.alive
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_lost_socket_playlists_move_to_standby(monkeypatch):
+    async def run():
+        user = make_user(monkeypatch)
+        competition = user.competitions[1] = FakeCompetition(1)
+        user.assign_socket(1)
+        standby = user.sockets[-1] = Socket(user, -1)
+        standby.authorized = True
+        await user.socket_lost(1)
+        return user, competition
+
+    user, competition = asyncio.run(run())
+    assert user.game_sockets == {1: -1}
+    assert competition.lost and competition.online
+    # The lost socket reconnects as the new standby
+    assert user.get_standby_socket() is None and user.get_socket_competitions(1) == []
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from vbet.core import settings
+from vbet.game.markets import CorrectScores, get_correct_score
+from vbet.simulator.league import Playlist
+from vbet.simulator.server import ProviderSimulator
+from vbet.utils.parser import Resource
+
+
+def test_playlist_is_seeded():
+    first, second = Playlist(settings.PREMIER, 7), Playlist(settings.PREMIER, 7)
+    assert first.block(60, True) == second.block(60, True)
+    week = first.block(60, True)
+    assert len(week['events']) == 10
+    for event, match in zip(week['events'], first.matches(60)):
+        assert get_correct_score(event['result']['wonMarkets']) == match.score
+    assert first.league_week(37) == (settings.PREMIER * 1000, 38)
+
+
+def test_every_score_has_a_correct_score_market():
+    playlist = Playlist(settings.PREMIER, 3)
+    scores = set(CorrectScores.values())
+    for block_index in range(500):
+        for match in playlist.matches(block_index):
+            assert match.score in scores
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+async def session(simulator: ProviderSimulator):
+    state = {}
+    valid, body = await simulator.login(state, {'onlineHash': 'test', 'profile': 'MOBILE'})
+    assert valid and body['sessionStatus']['credit'] == 1000
+    payload = {'contentId': settings.PREMIER, 'n': 1}
+    valid, blocks = await simulator.events(state, payload)
+    block = blocks[0]
+    event = block['events'][0]
+    ticket = {'details': {'events': [{'eventId': event['eventId'], 'playlistId': settings.PREMIER,
+                                      'bets': [{'oddId': 0, 'oddValue': 2.0, 'stake': 600}]}],
+                          'systemBets': [{'stake': 600}]}}
+    sent = await simulator.tickets(state, ticket)
+    no_credit = await simulator.tickets(state, ticket)
+    valid, history = await simulator.history(state, {'contentId': settings.PREMIER, 'n': -10,
+                                                     'eBlockId': block['eBlockId']})
+    assert [item['eBlockId'] for item in history] == list(range(block['eBlockId'] - 1, block['eBlockId'] - 11, -1))
+    assert all('result' in item for item in history[0]['events'])
+    valid, results = await simulator.results(state, {'contentId': settings.PREMIER, 'n': 1,
+                                                     'eBlockId': block['eBlockId']})
+    late = await simulator.tickets(state, ticket)
+    valid, blocks = await simulator.events(state, payload)
+    return block, sent, no_credit, results[0], late, blocks[0]
+
+
+def test_simulator_session():
+    simulator = ProviderSimulator(seed=3, start_week=5, credit=1000)
+    block, sent, no_credit, results, late, next_block = asyncio.run(session(simulator))
+    assert block['data']['matchDay'] == 5
+    assert sent[0] and sent[1]['transaction']['newCredit'] == 400
+    assert no_credit == (False, {'errorCode': 605, 'message': 'Insufficient credit'})
+    assert results['eBlockId'] == block['eBlockId']
+    assert late[1]['errorCode'] == 602
+    assert next_block['eBlockId'] == block['eBlockId'] + 1
+
+
+def test_response_frame_and_injected_error():
+    async def run():
+        simulator = ProviderSimulator(errors={604: 1})
+        websocket = FakeWebSocket()
+        state = {}
+        await simulator.respond(websocket, state, {'xs': 1, 'req': {'method': 'GET', 'resource': Resource.LOGIN,
+                                                                    'query': {'onlineHash': 'test'}}})
+        await simulator.respond(websocket, state, {'xs': 2, 'req': {'method': 'POST', 'resource': Resource.TICKETS,
+                                                                    'body': {'details': {}}}})
+        return websocket.sent
+
+    login, ticket = asyncio.run(run())
+    assert login['xs'] == 1 and login['res']['resource'] == Resource.LOGIN and login['res']['validResponse']
+    assert ticket['res']['body']['errorCode'] == 604
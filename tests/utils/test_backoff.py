@@ -0,0 +1,10 @@
+from vbet.utils.backoff import Backoff
+
+
+def test_backoff_grows_to_maximum_and_resets():
+    backoff = Backoff(0.25, 2)
+    delays = [backoff.next() for _ in range(6)]
+    for delay, limit in zip(delays, [0.25, 0.5, 1, 2, 2, 2]):
+        assert limit / 2 <= delay <= limit
+    backoff.reset()
+    assert backoff.next() <= 0.25
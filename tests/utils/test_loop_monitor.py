@@ -0,0 +1,70 @@
+import asyncio
+import time
+from asyncio import events
+
+from vbet.utils.loop_monitor import LoopMonitor, SLOW_CALLBACKS
+from vbet.utils.metrics import registry
+from vbet.utils.profiler import SlowCallbacks
+
+
+class FakeUser:
+    username = 'alice'
+
+
+class FakeCompetition:
+    def __init__(self):
+        self.user = FakeUser()
+        self.game_id = 14045
+
+    async def parse_history(self):
+        await asyncio.sleep(0)
+        time.sleep(0.05)
+
+
+def test_lag_and_slow_callback_attribution():
+    monitor = LoopMonitor(interval=0.01, lag=1, slow_callback=0.03)
+
+    async def main():
+        monitor.start(asyncio.get_running_loop(), slow_callbacks=True)
+        await asyncio.sleep(0.02)
+        await asyncio.create_task(FakeCompetition().parse_history())
+        await asyncio.sleep(0.02)
+        monitor.stop()
+
+    enabled = registry.enabled
+    registry.enabled = True
+    try:
+        SLOW_CALLBACKS.reset()
+        asyncio.run(main())
+        owner = 'FakeCompetition.parse_history [alice:14045]'
+        assert monitor.max_lag >= 0.03
+        assert [entry['owner'] for entry in monitor.stats['slow_callbacks']] == [owner]
+        assert SLOW_CALLBACKS.get((owner,)) == 1
+    finally:
+        registry.enabled = enabled
+        SLOW_CALLBACKS.reset()
+
+
+def test_lag_warning_enables_attribution_for_a_window():
+    monitor = LoopMonitor(lag=0.1, window=0.01)
+    monitor.on_lag(0)
+    assert not monitor.slow_callbacks.installed
+    monitor.on_lag(0.2)
+    assert monitor.slow_callbacks.installed
+    monitor.on_lag(0)
+    assert monitor.slow_callbacks.installed
+    time.sleep(0.02)
+    monitor.on_lag(0)
+    assert not monitor.slow_callbacks.installed
+
+
+def test_recorders_share_the_handle_wrapper():
+    run = events.Handle._run
+    first, second = SlowCallbacks(1), SlowCallbacks(1)
+    first.install()
+    second.install()
+    wrapped = events.Handle._run
+    first.uninstall()
+    assert events.Handle._run is wrapped and wrapped is not run
+    second.uninstall()
+    assert events.Handle._run is run
@@ -0,0 +1,67 @@
+import pytest
+
+from vbet.game.table import FEED_TIME, LeagueTable
+from vbet.utils.metrics import Counter, Histogram, Registry, registry
+
+
+def test_labelled_values():
+    metrics = Registry(True)
+    errors = metrics.counter('errors_total', 'Errors', ['code'])
+    errors.inc(1, (602,))
+    errors.inc(2, (602,))
+    errors.inc(1, (604,))
+    depth = metrics.gauge('queue_depth', 'Queue depth')
+    depth.set(5)
+    depth.dec()
+    assert errors.get((602,)) == 3 and errors.get((604,)) == 1 and errors.get((605,)) == 0
+    assert depth.get() == 4
+    assert metrics.snapshot()['errors_total']['values'][0] == {'labels': {'code': '602'}, 'value': 3}
+
+
+def test_register_returns_existing_metric():
+    metrics = Registry()
+    counter = metrics.counter('frames_total')
+    assert metrics.counter('frames_total') is counter
+    with pytest.raises(ValueError):
+        metrics.register(Histogram('frames_total'))
+    with pytest.raises(ValueError):
+        metrics.register(Counter('frames_total', labels=['socket']))
+
+
+def test_prometheus_exposition():
+    metrics = Registry()
+    metrics.counter('errors_total', 'Ticket "errors"', ['code']).inc(1, (602,))
+    latency = metrics.histogram('ack_seconds', 'Ack latency', (0.1, 1), ['result'])
+    latency.observe(0.05, ('success',))
+    latency.observe(0.5, ('success',))
+    latency.observe(5, ('success',))
+    assert metrics.exposition().splitlines() == [
+        '# HELP ack_seconds Ack latency',
+        '# TYPE ack_seconds histogram',
+        'ack_seconds_bucket{result="success",le="0.1"} 1',
+        'ack_seconds_bucket{result="success",le="1"} 2',
+        'ack_seconds_bucket{result="success",le="+Inf"} 3',
+        'ack_seconds_sum{result="success"} 5.55',
+        'ack_seconds_count{result="success"} 3',
+        '# HELP errors_total Ticket "errors"',
+        '# TYPE errors_total counter',
+        'errors_total{code="602"} 1',
+    ]
+
+
+def test_disabled_registry_records_nothing():
+    table = LeagueTable(38)
+    table.on_event(1, 1)
+    results = {100: {'id': 100, 'A': 'ARS', 'B': 'CHE', 'score': (1, 0)}}
+    enabled = registry.enabled
+    try:
+        registry.enabled = False
+        FEED_TIME.reset()
+        table.feed_result(1000, 1, 1, results, {}, {})
+        assert FEED_TIME.get(('dict',)) is None
+        registry.enabled = True
+        table.feed_result(1001, 1, 2, results, {}, {})
+        assert FEED_TIME.get(('dict',)).count == 1
+    finally:
+        registry.enabled = enabled
+        FEED_TIME.reset()
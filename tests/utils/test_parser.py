@@ -0,0 +1,21 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from vbet.core import settings
+from vbet.utils import parser
+from vbet.utils.parser import decode_json_pool, get_decode_executor, shutdown_decode_executor
+
+
+def test_decode_executor_follows_settings(monkeypatch):
+    shutdown_decode_executor()
+    try:
+        monkeypatch.setattr(settings, 'DECODE_EXECUTOR', 'thread')
+        assert isinstance(get_decode_executor(), ThreadPoolExecutor)
+        shutdown_decode_executor()
+        monkeypatch.setattr(settings, 'DECODE_EXECUTOR', 'process')
+        executor = get_decode_executor()
+        assert isinstance(executor, ProcessPoolExecutor) and get_decode_executor() is executor
+        assert asyncio.run(decode_json_pool('{"xs": 1}')) == {'xs': 1}
+    finally:
+        shutdown_decode_executor()
+    assert parser._decode_executor is None
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from asyncio import events
+
+from vbet.core import settings
+from vbet.utils.profiler import Profiler, SlowCallbacks
+
+
+async def block_loop(seconds: float):
+    await asyncio.sleep(0)
+    time.sleep(seconds)
+
+
+async def idle():
+    await asyncio.sleep(1)
+
+
+def test_slow_callbacks_are_attributed_to_their_coroutine():
+    slow_callbacks = SlowCallbacks(0.01)
+    run = events.Handle._run
+
+    async def main():
+        slow_callbacks.install()
+        try:
+            await asyncio.gather(block_loop(0.02), block_loop(0))
+        finally:
+            slow_callbacks.uninstall()
+
+    asyncio.run(main())
+    assert events.Handle._run is run
+    report = slow_callbacks.report(10)
+    assert [entry['owner'] for entry in report] == ['block_loop']
+    assert report[0]['count'] == 1 and report[0]['max'] >= 0.02
+
+
+def test_profile_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'TMP_DIR', str(tmp_path))
+    profiler = Profiler(0.01)
+
+    async def main():
+        task = asyncio.create_task(idle())
+        assert profiler.start() and not profiler.start()
+        await block_loop(0.02)
+        running = profiler.dump(10)
+        await block_loop(0)
+        assert profiler.stop() and not profiler.stop()
+        stopped = profiler.dump(10, 'not-a-key')
+        task.cancel()
+        return running, stopped
+
+    running, stopped = asyncio.run(main())
+    assert running['running'] and running['tasks'] == {'test_profile_session.<locals>.main': 1, 'idle': 1}
+    assert 'block_loop' in running['stats']
+    # The session kept profiling after the first dump
+    assert not stopped['running'] and stopped['stats'].count('block_loop') >= 1
+    assert [entry['owner'] for entry in stopped['slow_callbacks']] == ['test_profile_session.<locals>.main']
+    assert (tmp_path / stopped['file'].rsplit('/', 1)[1]).exists()
@@ -14,8 +14,12 @@ def parse_args(args: List):
     parser.add_argument('-p', '--port', default=settings.WS_PORT, type=int, help=f'WS server port higher than 1000 for '
                                                                                  f'api '
                                                                                  f'connection. Default {settings.WS_PORT}')
+    parser.add_argument('-w', '--wss', default=settings.WSS_URL, help='Provider websocket url. Default the api backend '
+                                                                      'url')
     parser.add_argument('-d', action='store_true', help=f'Set the asyncio event loop debug to true or false. Default '
                                                         f'{settings.LOOP_DEBUG}')
+    parser.add_argument('-m', '--metrics', action='store_true', help=f'Collect metrics for the metrics uri. Default '
+                                                                     f'{settings.METRICS}')
     parser.add_argument('-v', action='count', default=0, help=f'Set the Verbose level with highest -vv. Default -v')
 
     return parser.parse_args(args)
@@ -24,7 +28,9 @@ def parse_args(args: List):
 def setup(args):
     settings.API_NAME = args.a
     settings.WS_PORT = args.port
+    settings.WSS_URL = args.wss
     settings.LOOP_DEBUG = args.d
+    settings.METRICS = args.metrics
     verbose = args.v
 
     if verbose == 0:
@@ -18,7 +18,9 @@ SUDO_URI = {
     'exit': 'application',
     'add': 'manager',
     'login': 'manager',
-    'check': 'manager'
+    'check': 'manager',
+    'metrics': 'application',
+    'profile': 'application'
 }
 
 CLIENT_URI = {'player': 'manager'}
@@ -7,9 +7,10 @@ WS_PORT = 9000
 
 BETIKA = 'betika'
 MOZART = 'mozart'
+SIMULATOR = 'simulator'
 
 API_BACKENDS = [
-	BETIKA, MOZART
+	BETIKA, MOZART, SIMULATOR
 ]
 DEFAULT_API_NAME = BETIKA
 API_NAME = DEFAULT_API_NAME
@@ -18,12 +19,134 @@ DEBUG = True
 
 LOOP_DEBUG = False
 
+# Loop lag sampled every LOOP_MONITOR_INTERVAL seconds and logged above LOOP_LAG_WARNING, callbacks slower than
+# LOOP_SLOW_CALLBACK are attributed to their coroutine for LOOP_SLOW_CALLBACKS_WINDOW seconds after a lag warning,
+# or always when LOOP_SLOW_CALLBACKS is set
+LOOP_MONITOR = True
+
+LOOP_MONITOR_INTERVAL = 0.5
+
+LOOP_LAG_WARNING = 0.25
+
+LOOP_SLOW_CALLBACKS = False
+
+LOOP_SLOW_CALLBACKS_WINDOW = 60
+
+LOOP_SLOW_CALLBACK = 0.1
+
 LOG_LEVEL = 'DEBUG'
 
 FILE_LOG_LEVEL = 'DEBUG'
 
 REDIS_URI = 'redis://localhost:6379'
 
+# Collect counters, gauges and histograms for the metrics uri, hot paths skip all timing when False
+METRICS = False
+
+# Loop callbacks slower than this (seconds) are reported by the profile uri and the rows of profile stats shown
+PROFILE_SLOW_CALLBACK = 0.05
+
+PROFILE_LIMIT = 30
+
+# Provider websocket, None for the Golden Race proxy or the local simulator when API_NAME is SIMULATOR
+WSS_URL = None
+
+SIMULATOR_HOST = 'localhost'
+
+SIMULATOR_PORT = 9443
+
+# Frames larger than this (bytes) are decoded on the decode pool instead of the event loop
+DECODE_OFFLOAD_SIZE = 64 * 1024
+
+# Decode pool type 'thread' or 'process' and worker count. Json decoding holds the GIL, only worker processes take
+# it off the event loop
+DECODE_EXECUTOR = 'process'
+
+DECODE_WORKERS = 2
+
+# League table storage 'dict' or 'compact' (team x week arrays)
+TABLE_BACKEND = 'dict'
+
+# Share league tables, games and blocks between users on the same playlist league
+SHARED_LEAGUE_DATA = True
+
+# Write through per week season cache under CACHE_DIR and the number of leagues kept per playlist
+SEASON_CACHE = True
+
+SEASON_CACHE_LEAGUES = 2
+
+# History ranges requested concurrently while back-filling a league, 1 keeps serial hops
+HISTORY_IN_FLIGHT = 4
+
+# Seconds before an awaited socket request times out and how often competitions retry it
+REQUEST_TIMEOUT = 5
+
+REQUEST_RETRIES = 2
+
+# Frames queued per socket before sends fail and frames written per writer wake up
+SEND_QUEUE_SIZE = 256
+
+SEND_BATCH = 32
+
+# Playlists multiplexed on one competition socket, 1 gives every playlist a dedicated socket
+PLAYLISTS_PER_SOCKET = 1
+
+# Reconnect backoff bounds in seconds, window a socket reuses its own onlineHash and logged in standby competition
+# sockets per user
+RECONNECT_BASE = 0.25
+
+RECONNECT_MAX = 30
+
+ONLINE_HASH_TTL = 300
+
+STANDBY_SOCKETS = 0
+
+# Ticket socket pool size, in flight tickets per socket before growing and seconds to wait for a free socket
+TICKET_SOCKETS_MIN = 2
+
+TICKET_SOCKETS_MAX = 4
+
+TICKET_SOCKET_INFLIGHT = 2
+
+TICKET_SOCKET_WAIT = 5
+
+# Ticket socket health, initial and degraded round trip seconds, degraded failure score and idle seconds before
+# shrinking
+TICKET_SOCKET_RTT = 0.5
+
+TICKET_SOCKET_MAX_RTT = 3
+
+TICKET_SOCKET_MAX_FAILURES = 3
+
+TICKET_SOCKET_IDLE = 120
+
+TICKET_POOL_INTERVAL = 5
+
+# Seconds a ticket must reach the provider before its block starts and the shortest gap between tickets
+TICKET_DEADLINE_MARGIN = 1
+
+TICKET_MIN_INTERVAL = 0.2
+
+# Tickets per second per user, adapted between the bounds from provider responses (throttled on 604/500)
+TICKET_RATE_MIN = 0.1
+
+TICKET_RATE_MAX = 5
+
+TICKET_RATE_INCREASE = 0.05
+
+# Tickets per second across all users
+TICKET_GLOBAL_RATE = 20
+
+TICKET_GLOBAL_RATE_MIN = 1
+
+TICKET_GLOBAL_RATE_MAX = 50
+
+# Most tickets of one block sent back to back
+TICKET_BATCH = 8
+
+# Tickets queued for sending, the rest stay ready and are polled again after each batch
+TICKET_QUEUE_SIZE = 50
+
 TMP_DIR = f'{BASE_DIR}/tmp'
 
 DATA_DIR = f'{TMP_DIR}/data'
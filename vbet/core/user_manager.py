@@ -11,7 +11,7 @@ from vbet.game.api.auth import COOKIES_URL, HEADERS, login_password
 from vbet.game.user import User
 from vbet.utils import exceptions
 from vbet.utils.log import get_logger
-from vbet.utils.parser import decode_json, encode_json
+from vbet.utils.parser import decode_json, encode_json, shutdown_decode_executor
 
 if TYPE_CHECKING:
     from vbet.core.vbet import Vbet
@@ -67,7 +67,7 @@ class UserManager:
         cache_id = f'{settings.API_NAME}_session_{username}'
         cache_data = await self.redis.execute('get', cache_id)  # type: Union[str, bytes, None]
         if cache_data:
-            data = decode_json(cache_data.decode('utf-8'))  # type: Dict
+            data = decode_json(cache_data)  # type: Dict
             cookies = data.get('cookies')  # type: Dict
             unit_id = data.get('id')  # type: int
             token = data.get('token')  # type: str
@@ -185,6 +185,7 @@ class UserManager:
         if pending:
             done, p = await asyncio.wait(list(pending.values()), return_when=asyncio.ALL_COMPLETED)
 
+        shutdown_decode_executor()  # stop decode pool workers
         self.redis.close()  # close redis
         await self.redis.wait_closed()
         await self.cancel_ws_reader()  # cancel ws_queue reader
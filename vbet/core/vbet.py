@@ -8,6 +8,9 @@ from vbet.core.user_manager import UserManager
 from vbet.core.ws_server import WsServer
 from vbet.utils import exceptions
 from vbet.utils.log import get_logger
+from vbet.utils.loop_monitor import LoopMonitor
+from vbet.utils.metrics import registry
+from vbet.utils.profiler import Profiler
 
 logger = get_logger('vbet')
 
@@ -40,6 +43,12 @@ class Vbet:
 
         self.manager: UserManager = UserManager(self)  # User manager player handler.
 
+        registry.enabled = settings.METRICS
+
+        self.profiler: Profiler = Profiler()  # Control websocket profiling session.
+
+        self.loop_monitor: LoopMonitor = LoopMonitor()  # Loop lag and slow callbacks.
+
     def run(self) -> int:
         logger.info(f'Vbet Server build {vbet.__VERSION__}')
         self.setup_event_loop()  # Get and Setup event loop
@@ -87,7 +96,12 @@ class Vbet:
         self.loop.set_exception_handler(self.exception_handler)
         self.loop.set_debug(settings.LOOP_DEBUG)
 
+        # Lag sampler and slow callback attribution, lighter than the debug mode
+        if settings.LOOP_MONITOR:
+            self.loop_monitor.start(self.loop, settings.LOOP_SLOW_CALLBACKS)
+
     def teardown(self):
+        self.loop_monitor.stop()
         server_task = self.loop.create_task(self.ws_server.wait_closed())
         manager_task = self.loop.create_task(self.manager.wait_closed())
         tasks = asyncio.gather(*[server_task, manager_task], return_exceptions=True)
@@ -121,3 +135,35 @@ class Vbet:
         if not self.exit_flag and self.status != CLOSING:
             self.exit_flag = True
             self.loop.stop()
+
+    async def metrics_uri(self, session_key: int, body):
+        enabled = body.get('enabled', None) if isinstance(body, dict) else None
+        if isinstance(enabled, bool):
+            registry.enabled = enabled
+        response = {'enabled': registry.enabled}
+        users = list(self.manager.users.values())
+        if registry.enabled:
+            # Rates also move on refunds and idle refills, refreshed so the gauges match the stats below
+            for user in users:
+                user.ticket_manager.update_rate_metrics()
+        response['tickets'] = {user.username: user.ticket_manager.get_rate_stats() for user in users}
+        if isinstance(body, dict) and body.get('format') == 'prometheus':
+            response['text'] = registry.exposition()
+        else:
+            response['metrics'] = registry.snapshot()
+        await self.ws_server.send_to_session(session_key, 'metrics', response)
+
+    async def profile_uri(self, session_key: int, body):
+        body = body if isinstance(body, dict) else {}
+        command = body.get('command', 'dump')
+        if command == 'start':
+            response = {'started': self.profiler.start()}
+        elif command == 'stop':
+            response = {'stopped': self.profiler.stop()}
+        elif command == 'dump':
+            response = self.profiler.dump(int(body.get('limit', settings.PROFILE_LIMIT)), body.get('sort', 'cumulative'))
+            response['loop'] = self.loop_monitor.stats
+        else:
+            response = {'error': f'Unknown profile command {command}'}
+        response['command'] = command
+        await self.ws_server.send_to_session(session_key, 'profile', response)
@@ -53,7 +53,7 @@ class Vshell(asynccmd.Cmd):
                         data = decode_json(payload)
                         uri = data.get('uri')
                         body = data.get('body')
-                        sys.stdout.write(f'\r>>> {uri} {body}\n {self.prompt}')
+                        sys.stdout.write(f'\r>>> {uri} {self.format_body(body)}\n {self.prompt}')
                     except websockets.ConnectionClosed:
                         break
         except ConnectionError:
@@ -61,6 +61,16 @@ class Vshell(asynccmd.Cmd):
         finally:
             raise KeyboardInterrupt
 
+    @staticmethod
+    def format_body(body):
+        # Reports carry preformatted text, it is printed as is after the rest of the body
+        if isinstance(body, dict):
+            text = [body[key] for key in ('text', 'stats') if isinstance(body.get(key), str)]
+            if text:
+                rest = {key: value for key, value in body.items() if key not in ('text', 'stats')}
+                return '\n'.join([str(rest)] + text)
+        return body
+
     async def send(self, uri, body):
         payload = {'uri': uri, 'body': body}
         await self.websocket.send(encode_json(payload))
@@ -98,6 +108,27 @@ class Vshell(asynccmd.Cmd):
         else:
             print(self.do_str_login())
 
+    def do_metrics(self, arg):
+        arg = arg.split()
+        body = {}
+        if 'text' in arg:
+            body['format'] = 'prometheus'
+        if 'on' in arg or 'off' in arg:
+            body['enabled'] = 'on' in arg
+        self.loop.create_task(self.send('metrics', body))
+
+    def do_profile(self, arg):
+        arg = arg.split()
+        if arg and arg[0] in ('start', 'stop', 'dump'):
+            body = {'command': arg[0]}
+            if len(arg) > 1 and arg[1].isdigit():
+                body['limit'] = int(arg[1])
+            if len(arg) > 2:
+                body['sort'] = arg[2]
+            self.loop.create_task(self.send('profile', body))
+        else:
+            print(self.do_str_profile())
+
     def do_help(self, arg):
         if arg:
             arg = arg.split(' ')
@@ -134,6 +165,14 @@ class Vshell(asynccmd.Cmd):
     def do_str_login():
         return f'Login user and cache Usage: login <username> <password>'
 
+    @staticmethod
+    def do_str_metrics():
+        return f'Show server metrics Usage: metrics [text] [on|off]'
+
+    @staticmethod
+    def do_str_profile():
+        return f'Profile the running server Usage: profile start|stop|dump [limit] [sort]'
+
     @staticmethod
     def do_str_test():
         return f'Run application tests'
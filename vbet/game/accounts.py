@@ -90,10 +90,13 @@ class AccountManager:
     async def update(self, credit: float):
         async with self.credit_lock:
             self._credit = credit
+        self.user.ticket_manager.on_credit(credit)
 
     async def fund(self, credit: float):
         async with self.credit_lock:
             self._credit += credit
+            credit = self._credit
+        self.user.ticket_manager.on_credit(credit)
 
     async def on_win(self, credit: float):
         if self.user.demo:
@@ -1,10 +1,12 @@
 import asyncio
+import zlib
 from typing import Dict, Optional
 
 import aiohttp
 
 import vbet
 from vbet.core import settings
+from vbet.utils.backoff import Backoff
 from vbet.utils.exceptions import InvalidUserAuthentication, InvalidUserHash
 from vbet.utils.log import get_logger
 
@@ -16,7 +18,13 @@ HEADERS = {
 }
 
 
-WSS_URL = 'wss://virtual-proxy.golden-race.net:9443/vs'
+if settings.WSS_URL:
+    WSS_URL = settings.WSS_URL
+elif settings.API_NAME == settings.SIMULATOR:
+    WSS_URL = f'ws://{settings.SIMULATOR_HOST}:{settings.SIMULATOR_PORT}/vs'
+else:
+    WSS_URL = 'wss://virtual-proxy.golden-race.net:9443/vs'
+
 if settings.API_NAME == settings.BETIKA:
     HASH_URL = 'https://api-golden-race.betika.com/betikagr/Login'
     LOGIN_URL = 'https://api.betika.com/v1/login'
@@ -24,6 +32,7 @@ if settings.API_NAME == settings.BETIKA:
 
     async def login_hash(username: str, user_id: int, socket_id: int, http: aiohttp.ClientSession):
         pin_hash: Optional[str] = None
+        backoff = Backoff(settings.RECONNECT_BASE, settings.RECONNECT_MAX)
         while pin_hash is None:
             try:
                 response = await http.post(HASH_URL, json={'profile_id': user_id})  # type: aiohttp.ClientResponse
@@ -36,7 +45,7 @@ if settings.API_NAME == settings.BETIKA:
                         raise InvalidUserHash(username, response.status, body=data)
             except (aiohttp.ClientConnectionError, InvalidUserHash) as err:
                 logger.error(f'[{username}:{socket_id}] get-hash {err}')
-                await asyncio.sleep(30)
+                await asyncio.sleep(backoff.next())
 
 
     async def login_password(username: str, password: str, http: aiohttp.ClientSession):
@@ -63,6 +72,18 @@ if settings.API_NAME == settings.BETIKA:
                 logger.error(f'[{username}] login user timeout {err}')
                 await asyncio.sleep(30)
 
+elif settings.API_NAME == settings.SIMULATOR:
+    HASH_URL = None
+    LOGIN_URL = None
+    COOKIES_URL = 'http://localhost'
+
+    async def login_hash(username: str, user_id: int, socket_id: int, http: aiohttp.ClientSession):
+        # Any hash is accepted, sockets of a user share the simulated account
+        return f'simulator-{user_id}'
+
+    async def login_password(username: str, password: str, http: aiohttp.ClientSession):
+        return zlib.crc32(username.encode()), 'simulator'
+
 else:
     HASH_URL = 'https://www.mozzartbet.co.ke/golden-race-me'
     LOGIN_URL = 'https://www.mozzartbet.co.ke/auth'
@@ -70,6 +91,7 @@ else:
 
     async def login_hash(username: str, user_id: int, socket_id: int, http: aiohttp.ClientSession):
         pin_hash: Optional[str] = None
+        backoff = Backoff(settings.RECONNECT_BASE, settings.RECONNECT_MAX)
         while pin_hash is None:
             try:
                 response = await http.get(HASH_URL)  # type: aiohttp.ClientResponse
@@ -82,7 +104,7 @@ else:
                         raise InvalidUserHash(username, response.status, body=data)
             except (aiohttp.ClientConnectionError, InvalidUserHash) as err:
                 logger.error(f'[{username}:{socket_id}] get-hash {err}')
-                await asyncio.sleep(30)
+                await asyncio.sleep(backoff.next())
 
     async def login_password(username: str, password: str, http: aiohttp.ClientSession):
         unit_id: Optional[int] = None
@@ -3,16 +3,18 @@ from __future__ import annotations
 import asyncio
 import time
 from datetime import datetime, timezone
-from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, TYPE_CHECKING
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
 
 from vbet.core import settings
 from vbet.utils import exceptions
 from vbet.utils.log import get_logger
-from vbet.utils.parser import map_resource_to_name
-from vbet.utils.parser import Resource
+from vbet.utils.metrics import registry
+from vbet.utils.parser import bind_resource_callbacks, Resource
 from . import players
-from .markets import Markets
-from .table import LeagueTable
+from .league_cache import league_cache, LeagueData
+from .markets import get_correct_score
+from .season_cache import SeasonCache
+from .table import create_table, LeagueTable
 from .tickets import Ticket
 
 if TYPE_CHECKING:
@@ -22,6 +24,9 @@ if TYPE_CHECKING:
 logger = get_logger('competition')
 account_logger = get_logger('account')
 
+# Seconds spent in a phase before moving to the next one
+PHASE_TIME = registry.histogram('competition_phase_seconds', 'Competition phase durations', labels=['phase'])
+
 
 class LeagueCompetition:
     SCHEDULED = 0
@@ -31,6 +36,12 @@ class LeagueCompetition:
     TICKETS = 2
     RESULTS = 3
 
+    PHASES = {SLEEPING: 'sleeping', EVENTS: 'events', TICKETS: 'tickets', RESULTS: 'results'}
+
+    # Blocks per history range, n = -HISTORY_SPAN returns the HISTORY_SPAN blocks before eBlockId (excluded) so
+    # ranges anchored HISTORY_SPAN blocks apart are adjacent
+    HISTORY_SPAN = 10
+
     def __init__(self, user: User, game_id: int):
         self.user: User = user
         self.game_id: int = game_id
@@ -40,10 +51,15 @@ class LeagueCompetition:
         self.mode: Optional[float] = None
         self.max_week: int = 38 if game_id not in [settings.BUNDESLIGA, settings.KPL] else 34
         self.event_time: Optional[float] = None
+        self.block_deadline: Optional[float] = None
         self.e_block_id: Optional[int] = None
         self.league: Optional[int] = None
         self.week: Optional[int] = None
-        self.table: LeagueTable = LeagueTable(self.max_week)
+        self.table: LeagueTable = create_table(self.max_week)
+        self.league_data: Optional[LeagueData] = None
+        self.season_cache: SeasonCache = SeasonCache.shared(game_id)
+        self.start_time: Optional[float] = None
+        self.first_ticket_time: Optional[float] = None
         self.caching: bool = False
         self.caching_future: bool = False
         self.cache_enabled: bool = True
@@ -57,7 +73,8 @@ class LeagueCompetition:
         self._online: bool = False
         self.lost: bool = False
         self.restoring: bool = False
-        self.phase: int = LeagueCompetition.SLEEPING
+        self._phase: int = LeagueCompetition.SLEEPING
+        self.phase_time: float = time.perf_counter()
 
         self.required_weeks: List[int] = []
         self.history_count: int = 0
@@ -68,15 +85,21 @@ class LeagueCompetition:
         self.event_xs: Dict[int, Dict] = {}
         self.result_xs: Dict[int, Dict] = {}
         self.history_xs: Dict[int, Dict] = {}
+        self.history_queue: List[int] = []
+        self.history_pending: Set[int] = set()
         self.stats_xs: Dict[int, Dict] = {}
         self.result_event: asyncio.Event = asyncio.Event()
+        # Responses are handled one at a time as when they were dispatched from the socket reader
+        self.receive_lock: asyncio.Lock = asyncio.Lock()
         self.team_labels: Dict[int, str] = {}
         self.active_tickets: List[int] = []
         self.blocks: Dict[int, int] = {}
         self.league_games: Dict[int, Dict] = {}
         self.socket_closed: bool = False
+        self.closing: bool = False
         self.jackpot_ready: bool = False
         self.players: Dict[str, players.Player] = {}
+        self.callbacks: Dict[str, Callable[[int, Any, Any], Coroutine[Any]]] = bind_resource_callbacks(self)
 
     @property
     def online(self):
@@ -95,6 +118,19 @@ class LeagueCompetition:
                 asyncio.ensure_future(self.start())
         self._online = online
 
+    @property
+    def phase(self) -> int:
+        return self._phase
+
+    @phase.setter
+    def phase(self, phase: int):
+        if phase != self._phase:
+            now = time.perf_counter()
+            if registry.enabled:
+                PHASE_TIME.observe(now - self.phase_time, (LeagueCompetition.PHASES[self._phase],))
+            self.phase_time = now
+        self._phase = phase
+
     # Setup
     def init(self):
         installed_players = ['ozil']
@@ -105,12 +141,16 @@ class LeagueCompetition:
             self.players[player.lower()] = player_obj
             player_obj.active = True
 
+        if settings.SEASON_CACHE:
+            self.season_cache.preload()
         logger.info(f'[{self.user.username}:{self.game_id}] competition installed')
 
     async def start(self):
         if self.lost:
             self.lost = False
             self.restoring = True
+        elif self.start_time is None:
+            self.start_time = time.time()
         await self.next_block_event()
 
     # Resources
@@ -185,37 +225,39 @@ class LeagueCompetition:
         options = dict()
         options.setdefault('n', n)
         payload = self.resource_events(options)
-        xs = self.send(Resource.EVENTS, payload)
-        self.event_xs[xs] = payload
+        self.fetch(Resource.EVENTS, payload, self.event_xs, payload)
 
     async def next_result(self, e_block_id: int, n: int, retry_count: int = 0):
         options = dict()
         options.setdefault('e_block_id', e_block_id)
         options.setdefault('n', n)
         payload = self.resource_results(options)
-        xs = self.send(Resource.RESULTS, payload)
-        self.result_xs[xs] = {'payload': payload, 'retry_count': retry_count}
+        self.fetch(Resource.RESULTS, payload, self.result_xs, {'payload': payload, 'retry_count': retry_count})
 
     async def next_history(self, e_block_id: int, n: int, retry_count: int = 0):
         options = dict()
         options.setdefault('e_block_id', e_block_id)
         options.setdefault('n', n)
         payload = self.resource_history(options)
-        xs = self.send(Resource.HISTORY, payload)
-        self.history_xs[xs] = {'payload': payload, 'retry_count': retry_count}
+        self.fetch(Resource.HISTORY, payload, self.history_xs, {'payload': payload, 'retry_count': retry_count})
 
     async def next_stats(self, e_block_id: int, n: int):
         options = dict()
         options.setdefault('e_block_id', e_block_id)
         options.setdefault('n', n)
         payload = self.resource_stats(options)
-        xs = self.send(Resource.STATS, payload)
-        self.stats_xs[xs] = payload
+        self.fetch(Resource.STATS, payload, self.stats_xs, payload)
 
     # Event blocks
     async def next_block_result(self, block: int = 1):
         await self.await_event_time()
-        await self.next_result(self.e_block_id, block)
+        if block == 1 and self.table.event_block_map.get(self.week, None) == self.e_block_id:
+            # Result already fed to the shared league data by another subscriber
+            logger.debug(f'[{self.user.username}:{self.game_id}] Shared Result Block: {self.e_block_id} Week : '
+                         f'{self.week}')
+            await self.on_block_result(self.e_block_id)
+        else:
+            await self.next_result(self.e_block_id, block)
 
     async def next_block_event(self, block: int = 1):
         await self.next_event(block)
@@ -225,7 +267,9 @@ class LeagueCompetition:
 
     # Resources callbacks
     async def events_callback(self, xs: int, valid_response: bool, body: Any):
-        options = self.event_xs.pop(xs)
+        options = self.event_xs.pop(xs, None)
+        if options is None:
+            return
         try:
             if valid_response and isinstance(body, list):
                 try:
@@ -247,7 +291,9 @@ class LeagueCompetition:
             await self.next_event(options.get('n'))
 
     async def results_callback(self, xs: int, valid_response: bool, body: Any):
-        options: Dict = self.result_xs.pop(xs)
+        options: Dict = self.result_xs.pop(xs, None)
+        if options is None:
+            return
         payload = options.get('payload')
         retry_count = options.get('retry_count')
         e_block = payload.get('eBlockId')
@@ -276,10 +322,12 @@ class LeagueCompetition:
                 await self.next_result(err.e_block_id, err.n, err.retry_count + 1)
 
     async def history_callback(self, xs: int, valid_response: bool, body: Any):
+        options: Dict = self.history_xs.pop(xs, None)
+        if options is None:
+            return
         if self.history_count > self.max_history_count:
             self.auto_skip = True
             await self.next_block_event()
-        options: Dict = self.history_xs.pop(xs)
         payload = options.get('payload')
         retry_count = options.get('retry_count')
         e_block = payload.get('eBlockId')
@@ -296,6 +344,8 @@ class LeagueCompetition:
                            f' Retry: {err.retry_count}')
             if retry_count > 3:
                 self.auto_skip = True
+                self.clear_history_plan()
+                self.league_data.end_fetch(self)
                 await self.next_block_event()
             else:
                 await asyncio.sleep(3)
@@ -342,28 +392,31 @@ class LeagueCompetition:
                         half_won = result_data.get('halfWonMarkets')
                         refund_stake = result_data.get('refundMarkets')
                         handicap_data = {'half_lost': half_lost, 'half_won': half_won, 'refund_stake': refund_stake}
-                        x = set(won)
-                        y = set([str(_) for _ in range(15, 43)])
-                        r = list(x & y)
-                        z = r[0]
-                        score = Markets['Correct_Score'][z]['name'].split('_')
-                        results[event_id] = {
-                            'id': event_id, 'A': team_a, 'B': team_b,
-                            'score': (int(score[1]),
-                                      int(score[2]))}
+                        results[event_id] = {'id': event_id, 'A': team_a, 'B': team_b,
+                                             'score': get_correct_score(won)}
                         result_ids[event_id] = [int(_) for _ in won]
                         winning_ids[event_id] = handicap_data
             self.league_games[week] = matches
 
             if self.caching:
                 self.table.feed_result(e_block_id, league, week, results, result_ids, winning_ids)
+            self.store_week(week)
         if self.caching:
+            self.history_pending.discard(e_block)
             missing = self.table.get_missing_weeks()
-            if missing:
+            if missing and self.history_queue:
+                await self.send_history_plan()
+            elif self.history_pending:
+                # Ranges still in flight, merged as they arrive
+                pass
+            elif missing:
+                # Planned ranges did not cover every week, continue with serial hops
                 e_block_id = self.process_missing(missing)
                 await self.next_history(e_block_id, -10)
             else:
                 self.caching = False
+                self.clear_history_plan()
+                self.league_data.end_fetch(self)
                 logger.debug(f'[{self.user.username}:{self.game_id}] History completed {self.league}')
                 await self.dispatch_events()
         else:
@@ -376,6 +429,7 @@ class LeagueCompetition:
                 else:
                     self.caching_future = False
                     self.cached = True
+                    self.league_data.end_fetch(self)
                     logger.debug(f'[{self.user.username}:{self.game_id}] All events cached {self.league}')
                     self.required_weeks = self.get_required_weeks()
                     await self.dispatch_events()
@@ -396,17 +450,18 @@ class LeagueCompetition:
             if match_day == 1:
                 self.auto_skip = False
 
-            self.league_games = {}
-            self.blocks = {}
             self.cached = False
             self.required_weeks = []
             self.league = league
+            self.subscribe_league(league)
         self.week = match_day
         logger.debug(f'[{self.user.username}:{self.game_id}] Event Block: {self.e_block_id} League: {self.league} '
                      f'Week: {self.week}')
         # Generate start time for on demand events
         event_time = data.get('eventTime', None)
         self.process_event_time(event_time)
+        # Only scheduled blocks have a start time from the provider, on demand blocks wait for the tickets
+        self.block_deadline = event_time
         # Parse all events
         events = data.get('events')
         stats = {}
@@ -438,6 +493,9 @@ class LeagueCompetition:
             # Notify table of events
             self.table.on_event(self.league, self.week)
             self.table.feed_stats(self.league, self.week, stats)
+            if not self.league_data.loaded and self.league_data.begin_fetch(self):
+                await self.load_season()
+                self.league_data.end_fetch(self)
             missing = self.table.get_missing_weeks()
             if not missing:
                 await self.dispatch_events()
@@ -447,9 +505,7 @@ class LeagueCompetition:
                     for week in missing:
                         await self.next_result(self.get_block_by_week(week), 1)
                 else:
-                    self.caching = True
-                    e_block_id = self.process_missing(missing)
-                    await self.next_history(e_block_id, -10)
+                    await self.fetch_history(missing)
 
     async def resource_result_process(self, data: Dict):
         e_block_id = data.get('eBlockId', None)
@@ -472,25 +528,22 @@ class LeagueCompetition:
             team_a = self.team_labels.get(int(video_url[4]))
             team_b = self.team_labels.get(int(video_url[5]))
             won = result.get('wonMarkets')
-            x = set(won)
-            y = set([str(_) for _ in range(15, 43)])
-            r = list(x & y)
-            z = r[0]
-            score = Markets['Correct_Score'][z]['name'].split('_')
-            results[event_id] = {
-                'id': event_id, 'A': team_a, 'B': team_b,
-                'score': (int(score[1]),
-                          int(score[2]))}
+            results[event_id] = {'id': event_id, 'A': team_a, 'B': team_b, 'score': get_correct_score(won)}
             # X is won list (wonMarketIds)
             result_ids[event_id] = [int(_) for _ in won]
             winning_ids[event_id] = handicap_data
 
+        if not self.auto_skip:
+            self.table.feed_result(e_block_id, self.league, week, results, result_ids, winning_ids)
+            self.store_week(week)
+        await self.on_block_result(e_block_id)
+
+    async def on_block_result(self, e_block_id: int):
         if self.auto_skip:
             self.phase = LeagueCompetition.EVENTS
             logger.debug(f'[{self.user.username}:{self.game_id}] Auto skipping league {self.league}')
             await self.next_block_event()
         else:
-            self.table.feed_result(e_block_id, self.league, week, results, result_ids, winning_ids)
             if self.caching_multiple:
                 missing = self.table.get_missing_weeks()
                 if not missing:
@@ -548,11 +601,18 @@ class LeagueCompetition:
     async def dispatch_events(self):
         missing_blocks = self.get_missing_blocks()
         if missing_blocks:
-            self.caching_future = True
-            self.cached = False
-            logger.debug(f'[{self.user.username}:{self.game_id}] Caching league {self.league} ')
-            await self.next_block_future(self.e_block_id)
+            if self.league_data.begin_fetch(self):
+                self.caching_future = True
+                self.cached = False
+                logger.debug(f'[{self.user.username}:{self.game_id}] Caching league {self.league} ')
+                await self.next_block_future(self.e_block_id)
+            else:
+                asyncio.create_task(self.wait_league_data())
         else:
+            if not self.cached:
+                # Blocks cached by another subscriber of the league data
+                self.cached = True
+                self.required_weeks = self.get_required_weeks()
             not_ready = self.table.check_weeks(self.required_weeks)
             if self.future_results and not_ready:
                 asyncio.create_task(self.get_future_weeks(not_ready))
@@ -573,18 +633,152 @@ class LeagueCompetition:
                     logger.debug(f'[{self.user.username}:{self.game_id}] No Tickets available')
                     await self.next_block_result()
 
+    # League data
+    def subscribe_league(self, league: int):
+        if self.league_data is not None:
+            league_cache.release(self, self.league_data)
+        self.league_data = league_cache.acquire(self, league)
+        self.table = self.league_data.table
+        self.league_games = self.league_data.league_games
+        self.blocks = self.league_data.blocks
+
+    async def load_season(self):
+        self.league_data.loaded = True
+        if not settings.SEASON_CACHE:
+            return
+        weeks = await self.season_cache.load(self.league)
+        loaded_results = 0
+        for week, week_data in weeks.items():
+            e_block_id = week_data.get('e_block_id')
+            if e_block_id is None:
+                continue
+            self.blocks[e_block_id] = week
+            if week_data.get('matches'):
+                self.league_games.setdefault(week, week_data.get('matches'))
+            if week_data.get('results') and week not in self.table.event_block_map:
+                self.table.feed_result(e_block_id, self.league, week, week_data.get('results'),
+                                       week_data.get('results_ids'), week_data.get('winning_ids'))
+                loaded_results += 1
+        logger.info(f'[{self.user.username}:{self.game_id}] Season cache League: {self.league} Blocks: {len(weeks)} '
+                    f'Results: {loaded_results}')
+
+    def store_week(self, week: int):
+        if settings.SEASON_CACHE and week is not None:
+            results = self.table.get_week_results(week)
+            # Already written by a subscriber of the same league data
+            if self.league_data.stored_weeks.get(week, None) in (True, bool(results)):
+                return
+            self.league_data.stored_weeks[week] = bool(results)
+            data = {
+                'e_block_id': self.get_block_by_week(week),
+                'matches': self.league_games.get(week, {}),
+                'results': results,
+                'results_ids': self.table.results_ids_pool.get(week, {}),
+                'winning_ids': self.table.winning_ids_pool.get(week, {})
+            }
+            asyncio.create_task(self.season_cache.write_week(self.league, week, data))
+
+    async def fetch_history(self, missing: List[int]):
+        if self.league_data.begin_fetch(self):
+            self.caching = True
+            self.clear_history_plan()
+            if settings.HISTORY_IN_FLIGHT > 1:
+                self.history_queue = self.plan_history(self.e_block_id, self.week, missing, self.blocks)
+                logger.debug(f'[{self.user.username}:{self.game_id}] History plan {self.history_queue} League: '
+                             f'{self.league}')
+                await self.send_history_plan()
+            else:
+                e_block_id = self.process_missing(missing)
+                await self.next_history(e_block_id, -10)
+        else:
+            asyncio.create_task(self.wait_league_data())
+
+    @classmethod
+    def plan_history(cls, e_block_id: int, week: int, missing: List[int], blocks: Dict[int, int]) -> List[int]:
+        # Event blocks of a playlist are sequential, so unknown weeks are placed relative to the current block
+        week_blocks = {w: block for block, w in blocks.items()}
+        anchors = set()
+        for missing_week in missing:
+            distance = e_block_id - week_blocks.get(missing_week, e_block_id - (week - missing_week))
+            anchors.add(e_block_id - (max(distance, 1) - 1) // cls.HISTORY_SPAN * cls.HISTORY_SPAN)
+        return sorted(anchors, reverse=True)
+
+    async def send_history_plan(self):
+        while self.history_queue and len(self.history_pending) < settings.HISTORY_IN_FLIGHT:
+            e_block_id = self.history_queue.pop(0)
+            self.history_pending.add(e_block_id)
+            await self.next_history(e_block_id, -self.HISTORY_SPAN)
+
+    def clear_history_plan(self):
+        self.history_queue = []
+        self.history_pending.clear()
+
+    def release_fetch(self):
+        # History responses of a lost socket never arrive, a waiting subscriber takes the fetch over
+        if self.league_data is not None and self.league_data.fetcher is self:
+            self.caching = False
+            self.caching_future = False
+            self.clear_history_plan()
+            self.league_data.end_fetch(self)
+
+    async def wait_league_data(self):
+        league_data = self.league_data
+        logger.debug(f'[{self.user.username}:{self.game_id}] Waiting for league data {self.league}')
+        await league_data.wait_fetch()
+        if league_data is not self.league_data:
+            return
+        missing = self.table.get_missing_weeks()
+        if missing:
+            await self.fetch_history(missing)
+        else:
+            await self.dispatch_events()
+
     # API
     def send(self, resource: str, payload: Dict) -> int:
         return self.user.send(self.game_id, resource, payload)
 
+    def fetch(self, resource: str, payload: Dict, xs_map: Dict[int, Dict], options: Dict):
+        asyncio.create_task(self._fetch(resource, payload, xs_map, options))
+
+    async def _fetch(self, resource: str, payload: Dict, xs_map: Dict[int, Dict], options: Dict):
+        retry_count = 0
+        while True:
+            request = None
+            try:
+                request = self.user.request(self.game_id, resource, payload)
+                xs_map[request.xs] = options
+                valid_response, body = await request
+            except (exceptions.RequestTimeout, exceptions.SendFailed) as err:
+                # Timed out or dropped by a full send queue, both are safe to send again
+                xs_map.pop(err.xs, None)
+                if retry_count < settings.REQUEST_RETRIES:
+                    retry_count += 1
+                    logger.warning(f'[{self.user.username}:{self.game_id}] {err} Retry: {retry_count}')
+                    continue
+                # Hand the failure to the resource callback retry logic
+                xs_map[err.xs] = options
+                valid_response, body = False, None
+            except exceptions.SocketClosed as err:
+                # Competition is restarted once the socket is back online
+                if request is not None:
+                    xs_map.pop(request.xs, None)
+                if resource == Resource.HISTORY:
+                    self.release_fetch()
+                logger.debug(f'[{self.user.username}:{self.game_id}] {err}')
+                return
+            callback = self.callbacks.get(resource, None)
+            if callback is not None:
+                async with self.receive_lock:
+                    await callback(request.xs, valid_response, body)
+            else:
+                xs_map.pop(request.xs, None)
+            return
+
     async def receive(self, xs: int, resource: str, payload: Dict):
-        try:
-            func_name = f'{map_resource_to_name(resource)}_callback'
-            callback = getattr(self, func_name)  # type: Callable[[int, str, Dict], Coroutine[Any]]
-        except AttributeError:
-            pass
-        else:
-            await callback(xs, resource, payload)
+        callback = self.callbacks.get(resource, None)
+        if callback is not None:
+            async with self.receive_lock:
+                await callback(xs, resource, payload)
 
     def modify_player(self, player_name: str, odd_id: str):
         player = self.players.get(player_name)
@@ -605,12 +799,17 @@ class LeagueCompetition:
     # Tickets processing
     async def process_tickets(self, tickets: List):
         self.reset_tickets()
+        if self.first_ticket_time is None and self.start_time is not None:
+            self.first_ticket_time = time.time()
+            logger.info(f'[{self.user.username}:{self.game_id}] Time to first ticket '
+                        f'{self.first_ticket_time - self.start_time:.3f}s')
         for ticket in tickets:
             content = self.serialize_ticket(ticket)
             setattr(ticket, 'content', content)
+            ticket.deadline = self.block_deadline
             self.user.register_ticket(ticket)
-            await self.user.ticket_manager.add_ticket(ticket)
             self.active_tickets.append(ticket.ticket_key)
+        await self.user.ticket_manager.add_tickets(tickets)
         logger.debug(f'[{self.user.username}:{self.game_id}] Processing tickets complete : {len(tickets)}')
 
     def serialize_ticket(self, ticket) -> Dict:
@@ -737,7 +936,8 @@ class LeagueCompetition:
 
     # Save League
     async def on_league_completed(self):
-        if self.table.is_complete():
+        if self.table.is_complete() and not self.league_data.stored:
+            self.league_data.stored = True
             league_info = {}
             for week, week_data in self.league_games.items():
                 week_results = self.table.get_week_results(week)
@@ -757,10 +957,13 @@ class LeagueCompetition:
 
     # Shutdown
     async def exit(self):
+        self.closing = True
         futures = {}
         for player_id, player in self.players.items():
             player.closing = True
             futures[player_id] = asyncio.create_task(player.exit())
         done, p = await asyncio.wait(list(futures.values()), return_when=asyncio.ALL_COMPLETED)
-        socket = self.user.get_socket(self.game_id)
-        await socket.exit()
+        if self.league_data is not None:
+            league_cache.release(self, self.league_data)
+            self.league_data = None
+        await self.user.release_socket(self.game_id)
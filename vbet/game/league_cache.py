@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, Optional, Set, Tuple, TYPE_CHECKING
+
+from vbet.core import settings
+from vbet.utils.log import get_logger
+from .table import create_table, LeagueTable
+
+if TYPE_CHECKING:
+    from vbet.game.competition import LeagueCompetition
+
+
+logger = get_logger('league-cache')
+
+
+class LeagueData:
+    """
+    League state shared by every competition following the same playlist league.
+
+    Only one subscriber fetches history/future blocks at a time (the fetcher), the others wait on fetched and
+    then read the table, league games and blocks populated for them.
+    """
+    def __init__(self, key: Tuple[str, int, int], max_week: int):
+        self.key: Tuple[str, int, int] = key
+        self.table: LeagueTable = create_table(max_week)
+        self.league_games: Dict[int, Dict] = {}
+        self.blocks: Dict[int, int] = {}
+        self.subscribers: Set[LeagueCompetition] = set()
+        self.fetcher: Optional[LeagueCompetition] = None
+        self.fetched: asyncio.Event = asyncio.Event()
+        self.fetched.set()
+        self.stored: bool = False
+        self.loaded: bool = False
+        # week -> results included, the season cache file is written once per state of the week
+        self.stored_weeks: Dict[int, bool] = {}
+
+    @property
+    def references(self) -> int:
+        return len(self.subscribers)
+
+    def begin_fetch(self, competition: LeagueCompetition) -> bool:
+        if self.fetcher is None or self.fetcher is competition:
+            self.fetcher = competition
+            self.fetched.clear()
+            return True
+        return False
+
+    def end_fetch(self, competition: LeagueCompetition):
+        if self.fetcher is competition:
+            self.fetcher = None
+            self.fetched.set()
+
+    async def wait_fetch(self):
+        await self.fetched.wait()
+
+
+class LeagueCache:
+    """
+    Process wide reference counted registry of LeagueData keyed by (api, playlist id, league id).
+    """
+    leagues: Dict[Tuple[str, int, int], LeagueData] = {}
+
+    def acquire(self, competition: LeagueCompetition, league: int) -> LeagueData:
+        key = (settings.API_NAME, competition.game_id, league)
+        if not settings.SHARED_LEAGUE_DATA:
+            data = LeagueData(key, competition.max_week)
+            data.subscribers.add(competition)
+            return data
+        data = self.leagues.get(key, None)
+        if data is None:
+            data = LeagueData(key, competition.max_week)
+            self.leagues[key] = data
+            logger.debug(f'[{competition.game_id}] league data created {key}')
+        data.subscribers.add(competition)
+        return data
+
+    def release(self, competition: LeagueCompetition, data: LeagueData):
+        data.subscribers.discard(competition)
+        data.end_fetch(competition)
+        if not data.subscribers and self.leagues.get(data.key, None) is data:
+            self.leagues.pop(data.key, None)
+            logger.debug(f'[{competition.game_id}] league data released {data.key}')
+
+    def get(self, api: str, game_id: int, league: int) -> Optional[LeagueData]:
+        return self.leagues.get((api, game_id, league), None)
+
+
+league_cache = LeagueCache()
@@ -1,3 +1,5 @@
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
 Markets = {
     'Match_Result': {'0': {'name': 'Home', 'key': '0'}, '1': {'name': 'Away', 'key': '1'}, '2': {'name': 'Draw', 'key': '2'}},
     'Double_Result': {'3': {'name': 'HomeHome', 'key': '3'}, '4': {'name': 'HomeDraw', 'key': '4'}, '5': {'name': 'HomeAway', 'key': '5'}, '6': {'name': 'DrawHome', 'key': '6'}, '7': {'name': 'DrawDraw', 'key': '7'}, '8': {'name': 'DrawAway', 'key': '8'}, '9': {'name': 'AwayHome', 'key': '9'}, '10': {'name': 'AwayDraw', 'key': '10'}, '11': {'name': 'AwayAway', 'key': '11'}},
@@ -55,3 +57,56 @@ Markets = {
     'Over_Under_2_25': {'239': {'name': 'under2_25', 'key': '183'}, '240': {'name': 'over2_25', 'key': '184'}},
     'Over_Under_2_75': {'241': {'name': 'under2_75', 'key': '185'}, '242': {'name': 'over2_75', 'key': '186'}}
 }
+
+
+class MarketInfo(NamedTuple):
+    market_type: str
+    name: str
+    odd_index: int
+    score: Optional[Tuple[int, int]]
+    goal_line: Optional[float]
+
+
+def _parse_score(market_type: str, name: str) -> Optional[Tuple[int, int]]:
+    if market_type == 'Correct_Score':
+        score = name.split('_')
+        return int(score[1]), int(score[2])
+    return None
+
+
+def _parse_goal_line(market_type: str, name: str) -> Optional[float]:
+    if market_type == 'Total_Goals':
+        return float(name.split('_')[1])
+    if 'Over_Under_' in market_type:
+        line = market_type.split('Over_Under_')[1]
+        return float(line.replace('_', '.', 1))
+    return None
+
+
+def _compile_index() -> Dict[str, MarketInfo]:
+    index = {}
+    for market_type, market_data in Markets.items():
+        for market_id, data in market_data.items():
+            name = data.get('name')
+            index[market_id] = MarketInfo(market_type, name, int(data.get('key')),
+                                          _parse_score(market_type, name), _parse_goal_line(market_type, name))
+    return index
+
+
+# Built once at import. Keyed by the market (odd) id as sent by the provider in wonMarkets.
+MarketIndex: Dict[str, MarketInfo] = _compile_index()
+
+CorrectScores: Dict[str, Tuple[int, int]] = {market_id: info.score for market_id, info in MarketIndex.items()
+                                             if info.score is not None}
+
+
+def get_market_info(market_id: str) -> Optional[MarketInfo]:
+    return MarketIndex.get(market_id, None)
+
+
+def get_correct_score(won_markets: Iterable[str]) -> Optional[Tuple[int, int]]:
+    for market_id in won_markets:
+        score = CorrectScores.get(market_id, None)
+        if score is not None:
+            return score
+    return None
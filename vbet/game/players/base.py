@@ -4,7 +4,7 @@ import asyncio
 from typing import Any, List, Optional, Tuple, TYPE_CHECKING
 
 from vbet.game.accounts import Account
-from vbet.game.markets import Markets
+from vbet.game.markets import MarketIndex
 from vbet.game.tickets import Ticket
 from vbet.utils.log import get_logger
 
@@ -152,11 +152,9 @@ class Player:
 
     @staticmethod
     def get_market_info(market: str) -> Tuple[Any, Any, Any]:
-        for market_type, market_data in Markets.items():
-            if market in market_data:
-                data = market_data.get(market)
-                if data:
-                    return market_type, data.get('name'), int(data.get('key'))
+        info = MarketIndex.get(market, None)
+        if info:
+            return info.market_type, info.name, info.odd_index
         return None, None, None
 
     def get_required_weeks(self):
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+import aiofile
+
+from vbet.core import settings
+from vbet.utils.log import get_logger
+from vbet.utils.parser import create_dir, decode_json, encode_json_bytes
+
+logger = get_logger('season-cache')
+
+
+class SeasonCache:
+    """
+    Write through per week cache of parsed league data for a playlist.
+
+    Layout is CACHE_DIR/<game_id>/<league>/<week>.json holding the event block id, the week games and the
+    parsed results once they are known. The newest league is read in the background when the first competition of
+    the playlist is installed so a warm restart only has to fetch the weeks that are not on disk.
+    """
+    # Playlist directories shared by every competition of the process
+    shared_caches: Dict[str, 'SeasonCache'] = {}
+
+    def __init__(self, game_id: int):
+        self.game_id: int = game_id
+        self.directory: str = f'{settings.CACHE_DIR}/{game_id}'
+        self.preload_future: Optional[asyncio.Future] = None
+        self.preloaded: bool = False
+        # (league, week) -> latest data of a file being written
+        self.pending_writes: Dict[Tuple[int, int], Dict] = {}
+
+    @classmethod
+    def shared(cls, game_id: int) -> 'SeasonCache':
+        directory = f'{settings.CACHE_DIR}/{game_id}'
+        cache = cls.shared_caches.get(directory, None)
+        if cache is None:
+            cache = cls.shared_caches[directory] = cls(game_id)
+        return cache
+
+    def get_leagues(self) -> List[int]:
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_dir() and entry.name.isdigit()]
+        except FileNotFoundError:
+            return []
+        entries.sort(key=self.league_mtime)
+        return [int(entry.name) for entry in entries]
+
+    @staticmethod
+    def is_week(name: str) -> bool:
+        return name.endswith('.json') and name[:-5].isdigit()
+
+    @classmethod
+    def league_mtime(cls, entry: os.DirEntry) -> float:
+        # Last week written rather than the directory mtime, which any entry change moves
+        try:
+            return max([week.stat().st_mtime for week in os.scandir(entry.path) if cls.is_week(week.name)],
+                       default=entry.stat().st_mtime)
+        except FileNotFoundError:
+            return 0
+
+    def preload(self):
+        if not self.preloaded:
+            self.preloaded = True
+            self.preload_future = asyncio.ensure_future(self.read_latest())
+
+    async def read_latest(self) -> Tuple[Optional[int], Dict[int, Dict]]:
+        leagues = self.get_leagues()
+        if leagues:
+            league = leagues[-1]
+            return league, await self.read_league(league)
+        return None, {}
+
+    async def load(self, league: int) -> Dict[int, Dict]:
+        if self.preload_future is not None:
+            future, self.preload_future = self.preload_future, None
+            preloaded_league, weeks = await future
+            if preloaded_league == league:
+                return weeks
+        return await self.read_league(league)
+
+    async def read_league(self, league: int) -> Dict[int, Dict]:
+        weeks = {}
+        league_dir = f'{self.directory}/{league}'
+        try:
+            names = [name for name in os.listdir(league_dir) if self.is_week(name)]
+        except FileNotFoundError:
+            return weeks
+        for name in names:
+            try:
+                async with aiofile.AIOFile(f'{league_dir}/{name}', 'rb') as afp:
+                    data = decode_json(await afp.read())
+            except OSError as err:
+                logger.warning(f'[{self.game_id}] season cache read failed {league_dir}/{name} {err}')
+                continue
+            if isinstance(data, dict):
+                week = int(name[:-5])
+                weeks[week] = self.parse_week(data)
+        return weeks
+
+    @staticmethod
+    def parse_week(data: Dict) -> Dict:
+        # Json object keys are strings, restore the integer event ids and score tuples
+        results = {}
+        for event_id, event in data.get('results', {}).items():
+            score = event.get('score')
+            results[int(event_id)] = dict(event, score=tuple(score) if score is not None else None)
+        return {
+            'e_block_id': data.get('e_block_id'),
+            'matches': {int(event_id): match for event_id, match in data.get('matches', {}).items()},
+            'results': results,
+            'results_ids': {int(event_id): won for event_id, won in data.get('results_ids', {}).items()},
+            'winning_ids': {int(event_id): winnings for event_id, winnings in data.get('winning_ids', {}).items()}
+        }
+
+    async def write_week(self, league: int, week: int, data: Dict):
+        key = (league, week)
+        writing = key in self.pending_writes
+        self.pending_writes[key] = data
+        if writing:
+            # Picked up by the running writer of the file once its current write completes
+            return
+        league_dir = f'{self.directory}/{league}'
+        if not os.path.isdir(league_dir):
+            create_dir(league_dir)
+            self.prune()
+        try:
+            while True:
+                data = self.pending_writes[key]
+                # Written aside and renamed over the week so a crash never leaves a truncated file
+                path = f'{league_dir}/{week}.json'
+                try:
+                    async with aiofile.AIOFile(f'{path}.tmp', 'wb') as afp:
+                        await afp.write(encode_json_bytes(data))
+                        await afp.fsync()
+                    os.replace(f'{path}.tmp', path)
+                except OSError as err:
+                    logger.warning(f'[{self.game_id}] season cache write failed {league}:{week} {err}')
+                if self.pending_writes[key] is data:
+                    break
+        finally:
+            self.pending_writes.pop(key, None)
+
+    def prune(self):
+        leagues = self.get_leagues()
+        for league in leagues[:-settings.SEASON_CACHE_LEAGUES]:
+            shutil.rmtree(f'{self.directory}/{league}', ignore_errors=True)
@@ -3,14 +3,18 @@ from __future__ import annotations
 import asyncio
 import socket
 import time
-from typing import Dict, Optional, TYPE_CHECKING
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
 
 import aiohttp
 import websockets
 
+from vbet.core import settings
 from vbet.game.api.auth import login_hash, WSS_URL
+from vbet.utils import exceptions
+from vbet.utils.backoff import Backoff
 from vbet.utils.log import get_logger
-from vbet.utils.parser import decode_json, encode_json, inspect_websocket_response, Resource
+from vbet.utils.metrics import Histogram, registry
+from vbet.utils.parser import decode_json, decode_json_pool, encode_json, inspect_websocket_response, Resource
 
 if TYPE_CHECKING:
     from vbet.game.user import User
@@ -21,6 +25,35 @@ logger = get_logger('socket')
 COMPETITION_SOCKET = 0
 TICKET_SOCKET = 1
 
+# Seconds from losing a socket to it being logged in again
+RECONNECT_LATENCY = registry.histogram('socket_reconnect_seconds', 'Socket reconnect latency')
+
+DECODE_TIME = registry.histogram('socket_decode_seconds', 'Frame decode time', Histogram.FAST_BUCKETS, ['offloaded'])
+
+DISPATCH_TIME = registry.histogram('socket_dispatch_seconds', 'Frame dispatch time by resource',
+                                   Histogram.FAST_BUCKETS, ['resource'])
+
+# Request round trips, competition sockets carrying several playlists are compared against dedicated ones
+REQUEST_LATENCY = registry.histogram('socket_request_seconds', 'Request round trip by socket mode', labels=['mode'])
+
+MODE_NAMES = {COMPETITION_SOCKET: 'competition', TICKET_SOCKET: 'ticket'}
+
+
+class Request(asyncio.Future):
+    """
+    Future resolved with (valid_response, body) when the response carrying xs is received.
+    """
+    def __init__(self, xs: int, resource: str, *, loop: asyncio.AbstractEventLoop):
+        super().__init__(loop=loop)
+        self.xs: int = xs
+        self.resource: str = resource
+        self.sent_time: float = time.time()
+        self.timeout_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.sent_time
+
 
 class Socket:
     HASH = 0
@@ -39,6 +72,20 @@ class Socket:
     MESSAGE_TIMEOUT_CODE = 102
     ERROR_CODE = 103
 
+    RTT_WEIGHT = 0.2
+
+    # Send queue priorities, lower is written first
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_LOW = 2
+    PRIORITIES = {
+        Resource.LOGIN: PRIORITY_HIGH,
+        Resource.TICKETS: PRIORITY_HIGH,
+        Resource.SYNC: PRIORITY_LOW,
+        Resource.STATS: PRIORITY_LOW,
+        Resource.TICKETS_FIND_BY_ID: PRIORITY_LOW
+    }
+
     def __init__(self, user: User, socket_id: int, mode: int = 0):
         self.alive: bool = True
         self.user: User = user
@@ -53,18 +100,29 @@ class Socket:
         self.hash_future: Optional[asyncio.Future] = None
         self.event_loop_future: Optional[asyncio.Future] = None
         self.online_hash: str = ''
+        self.online_hash_time: float = 0
         self._socket: Optional[websockets.WebSocketClientProtocol] = None
         self.error_code: int = Socket.CLOSE_CODE
         self.profile: str = 'WEB'
-        self.mode: int = COMPETITION_SOCKET if mode == COMPETITION_SOCKET else mode
+        self.mode: int = mode
         self.last_used: float = time.time()
+        self.requests: Dict[int, Request] = {}
+        self.send_queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=settings.SEND_QUEUE_SIZE)
+        self.writer_future: Optional[asyncio.Future] = None
+        # Frame processing metrics
+        self.messages: int = 0
+        self.offloaded_messages: int = 0
+        self.decode_time: float = 0
+        self.handle_time: float = 0
+        # Request round trip, exponentially weighted
+        self.rtt: float = 0
+        self.completed_requests: int = 0
+        self.backoff: Backoff = Backoff(settings.RECONNECT_BASE, settings.RECONNECT_MAX)
+        self.lost_time: Optional[float] = None
 
     def login_hash_callback(self, future: asyncio.Future):
         if not self.alive:
-            if self.mode == COMPETITION_SOCKET:
-                asyncio.create_task(self.user.socket_offline(self.socket_id))
-            else:
-                asyncio.create_task(self.user.ticket_manager.socket_offline(self.socket_id))
+            self.notify_offline()
         else:
             if not future.cancelled():
                 result = future.result()
@@ -76,26 +134,51 @@ class Socket:
     def event_loop_callback(self, future: asyncio.Future):
         self.authorized = False
         self.connected = False
+        self.stop_writer()
+        self.fail_requests()
         if self._socket is not None:
             if not self._socket.closed:
                 asyncio.create_task(self._socket.close())
         if self.alive:
-            asyncio.create_task(self.user.socket_lost(self.socket_id))
-            logger.debug(f'[{self.user.username}:{self.socket_id}] restarting socket')
-            self.connect()
-        else:
+            if self.lost_time is None:
+                self.lost_time = time.time()
             if self.mode == COMPETITION_SOCKET:
-                asyncio.create_task(self.user.socket_offline(self.socket_id))
+                asyncio.create_task(self.user.socket_lost(self.socket_id))
             else:
-                asyncio.create_task(self.user.ticket_manager.socket_offline(self.socket_id))
+                asyncio.create_task(self.user.ticket_manager.socket_lost(self.socket_id))
+            delay = self.backoff.next()
+            logger.debug(f'[{self.user.username}:{self.socket_id}] restarting socket in {delay:.3f}s')
+            asyncio.get_running_loop().call_later(delay, self.reconnect)
+        else:
+            self.notify_offline()
 
     def connect(self):
         self.status = Socket.HASH
 
-        self.hash_future = asyncio.create_task(login_hash(self.user.username, self.user.user_id, self.socket_id,
-                                                          self.user.http))
+        self.hash_future = asyncio.create_task(self.get_online_hash())
         self.hash_future.add_done_callback(self.login_hash_callback)
 
+    async def get_online_hash(self) -> str:
+        # A reconnect logs in again with the hash of this socket while it is fresh, a rejected hash is dropped by
+        # login_failed so the next attempt fetches a new one. Sockets never share a hash.
+        if self.online_hash and time.time() - self.online_hash_time < settings.ONLINE_HASH_TTL:
+            return self.online_hash
+        online_hash = await login_hash(self.user.username, self.user.user_id, self.socket_id, self.user.http)
+        self.online_hash_time = time.time()
+        return online_hash
+
+    def reconnect(self):
+        if self.alive:
+            self.connect()
+        else:
+            self.notify_offline()
+
+    def notify_offline(self):
+        if self.mode == COMPETITION_SOCKET:
+            asyncio.create_task(self.user.socket_offline(self.socket_id))
+        else:
+            asyncio.create_task(self.user.ticket_manager.socket_offline(self.socket_id))
+
     async def event_loop(self):
         retry_connect: bool = True
         while retry_connect:
@@ -104,11 +187,12 @@ class Socket:
             try:
                 self.authorized = False
                 logger.info(f'[{self.user.username}:{self.socket_id}] opening socket [{self.online_hash}]')
-                async with websockets.connect(WSS_URL, close_timeout=2, port=9443) as sock:
+                async with websockets.connect(WSS_URL, close_timeout=2) as sock:
                     self.status = Socket.CONNECTED
                     self._socket = sock
                     self.client_id = ''
                     self.connected = True
+                    self.writer_future = asyncio.create_task(self.writer())
                     logger.debug(f'[{self.user.username}:{self.socket_id}] socket connected [ {self.online_hash}] '
                                  f'[{self._socket.remote_address}]')
                     await self.login()
@@ -145,23 +229,67 @@ class Socket:
                             logger.warning(f'[{self.user.username}:{self.socket_id}] socket login timeout')
                         elif self.error_code == Socket.ERROR_CODE or self.error_code == Socket.CLOSE_CODE:
                             break
-                logger.debug(f'[{self.user.username}:{self.socket_id}] socket disconnected [{self.online_hash}]')
+                logger.debug(f'[{self.user.username}:{self.socket_id}] socket disconnected [{self.online_hash}] '
+                             f'{self.stats}')
                 self.connected = False
             except (aiohttp.ClientConnectionError, socket.gaierror, websockets.InvalidHandshake) as err:
                 retry_connect = True
                 logger.warning(f'[{self.user.username}:{self.socket_id}] websocket connection failed {err}')
-                await asyncio.sleep(Socket.LOGIN_RETRY_TIMEOUT)
-
-    async def process_message(self, message: str):
-        message = decode_json(message)
+                await asyncio.sleep(self.backoff.next())
+
+    async def process_message(self, message: Union[str, bytes]):
+        start = time.perf_counter()
+        offloaded = len(message) > settings.DECODE_OFFLOAD_SIZE
+        if offloaded:
+            self.offloaded_messages += 1
+            message = await decode_json_pool(message)
+        else:
+            message = decode_json(message)
+        decoded = time.perf_counter()
+        self.messages += 1
+        self.decode_time += decoded - start
+        if registry.enabled:
+            DECODE_TIME.observe(decoded - start, (offloaded,))
+        if not isinstance(message, dict):
+            return
         data = inspect_websocket_response(message)
+        resource = None
         if isinstance(data, tuple):
             (xs, resource, status_code, valid_response, body) = data
             # logger.debug(f'[{self.user.username}:{self.socket_id}] {resource} Response')
+            request = self.requests.pop(xs, None) if self.requests else None
             if resource == Resource.LOGIN:
                 await self.login_callback(valid_response, body)
+            elif request is not None:
+                if not request.done():
+                    self.update_rtt(request.elapsed)
+                    request.set_result((valid_response, body))
             else:
                 await self.user.receive(self.socket_id, xs, resource, valid_response, body)
+        handle_time = time.perf_counter() - decoded
+        self.handle_time += handle_time
+        if registry.enabled:
+            DISPATCH_TIME.observe(handle_time, (resource,))
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            'messages': self.messages,
+            'offloaded_messages': self.offloaded_messages,
+            'decode_time': round(self.decode_time, 6),
+            'handle_time': round(self.handle_time, 6),
+            'requests': self.completed_requests,
+            'rtt': round(self.rtt, 6)
+        }
+
+    def update_rtt(self, elapsed: float):
+        if registry.enabled:
+            REQUEST_LATENCY.observe(elapsed, (MODE_NAMES.get(self.mode, self.mode),))
+        self.completed_requests += 1
+        if self.completed_requests == 1:
+            self.rtt = elapsed
+        else:
+            self.rtt += Socket.RTT_WEIGHT * (elapsed - self.rtt)
 
     async def login(self):
         login_body = {'onlineHash': self.online_hash, 'profile': self.profile}
@@ -191,46 +319,147 @@ class Socket:
     async def login_failed(self, body: Dict):
         logger.error(f'[{self.user.username}:{self.socket_id}] authentication failed [{self.online_hash}] {body}')
         self.status = Socket.NOT_AUTHORIZED
+        self.online_hash = ''
         await self._socket.close()
 
     async def login_success(self):
         self.authorized = True
         self.status = Socket.READY
+        self.backoff.reset()
+        if self.lost_time is not None:
+            latency = time.time() - self.lost_time
+            self.lost_time = None
+            RECONNECT_LATENCY.observe(latency)
+            logger.info(f'[{self.user.username}:{self.socket_id}] socket reconnected in {latency:.3f}s')
         if self.mode == COMPETITION_SOCKET:
             asyncio.create_task(self.user.socket_online(self.socket_id))
         else:
             asyncio.create_task(self.user.ticket_manager.socket_online(self.socket_id))
 
-    def send(self, resource: str, query=None, body=None) -> int:
+    def send(self, resource: str, query=None, body=None, on_error: Optional[Callable[[int, Exception], None]] = None,
+             on_written: Optional[Callable[[int], None]] = None) -> int:
         if self.connected:
             self.xs += 1
-            if query is not None:
-                method = 'GET'
-            else:
-                method = 'POST'
-                query = {}
-            headers = {'Content-Type': 'application/json'}
-            if resource != Resource.LOGIN:
-                headers['clientId'] = self.client_id
-            data = {
-                'type': 'REQUEST',
-                'xs': self.xs,
-                'ts': int(time.time() * 1000),
-                'req': {
-                    'method': method,
-                    'query': query,
-                    'headers': headers,
-                    'resource': resource,
-                    'basePath': '/api/client/v0.1',
-                    'host': 'wss://virtual-proxy.golden-race.net:9443'
-                }
-            }
-            if method == "POST":
-                data['req']['body'] = body
-            asyncio.create_task(self._send(resource, data))
+            self.enqueue(self.xs, resource, self.build_frame(self.xs, resource, query, body), on_error, on_written)
             return self.xs
         return -1
 
+    def build_frame(self, xs: int, resource: str, query=None, body=None) -> Dict:
+        if query is not None:
+            method = 'GET'
+        else:
+            method = 'POST'
+            query = {}
+        headers = {'Content-Type': 'application/json'}
+        if resource != Resource.LOGIN:
+            headers['clientId'] = self.client_id
+        data = {
+            'type': 'REQUEST',
+            'xs': xs,
+            'ts': int(time.time() * 1000),
+            'req': {
+                'method': method,
+                'query': query,
+                'headers': headers,
+                'resource': resource,
+                'basePath': '/api/client/v0.1',
+                'host': 'wss://virtual-proxy.golden-race.net:9443'
+            }
+        }
+        if method == "POST":
+            data['req']['body'] = body
+        return data
+
+    def enqueue(self, xs: int, resource: str, data: Dict, on_error: Optional[Callable[[int, Exception], None]],
+                on_written: Optional[Callable[[int], None]] = None):
+        priority = Socket.PRIORITIES.get(resource, Socket.PRIORITY_NORMAL)
+        try:
+            self.send_queue.put_nowait((priority, xs, resource, data, on_error, on_written))
+        except asyncio.QueueFull:
+            logger.warning(f'[{self.user.username}:{self.socket_id}] send queue full dropping {resource} [{xs}]')
+            self.fail_frame(xs, resource, on_error, exceptions.SendFailed(self.socket_id, xs, resource, 'queue full'))
+
+    def fail_frame(self, xs: int, resource: str, on_error: Optional[Callable[[int, Exception], None]],
+                   err: Exception):
+        # Deferred so the owner has registered xs before it is notified
+        if on_error is not None:
+            asyncio.get_running_loop().call_soon(on_error, xs, err)
+        else:
+            request = self.requests.get(xs, None)
+            if request is not None and not request.done():
+                request.set_exception(err)
+
+    async def writer(self):
+        while True:
+            frames = [await self.send_queue.get()]
+            # Drain whatever queued up while waiting before yielding again
+            while len(frames) < settings.SEND_BATCH and not self.send_queue.empty():
+                frames.append(self.send_queue.get_nowait())
+            for index, frame in enumerate(frames):
+                (priority, xs, resource, data, on_error, on_written) = frame
+                try:
+                    await self._socket.send(encode_json(data))
+                except websockets.ConnectionClosed:
+                    self.fail_frames(frames[index:])
+                    self.fail_queue()
+                    return
+                except asyncio.CancelledError:
+                    # Stopped by stop_writer, frames taken off the queue are failed with the queued ones
+                    self.fail_frames(frames[index:])
+                    raise
+                except Exception as err:
+                    logger.exception(f'[{self.user.username}:{self.socket_id}] writer failed {err}')
+                    self.fail_frames(frames[index:])
+                    self.fail_queue()
+                    raise
+                if on_written is not None:
+                    on_written(xs)
+
+    def fail_frames(self, frames: List[Tuple]):
+        for (priority, xs, resource, data, on_error, on_written) in frames:
+            self.fail_frame(xs, resource, on_error, exceptions.SocketClosed(self.socket_id, resource))
+
+    def fail_queue(self):
+        while not self.send_queue.empty():
+            (priority, xs, resource, data, on_error, on_written) = self.send_queue.get_nowait()
+            self.fail_frame(xs, resource, on_error, exceptions.SocketClosed(self.socket_id, resource))
+
+    def stop_writer(self):
+        if asyncio.isfuture(self.writer_future) and not self.writer_future.done():
+            self.writer_future.cancel()
+        self.fail_queue()
+
+    def request(self, resource: str, query=None, body=None, timeout: Optional[float] = None) -> Request:
+        loop = asyncio.get_running_loop()
+        if not self.connected:
+            request = Request(-1, resource, loop=loop)
+            request.set_exception(exceptions.SocketClosed(self.socket_id, resource))
+            return request
+        self.xs += 1
+        request = Request(self.xs, resource, loop=loop)
+        timeout = settings.REQUEST_TIMEOUT if timeout is None else timeout
+        request.timeout_handle = loop.call_later(timeout, self.expire_request, request, timeout)
+        request.add_done_callback(self.clear_request)
+        self.requests[request.xs] = request
+        self.enqueue(request.xs, resource, self.build_frame(request.xs, resource, query, body), None)
+        return request
+
+    def expire_request(self, request: Request, timeout: float):
+        if not request.done():
+            request.set_exception(exceptions.RequestTimeout(self.socket_id, request.xs, request.resource, timeout))
+
+    def clear_request(self, request: Request):
+        if request.timeout_handle is not None:
+            request.timeout_handle.cancel()
+        if self.requests.get(request.xs, None) is request:
+            self.requests.pop(request.xs)
+
+    def fail_requests(self):
+        requests, self.requests = self.requests, {}
+        for request in requests.values():
+            if not request.done():
+                request.set_exception(exceptions.SocketClosed(self.socket_id, request.resource))
+
     async def reader(self, timeout: float):
         payload = None
         try:
@@ -251,16 +480,10 @@ class Socket:
     async def _reader(self):
         return await self._socket.recv()
 
-    async def _send(self, resource: str, body: Dict):
-        # logger.debug(f'[{self.user.username}:{self.socket_id}] {resource} Request')
-        try:
-            p = encode_json(body)
-            await self._socket.send(p)
-        except websockets.ConnectionClosed:
-            pass
-
     async def exit(self):
         self.alive = False
+        self.stop_writer()
+        self.fail_requests()
         if self.connected:
             await self._socket.close()
 
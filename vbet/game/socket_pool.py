@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import time
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from vbet.core import settings
+from vbet.game.socket import Socket, TICKET_SOCKET
+from vbet.utils.log import get_logger
+
+if TYPE_CHECKING:
+    from vbet.game.user import User
+
+
+logger = get_logger('socket-pool')
+
+
+class SocketHealth:
+    """
+    Ticket round trip, recent failures and in flight tickets observed on a pool socket. Lower score is better.
+    """
+    RTT_WEIGHT = 0.2
+    FAILURE_DECAY = 0.5
+    FAILURE_PENALTY = 2
+
+    def __init__(self):
+        self.rtt: float = settings.TICKET_SOCKET_RTT
+        self.failures: float = 0
+        self.inflight: int = 0
+        self.version: int = 0
+        self.last_used: float = time.time()
+        self.connected: bool = False
+
+    @property
+    def score(self) -> float:
+        return self.rtt * (1 + self.inflight) + self.failures * SocketHealth.FAILURE_PENALTY
+
+    @property
+    def degraded(self) -> bool:
+        return self.failures >= settings.TICKET_SOCKET_MAX_FAILURES or self.rtt > settings.TICKET_SOCKET_MAX_RTT
+
+    def success(self, elapsed: float):
+        self.rtt += SocketHealth.RTT_WEIGHT * (elapsed - self.rtt)
+        self.failures *= SocketHealth.FAILURE_DECAY
+
+    def failure(self):
+        self.failures += 1
+
+
+class TicketSocketPool:
+    """
+    Elastic pool of ticket sockets kept between TICKET_SOCKETS_MIN and TICKET_SOCKETS_MAX.
+
+    Sockets are ranked in a heap by health score with lazy invalidation, every health change pushes a new versioned
+    entry and stale entries are dropped when they reach the top.
+    """
+    def __init__(self, user: User):
+        self.user: User = user
+        self.sockets: Dict[int, Socket] = {}
+        self.health: Dict[int, SocketHealth] = {}
+        self.heap: List[Tuple[float, int, int]] = []
+        self.retiring: Set[int] = set()
+        self.next_socket_id: int = 0
+        self.available: asyncio.Event = asyncio.Event()
+        self.closing: bool = False
+        self.maintenance_future: Optional[asyncio.Future] = None
+
+    def start(self):
+        for _ in range(settings.TICKET_SOCKETS_MIN):
+            self.open_socket()
+        if self.maintenance_future is None:
+            self.maintenance_future = asyncio.create_task(self.maintenance())
+
+    def open_socket(self) -> Socket:
+        socket_id = self.next_socket_id
+        self.next_socket_id += 1
+        socket = Socket(self.user, socket_id, mode=TICKET_SOCKET)
+        self.sockets[socket_id] = socket
+        self.health[socket_id] = SocketHealth()
+        socket.connect()
+        logger.debug(f'[{self.user.username}:{socket_id}] ticket socket opened [{len(self.sockets)}]')
+        return socket
+
+    @property
+    def active_sockets(self) -> List[int]:
+        return [socket_id for socket_id in self.sockets if socket_id not in self.retiring]
+
+    def is_ready(self, socket_id: int) -> bool:
+        socket = self.sockets.get(socket_id, None)
+        return socket is not None and socket.authorized and socket_id not in self.retiring
+
+    # Ranking
+    def push(self, socket_id: int):
+        health = self.health[socket_id]
+        health.version += 1
+        heapq.heappush(self.heap, (health.score, health.version, socket_id))
+        if len(self.heap) > 4 * len(self.health) + 16:
+            self.heap = [(health.score, health.version, socket_id) for socket_id, health in self.health.items()
+                         if self.is_ready(socket_id)]
+            heapq.heapify(self.heap)
+
+    def best(self) -> Optional[Socket]:
+        while self.heap:
+            score, version, socket_id = self.heap[0]
+            health = self.health.get(socket_id, None)
+            if health is None or health.version != version or not self.is_ready(socket_id):
+                heapq.heappop(self.heap)
+                continue
+            return self.sockets[socket_id]
+
+    # Tickets
+    async def acquire(self) -> Optional[Socket]:
+        socket = self.best()
+        if socket is None or self.health[socket.socket_id].inflight >= settings.TICKET_SOCKET_INFLIGHT:
+            self.grow()
+        if socket is None:
+            self.available.clear()
+            try:
+                await asyncio.wait_for(self.available.wait(), settings.TICKET_SOCKET_WAIT)
+            except asyncio.TimeoutError:
+                logger.warning(f'[{self.user.username}] no ticket socket available after '
+                               f'{settings.TICKET_SOCKET_WAIT}s')
+                return None
+            socket = self.best()
+            if socket is None:
+                return None
+        health = self.health[socket.socket_id]
+        health.inflight += 1
+        health.last_used = time.time()
+        self.push(socket.socket_id)
+        return socket
+
+    def release(self, socket_id: Optional[int], elapsed: Optional[float] = None, failed: bool = False):
+        health = self.health.get(socket_id, None)
+        if health is None:
+            return
+        health.inflight = max(0, health.inflight - 1)
+        if failed:
+            health.failure()
+        elif elapsed is not None:
+            health.success(elapsed)
+        if self.is_ready(socket_id):
+            self.push(socket_id)
+            if health.degraded:
+                self.replace(socket_id)
+        self.available.set()
+
+    # Sizing
+    def grow(self):
+        active = self.active_sockets
+        connecting = [socket_id for socket_id in active if not self.sockets[socket_id].authorized]
+        if len(active) < settings.TICKET_SOCKETS_MAX and not connecting:
+            self.open_socket()
+
+    def replace(self, socket_id: int):
+        if socket_id not in self.retiring:
+            health = self.health[socket_id]
+            logger.info(f'[{self.user.username}:{socket_id}] replacing degraded ticket socket '
+                        f'[rtt: {health.rtt:.3f} failures: {health.failures:.1f}]')
+            self.retiring.add(socket_id)
+            self.open_socket()
+
+    def maintain(self):
+        now = time.time()
+        for socket_id in self.active_sockets:
+            if self.is_ready(socket_id) and self.health[socket_id].degraded:
+                self.replace(socket_id)
+        active = self.active_sockets
+        for socket_id in list(active):
+            if len(active) - 1 < settings.TICKET_SOCKETS_MIN:
+                break
+            health = self.health[socket_id]
+            if not health.inflight and now - health.last_used > settings.TICKET_SOCKET_IDLE:
+                self.retiring.add(socket_id)
+                active.remove(socket_id)
+        ready = [socket_id for socket_id in self.active_sockets if self.is_ready(socket_id)]
+        for socket_id in list(self.retiring):
+            socket = self.sockets.get(socket_id, None)
+            if socket is not None and socket.alive and not self.health[socket_id].inflight and ready:
+                logger.debug(f'[{self.user.username}:{socket_id}] ticket socket retired')
+                asyncio.create_task(socket.exit())
+
+    async def maintenance(self):
+        while not self.closing:
+            await asyncio.sleep(settings.TICKET_POOL_INTERVAL)
+            self.maintain()
+
+    # Socket state
+    def on_online(self, socket_id: int):
+        health = self.health.get(socket_id, None)
+        if health is not None:
+            if health.connected:
+                # Reconnected, tickets in flight on the old connection will not be answered
+                health.failure()
+                health.inflight = 0
+            health.connected = True
+            self.push(socket_id)
+            self.available.set()
+
+    def on_offline(self, socket_id: int) -> bool:
+        self.sockets.pop(socket_id, None)
+        self.health.pop(socket_id, None)
+        self.retiring.discard(socket_id)
+        if not self.closing and len(self.active_sockets) < settings.TICKET_SOCKETS_MIN:
+            self.open_socket()
+        return not self.sockets
+
+    def close(self):
+        self.closing = True
+        if self.maintenance_future is not None:
+            self.maintenance_future.cancel()
+        for socket in self.sockets.values():
+            asyncio.create_task(socket.exit())
@@ -1,8 +1,23 @@
+import sys
+import time
+from array import array
+from bisect import bisect_left
 from operator import itemgetter
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+from vbet.core import settings
+from vbet.utils.metrics import Histogram, registry
+
+DICT_BACKEND = 'dict'
+COMPACT_BACKEND = 'compact'
+
+FEED_TIME = registry.histogram('table_feed_seconds', 'League table result feed time', Histogram.FAST_BUCKETS,
+                               ['backend'])
 
 
 class LeagueTable:
+    BACKEND = DICT_BACKEND
+
     def __init__(self, max_week):
         self.league: Optional[int] = None
         self.week: Optional[int] = 1
@@ -13,6 +28,7 @@ class LeagueTable:
         self._table: List = []
         self.ready_table: Dict = {}
         self.raw_table: Dict = {}
+        self._team_weeks: Dict[str, List[int]] = {}
         self.event_block_map: Dict[int: int] = {}
         self.league_stats: Dict[int: Dict[int, Dict]] = {}
 
@@ -29,22 +45,31 @@ class LeagueTable:
         if not self.league or self.league != league:
             self.clear_table()
             self.league = league
-        self.week = week
+            self.week = week
+        elif week > self.week:
+            # Shared tables only move forward within a league
+            self.week = week
 
     def feed_result(self, e_block_id: int, league: int, week: int, results: Dict, results_ids: Dict, winning_ids: Dict):
         if league == self.league:
+            start = time.perf_counter() if registry.enabled else None
             self.event_block_map[week] = e_block_id
-            self.results_pool[week] = results
-            self.results_ids_pool[week] = results_ids
-            self.winning_ids_pool[week] = winning_ids
+            self.store_week(week, results, results_ids, winning_ids)
             self.parse_week(week, results)
             self.get_league_table()
+            if start is not None:
+                FEED_TIME.observe(time.perf_counter() - start, (self.BACKEND,))
+
+    def store_week(self, week: int, results: Dict, results_ids: Dict, winning_ids: Dict):
+        self.results_pool[week] = results
+        self.results_ids_pool[week] = results_ids
+        self.winning_ids_pool[week] = winning_ids
 
     def feed_stats(self, league: int, week: int, stats: Dict):
         self.league_stats[week] = stats
 
     def get_last_matches(self, team_id):
-        return sorted(self.raw_table.get(team_id).items(), key=itemgetter(0), reverse=True)
+        return sorted(self.get_raw_team_data(team_id).items(), key=itemgetter(0), reverse=True)
 
     def get_min_block(self) -> Optional[int]:
         if self.event_block_map:
@@ -58,8 +83,6 @@ class LeagueTable:
             team_a = event.get('A')
             team_b = event.get('B')
             score = event.get('score')
-            t = self.raw_table.get(team_a, {})
-            s = self.raw_table.get(team_b, {})
             home = score[0]
             away = score[1]
             if home == away:
@@ -71,67 +94,61 @@ class LeagueTable:
             else:
                 x = 0
                 y = 3
-            t[week] = [x, home, away, team_b, 0]
-            s[week] = [y, away, home, team_a, 1]
-            self.raw_table[team_a] = t
-            self.raw_table[team_b] = s
+            self.update_team(team_a, week, [x, home, away, team_b, 0])
+            self.update_team(team_b, week, [y, away, home, team_a, 1])
+
+    def update_team(self, team, week: int, week_data: List):
+        team_data = self.raw_table.get(team, {})
+        previous = team_data.get(week, None)
+        team_data[week] = week_data
+        self.raw_table[team] = team_data
+        self.apply_standing(team, week, week_data, previous)
+
+    def apply_standing(self, team, week: int, week_data: List, previous: Optional[List] = None):
+        """
+        Apply a single team week to the standings as a delta. A week that is fed again replaces its previous row.
+        """
+        team_standing = self.ready_table.get(team, None)
+        if team_standing is None:
+            team_standing = {'team': team, 'pos': 0, 'points': 0, 'won': 0, 'draw': 0, 'lost': 0, 'gf': 0, 'ga': 0,
+                             'gd': 0, 'streak': []}
+            self.ready_table[team] = team_standing
+            self._table.append(team_standing)
+        weeks = self._team_weeks.get(team, [])
+        self._team_weeks[team] = weeks
+        index = bisect_left(weeks, week)
+        if previous is not None:
+            self.add_standing(team_standing, previous, -1)
+            team_standing['streak'][index] = week_data[0]
+        else:
+            weeks.insert(index, week)
+            team_standing['streak'].insert(index, week_data[0])
+        self.add_standing(team_standing, week_data, 1)
+
+    @staticmethod
+    def add_standing(team_standing: Dict, week_data: List, sign: int):
+        points = week_data[0]
+        team_standing['points'] += sign * points
+        team_standing['gf'] += sign * week_data[1]
+        team_standing['ga'] += sign * week_data[2]
+        team_standing['gd'] = team_standing['gf'] - team_standing['ga']
+        if points == 3:
+            team_standing['won'] += sign
+        elif points == 1:
+            team_standing['draw'] += sign
+        else:
+            team_standing['lost'] += sign
+
+    @staticmethod
+    def rank_key(team_standing: Dict) -> Tuple:
+        return -team_standing['points'], -team_standing['gd'], -team_standing['gf']
 
     def get_league_table(self):
-        _table = {}
-        for team, team_data in self.raw_table.items():
-            points = 0
-            gf = 0
-            ga = 0
-            won = 0
-            lost = 0
-            draw = 0
-            streak = []
-            week_values = sorted(team_data.items(), key=itemgetter(0))
-            for week_info in week_values:
-                week = week_info[0]
-                week_data = week_info[1]
-                p = week_data[0]
-                points += p
-                streak.append(p)
-                gf += week_data[1]
-                ga += week_data[2]
-                if p == 3:
-                    won += 1
-                elif p == 1:
-                    draw += 1
-                else:
-                    lost += 1
-            _table[team] = {'team': team, 'pos': 0, 'points': points, 'won': won, 'draw': draw, 'lost': lost,
-                            'gf': gf, 'ga': ga, 'gd': gf - ga, 'streak': streak}
-        self.ready_table = _table
-        # Sort
-        data = [_ for _ in _table.values()]
-        i = 0
-        while i < len(data):
-            o = 0
-            while o < len(data):
-                data_1 = data[i]
-                data_2 = data[o]
-                points_1 = data_1['points']
-                points_2 = data_2['points']
-                if points_2 < points_1:
-                    data[i] = data_2
-                    data[o] = data_1
-                elif points_1 == points_2:
-                    gd_1 = data_1['gd']
-                    gd_2 = data_2['gd']
-                    if gd_2 > gd_1:
-                        data[i] = data_2
-                        data[o] = data_1
-                o += 1
-            i += 1
-        for pos, team_data in enumerate(data):
-            team_data['pos'] = pos + 1
-        _table = {}
-        for td in data:
-            _table[td.get('team')] = td
-        self.ready_table = _table
-        self._table = data
+        # Standings are already up to date, only the ranking is refreshed. The list is nearly sorted between weeks.
+        self._table.sort(key=self.rank_key)
+        for pos, team_standing in enumerate(self._table):
+            team_standing['pos'] = pos + 1
+        self.ready_table = {team_standing['team']: team_standing for team_standing in self._table}
 
     def clear_table(self):
         self.results_pool = {}
@@ -139,6 +156,7 @@ class LeagueTable:
         self.winning_ids_pool = {}
         self._table = []
         self.raw_table = {}
+        self._team_weeks = {}
         self.ready_table = {}
         self.event_block_map = {}
         self.league_stats = {}
@@ -167,3 +185,118 @@ class LeagueTable:
             if week not in self.event_block_map:
                 not_ready.append(week)
         return not_ready
+
+
+class CompactLeagueTable(LeagueTable):
+    """
+    League table backed by flat team x week arrays instead of per team dicts of week lists.
+
+    Team codes are interned and stored once, week rows are packed into signed byte arrays indexed by
+    team_index * stride + week. Handicap winnings that are all empty share a single dict.
+    """
+    BACKEND = COMPACT_BACKEND
+    NO_GAME = -1
+    EMPTY_WINNINGS = {'half_lost': (), 'half_won': (), 'refund_stake': ()}
+
+    def __init__(self, max_week):
+        super(CompactLeagueTable, self).__init__(max_week)
+        self.stride: int = max_week + 1
+        self.teams: List[str] = []
+        self.team_index: Dict[str, int] = {}
+        self.points: array = array('b')
+        self.goals_for: array = array('b')
+        self.goals_against: array = array('b')
+        self.opponents: array = array('b')
+        self.sides: array = array('b')
+        self.week_events: Dict[int, array] = {}
+        self.week_scores: Dict[int, array] = {}
+
+    def get_team_index(self, team: str) -> int:
+        index = self.team_index.get(team, None)
+        if index is None:
+            if isinstance(team, str):
+                team = sys.intern(team)
+            index = len(self.teams)
+            self.teams.append(team)
+            self.team_index[team] = index
+            row = [self.NO_GAME] * self.stride
+            self.points.extend(row)
+            self.goals_for.extend(row)
+            self.goals_against.extend(row)
+            self.opponents.extend(row)
+            self.sides.extend(row)
+        return index
+
+    def store_week(self, week: int, results: Dict, results_ids: Dict, winning_ids: Dict):
+        events = array('q')
+        scores = array('b')
+        for event_id, event in results.items():
+            score = event.get('score')
+            events.append(event_id)
+            scores.extend((self.get_team_index(event.get('A')), self.get_team_index(event.get('B')), score[0],
+                           score[1]))
+        self.week_events[week] = events
+        self.week_scores[week] = scores
+        self.results_ids_pool[week] = {event_id: tuple(won) for event_id, won in results_ids.items()}
+        compact_winnings = {}
+        for event_id, winnings in winning_ids.items():
+            if any(winnings.values()):
+                compact_winnings[event_id] = winnings
+            else:
+                compact_winnings[event_id] = self.EMPTY_WINNINGS
+        self.winning_ids_pool[week] = compact_winnings
+
+    def update_team(self, team, week: int, week_data: List):
+        index = self.get_team_index(team)
+        offset = index * self.stride + week
+        previous = None
+        if self.points[offset] != self.NO_GAME:
+            previous = self.get_week_row(index, offset)
+        self.points[offset] = week_data[0]
+        self.goals_for[offset] = week_data[1]
+        self.goals_against[offset] = week_data[2]
+        self.opponents[offset] = self.get_team_index(week_data[3])
+        self.sides[offset] = week_data[4]
+        self.apply_standing(self.teams[index], week, week_data, previous)
+
+    def get_week_row(self, index: int, offset: int) -> List:
+        return [self.points[offset], self.goals_for[offset], self.goals_against[offset],
+                self.teams[self.opponents[offset]], self.sides[offset]]
+
+    def get_raw_team_data(self, team) -> Optional[Dict]:
+        index = self.team_index.get(team, None)
+        if index is None:
+            return None
+        base = index * self.stride
+        return {week: self.get_week_row(index, base + week) for week in range(1, self.stride)
+                if self.points[base + week] != self.NO_GAME}
+
+    def get_week_results(self, week_id: int) -> Dict:
+        events = self.week_events.get(week_id, None)
+        if events is None:
+            return {}
+        scores = self.week_scores[week_id]
+        results = {}
+        for i, event_id in enumerate(events):
+            team_a, team_b, home, away = scores[i * 4:i * 4 + 4]
+            results[event_id] = {'id': event_id, 'A': self.teams[team_a], 'B': self.teams[team_b],
+                                 'score': (home, away)}
+        return results
+
+    def clear_table(self):
+        super(CompactLeagueTable, self).clear_table()
+        self.teams = []
+        self.team_index = {}
+        self.points = array('b')
+        self.goals_for = array('b')
+        self.goals_against = array('b')
+        self.opponents = array('b')
+        self.sides = array('b')
+        self.week_events = {}
+        self.week_scores = {}
+
+
+def create_table(max_week: int) -> LeagueTable:
+    if settings.TABLE_BACKEND == COMPACT_BACKEND:
+        return CompactLeagueTable(max_week)
+    return LeagueTable(max_week)
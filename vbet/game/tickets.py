@@ -1,12 +1,18 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import math
 import time
-from operator import attrgetter
-from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+from functools import partial
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, TYPE_CHECKING
 
-from vbet.game.socket import Socket, TICKET_SOCKET
+from vbet.core import settings
+from vbet.game.socket import Socket
+from vbet.game.socket_pool import TicketSocketPool
+from vbet.utils.limiter import AimdLimiter
 from vbet.utils.log import get_logger
+from vbet.utils.metrics import registry
 from vbet.utils.parser import Resource
 
 if TYPE_CHECKING:
@@ -103,6 +109,8 @@ class Ticket:
         self.priority: int = 0
         self.sent: bool = False
         self.socket_id: Optional[int] = None
+        # Frame handed to the websocket, a lost socket may have delivered it
+        self.written: bool = False
         self._min_winning: float = 0
         self._max_winning: float = 0
         self._total_won: float = 0
@@ -114,6 +122,9 @@ class Ticket:
         self.resolved: bool = False
         self.registered: bool = False
         self._sent_time: float = 0
+        # Start time of the event block, the ticket is rejected (602) once it has passed
+        self.deadline: Optional[float] = None
+        self.listener: Optional[Callable[[Ticket, int], None]] = None
 
     def __str__(self):
         events = [event.__str__() for event in self.events]
@@ -134,7 +145,9 @@ class Ticket:
 
     @status.setter
     def status(self, status: int):
-        self._status = status
+        previous, self._status = self._status, status
+        if self.listener is not None and previous != status:
+            self.listener(self, previous)
 
     @property
     def mode(self):
@@ -149,6 +162,7 @@ class Ticket:
     def sent_notify(self, xs, socket_id):
         self.xs = xs
         self.socket_id = socket_id
+        self.written = False
         self._sent_time = time.time()
 
     @property
@@ -226,133 +240,190 @@ class Ticket:
     def add_event(self, event: Event):
         self.events.append(event)
 
-    def resolve(self, results: Dict) -> float:
+    def settle(self, weeks: Dict[int, WeekSettlement]) -> bool:
+        """
+        Compute total_won from the settled weeks, False while a result is missing.
+        """
+        if not self.events:
+            return False
+        outcomes = []
+        for event in self.events:
+            week = weeks.get(event.week, None)
+            outcome = week.events.get(event.event_id, None) if week is not None else None
+            if outcome is None:
+                return False
+            outcomes.append(outcome)
         if self.mode == Ticket.SINGLE:
-            for event in self.events:
-                event_data = results.get(event.event_id)
-                won_data = event_data[0]
-                winnings = event_data[1]
-                refund_stake = winnings.get('refund_stake')
-                half_lost = winnings.get('half_lost')
-                half_won = winnings.get('half_won')
-                for bet in event.bets:
-                    if str(bet.odd_id) in refund_stake:
-                        self._total_won += bet.stake
-                    elif str(bet.odd_id) in half_lost:
-                        self._total_won += (bet.stake / 2)
-                    elif str(bet.odd_id) in half_won:
-                        self._total_won += round((bet.stake / 2) * bet.odd_value, 2)
-                    elif bet.odd_id in won_data:
-                        won = round(bet.stake * bet.odd_value, 2)
-                        self._total_won += won
-                break
+            won, refund_stake, half_lost, half_won = outcomes[0]
+            for bet in self.events[0].bets:
+                odd_key = str(bet.odd_id) if refund_stake or half_lost or half_won else None
+                if odd_key in refund_stake:
+                    self._total_won += bet.stake
+                elif odd_key in half_lost:
+                    self._total_won += (bet.stake / 2)
+                elif odd_key in half_won:
+                    self._total_won += round((bet.stake / 2) * bet.odd_value, 2)
+                elif bet.odd_id in won:
+                    self._total_won += round(bet.stake * bet.odd_value, 2)
         else:
             if self.winning_count >= 1 and self.grouping == 1:
-                for event in self.events:
+                for event, outcome in zip(self.events, outcomes):
                     for bet in event.bets:
-                        if bet.odd_id in results[event.event_id]:
+                        if bet.odd_id in outcome[0]:
                             self._total_won += round(bet.stake * bet.odd_value, 2)
             if self.winning_count == 1 and self.grouping > 1:
                 total_odd = 1
-                for event in self.events:
+                for event, outcome in zip(self.events, outcomes):
                     for bet in event.bets:
-                        if bet.odd_id in results[event.event_id]:
+                        if bet.odd_id in outcome[0]:
                             total_odd *= bet.odd_value
                         else:
-                            return self._total_won
+                            return True
                 self._total_won = total_odd * self.stake
-        return self._total_won
+        return True
 
-    def can_resolve(self, results: Dict, winning_ids: Dict) -> Dict:
-        required_results = {}
-        for event in self.events:
-            week_result = results.get(event.week, {})
-            week_winnings = winning_ids.get(event.week, {})
-            if not week_result:
-                return {}
-            event_data = week_result.get(event.event_id, [])
-            event_winnings = week_winnings.get(event.event_id, {})
-            if not event_data:
-                return {}
-            required_results[event.event_id] = [event_data, event_winnings]
-        return required_results
+
+class WeekSettlement:
+    """
+    Won, refunded and half settled odd ids of each event of a week, built once for all the tickets it settles.
+    """
+    __slots__ = ('events',)
+
+    def __init__(self, results_ids: Dict, winning_ids: Dict):
+        self.events: Dict[int, Tuple[FrozenSet[int], FrozenSet[str], FrozenSet[str], FrozenSet[str]]] = {}
+        for event_id, won in results_ids.items():
+            if not won:
+                continue
+            winnings = winning_ids.get(event_id, {})
+            self.events[event_id] = (frozenset(won), self.markets(winnings.get('refund_stake')),
+                                     self.markets(winnings.get('half_lost')), self.markets(winnings.get('half_won')))
+
+    @staticmethod
+    def markets(odd_ids) -> FrozenSet[str]:
+        return frozenset(str(odd_id) for odd_id in odd_ids) if odd_ids else frozenset()
+
+
+# Shared by all users, the provider throttles per host as well as per account
+global_limiter = AimdLimiter(settings.TICKET_GLOBAL_RATE, settings.TICKET_GLOBAL_RATE_MIN,
+                             settings.TICKET_GLOBAL_RATE_MAX, settings.TICKET_RATE_INCREASE,
+                             burst=settings.TICKET_GLOBAL_RATE)
+
+QUEUE_DEPTH = registry.gauge('ticket_queue_depth', 'Tickets queued for sending', ['user'])
+
+# Seconds from sending a ticket to the provider response
+ACK_TIME = registry.histogram('ticket_ack_seconds', 'Ticket send to response latency', labels=['result'])
+
+ERRORS = registry.counter('ticket_errors_total', 'Ticket error responses by code', ['code'])
+
+# Tickets sent, dropped before sending or missed (602) per block window
+WINDOW = registry.counter('ticket_window_total', 'Ticket block window outcomes', ['game', 'state'])
+
+USER_RATE = registry.gauge('ticket_user_rate', 'Per user ticket rate', ['user'])
+
+GLOBAL_RATE = registry.gauge('ticket_global_rate', 'Ticket rate across all users')
 
 
 class TicketManager:
     DEFAULT_TICKET_INTERVAL = 2
+    THROTTLE_CODES = [604, 500]
     JACKPOT_BEFORE = 0
     JACKPOT_AFTER = 1
     JACKPOT_NIL = 2
 
     def __init__(self, user: User):
         self.user: User = user
-        self.ticket_queue: asyncio.Queue = asyncio.Queue()
+        # Earliest deadline first, (deadline, ticket_key, game_id)
+        self.ticket_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
         self._ticket_key: int = 0
         self._ticket_id_lock: asyncio.Lock = asyncio.Lock()
         self.active_tickets: Dict[int, Dict[int, Ticket]] = {}
         self.ticket_interval: float = self.DEFAULT_TICKET_INTERVAL
         self.demo_ticket_interval: float = 2
         self.last_ticket_time: float = time.time()
+        self.limiter: AimdLimiter = AimdLimiter(1 / self.ticket_interval, settings.TICKET_RATE_MIN,
+                                                settings.TICKET_RATE_MAX, settings.TICKET_RATE_INCREASE)
         self.buffer_tickets: bool = False  # Await response of last ticket before sending next
         self.ticket_lock: asyncio.Lock = asyncio.Lock()
         self.send_lock: asyncio.Lock = asyncio.Lock()
         self.reg_lock: asyncio.Lock = asyncio.Lock()
         self.pool_lock: asyncio.Lock = asyncio.Lock()
         self.ticket_sender_future: asyncio.Future = asyncio.create_task(self.ticket_listener())
-        self.ticket_scanner_future: asyncio.Future = asyncio.create_task(self.ticket_scanner())
-        self._ticket_wait: asyncio.Event = asyncio.Event()
-        self.sockets: Dict[int, Socket] = {}
-        self.socket_map: Dict[int, Dict[int, int]] = {}
-        self.min_sockets: int = 2
+        # Status -> tickets in insertion order
+        self.status_index: Dict[int, Dict[Ticket, None]] = {}
+        self.window_stats: Dict[int, Dict[str, int]] = {}
+        self.pool: TicketSocketPool = TicketSocketPool(user)
+        # socket_id -> xs -> ticket waiting for its response
+        self.xs_index: Dict[int, Dict[int, Ticket]] = {}
         self.jackpot_resume: int = self.JACKPOT_NIL
 
-    async def ticket_scanner(self):
-        logger.debug(f'[{self.user.username}] ticket scanner started')
-        while True:
-            to_remove = []
-            for game_id, competition_tickets in self.active_tickets.items():
-                for ticket_key, ticket in competition_tickets.items():
-                    if ticket.status == Ticket.ERROR_CREDIT:
-                        credit = await self.user.account_manager.credit
-                        if credit > ticket.stake:
-                            ticket.status = Ticket.READY
-                            logger.info(f'Ticket Resume [{credit} : {ticket.stake}]')
-                        else:
-                            logger.warning(f'Ticket Check [{credit} : {ticket.stake}]')
-                    if ticket.status == Ticket.VOID:
-                        to_remove.append(ticket)
-                    if ticket.status == Ticket.SENT:
-                        age = ticket.sent_time
-                        now = time.time()
-                        # if now - age > 20:
-                        #     ticket.status = Ticket.READY
-                        #      # print(f"Out of time ticket {ticket.events}")
-                    if ticket.status == Ticket.SUCCESS and ticket.resolved:
-                        to_remove.append(ticket)
-
-            for t in to_remove:
-                await self.remove_ticket(t)
-            await self.poll_ticket()
-            await asyncio.sleep(1)
+    @property
+    def sockets(self) -> Dict[int, Socket]:
+        return self.pool.sockets
+
+    # Ticket state
+    def on_ticket_status(self, ticket: Ticket, previous: int):
+        self.status_index.get(previous, {}).pop(ticket, None)
+        self.status_index.setdefault(ticket.status, {})[ticket] = None
+        if ticket.status == Ticket.READY or ticket.status == Ticket.FAILED:
+            asyncio.get_running_loop().call_soon(self.schedule_ticket, ticket)
+        elif ticket.status == Ticket.VOID:
+            asyncio.get_running_loop().call_soon(self.discard_ticket, ticket)
+
+    def schedule_ticket(self, ticket: Ticket):
+        if ticket.status != Ticket.READY and ticket.status != Ticket.FAILED:
+            return
+        if ticket.listener is None:
+            return
+        if self.ticket_queue.qsize() >= settings.TICKET_QUEUE_SIZE:
+            logger.debug(f'[{self.user.username}:{ticket.game_id}] [{ticket.player}] queue full, ticket '
+                         f'{ticket.ticket_key} polled after the next batch')
+            return
+        if self.user.competition_align and self.user.game_map and ticket.game_id != self.user.game_map[0]:
+            return
+        deadline = ticket.deadline if ticket.deadline is not None else math.inf
+        self.ticket_queue.put_nowait((deadline, ticket.ticket_key, ticket.game_id))
+        ticket.status = Ticket.WAITING
+        if registry.enabled:
+            QUEUE_DEPTH.set(self.ticket_queue.qsize(), (self.user.username,))
+
+    def on_credit(self, credit: float):
+        for ticket in list(self.status_index.get(Ticket.ERROR_CREDIT, ())):
+            if credit > ticket.stake:
+                logger.info(f'Ticket Resume [{credit} : {ticket.stake}]')
+                ticket.status = Ticket.READY
+
+    def discard_ticket(self, ticket: Ticket):
+        ticket.listener = None
+        self.status_index.get(ticket.status, {}).pop(ticket, None)
+        competition_tickets = self.active_tickets.get(ticket.game_id, {})
+        if competition_tickets.get(ticket.ticket_key, None) is ticket:
+            competition_tickets.pop(ticket.ticket_key)
 
     async def ticket_listener(self):
         logger.debug(f'[{self.user.username}] queue listener started')
         while True:
             await self.poll_ticket()
-            await self.wait_ticket_interval()
-            ticket_data = await self.ticket_queue.get()
-            game_id, ticket_key = ticket_data[0], ticket_data[1]
-            ticket = await self.find_ticket(game_id, ticket_key)
-            if ticket is not None:
-                if self.user.account_manager.is_bonus_ready():
-                    if not self.user.jackpot_ready:
-                        self.user.jackpot_setup()
+            batch = await self.collect_batch(await self.ticket_queue.get())
+            if registry.enabled:
+                QUEUE_DEPTH.set(self.ticket_queue.qsize(), (self.user.username,))
+            if not batch:
+                continue
+            await self.wait_batch_interval(batch)
+            tickets = []
+            for ticket in batch:
+                if self.is_window_missed(ticket):
+                    await self.drop_ticket(ticket)
                 else:
-                    if self.user.jackpot_ready:
-                        self.user.jackpot_reset()
-                await self.send_ticket(ticket)
+                    tickets.append(ticket)
+            if not tickets:
+                continue
+            if self.user.account_manager.is_bonus_ready():
+                if not self.user.jackpot_ready:
+                    self.user.jackpot_setup()
             else:
-                break
+                if self.user.jackpot_ready:
+                    self.user.jackpot_reset()
+            await self.send_tickets(tickets)
 
         logger.debug(f'[{self.user.username}] queue listener stopped')
 
@@ -361,41 +432,100 @@ class TicketManager:
         ticket.ticket_key = ticket_key
         return ticket_key
 
-    async def send_ticket(self, ticket: Ticket):
+    async def collect_batch(self, entry: Tuple[float, int, int]) -> List[Ticket]:
+        """
+        Queued tickets of the same block as entry, they are adjacent in deadline order.
+        """
+        deadline, ticket_key, game_id = entry
+        entries = [entry]
+        skipped = []
+        while not self.ticket_queue.empty() and len(entries) < settings.TICKET_BATCH:
+            queued = self.ticket_queue.get_nowait()
+            if queued[0] == deadline and queued[2] == game_id:
+                entries.append(queued)
+            else:
+                skipped.append(queued)
+                if queued[0] != deadline:
+                    break
+        for queued in skipped:
+            self.ticket_queue.put_nowait(queued)
+        batch = []
+        for deadline, ticket_key, game_id in entries:
+            ticket = await self.find_ticket(game_id, ticket_key)
+            # Voided or reset while queued
+            if ticket is not None:
+                batch.append(ticket)
+        return batch
+
+    async def send_tickets(self, tickets: List[Ticket]):
         async with self.send_lock:
-            if self.buffer_tickets:
-                await self.ticket_lock.acquire()
             if self.user.demo:
-                await self.resolve_demo_ticket(ticket)
-            else:
-                credit = await self.user.account_manager.credit
+                for ticket in tickets:
+                    if ticket.status == Ticket.WAITING:
+                        await self.resolve_demo_ticket(ticket)
+                return
+            # One balance check per batch, stakes of the batch are taken off locally
+            credit = await self.user.account_manager.credit
+            sockets = {}
+            for ticket in tickets:
+                if ticket.status != Ticket.WAITING:
+                    continue
+                if self.buffer_tickets:
+                    await self.ticket_lock.acquire()
                 if credit >= ticket.stake:
+                    credit -= ticket.stake
                     logger.debug(f'[{self.user.username}:{ticket.game_id}] [{ticket.player}] stake : {ticket.stake}')
-                    await self.resolve_ticket(ticket)
+                    socket = await self.resolve_ticket(ticket)
+                    if socket is not None:
+                        sockets[socket.socket_id] = socket
                 else:
                     ticket.status = Ticket.ERROR_CREDIT
                     logger.warning(f'[{self.user.username}:{ticket.game_id}] [{ticket.player}] error-credit '
                                    f'[{ticket.stake}]')
-                    self.last_ticket_time = time.time() - self.ticket_interval  # No ticket sent so can send instant
-
-    async def resolve_ticket(self, ticket: Ticket):
+                    # No ticket sent so can send instant
+                    self.limiter.refund()
+                    global_limiter.refund()
+            if not self.user.jackpot_ready:
+                for socket in sockets.values():
+                    await socket.sync()
+
+    async def resolve_ticket(self, ticket: Ticket) -> Optional[Socket]:
         ticket_data = self.user.resource_tickets(ticket.content)
-        socket = await self.get_available_socket()
-        while True:
-            if not socket:
-                self._ticket_wait.clear()
-                await self._ticket_wait.wait()
-                socket = await self.get_available_socket()
-            else:
-                break
-        xs = socket.send(Resource.TICKETS, body=ticket_data)
+        # Tickets of a batch spread over the pool as each one in flight lowers the socket rank
+        socket = await self.pool.acquire()
+        if socket is None:
+            # Rescheduled by the status change
+            ticket.status = Ticket.FAILED
+            return
+        self.count_window(ticket.game_id, 'sent')
+        xs = socket.send(Resource.TICKETS, body=ticket_data, on_error=partial(self.on_send_error, socket.socket_id),
+                         on_written=partial(self.on_ticket_written, socket.socket_id))
         ticket.status = Ticket.SENT
         ticket.sent_notify(xs, socket.socket_id)
-        socket_map = self.socket_map.get(socket.socket_id, {})
-        socket_map[ticket.xs] = ticket.game_id
-        self.socket_map[socket.socket_id] = socket_map
-        if not self.user.jackpot_ready:
-            await socket.sync()
+        self.xs_index.setdefault(socket.socket_id, {})[xs] = ticket
+        return socket
+
+    def on_ticket_written(self, socket_id: int, xs: int):
+        ticket = self.xs_index.get(socket_id, {}).get(xs, None)
+        if ticket is not None:
+            ticket.written = True
+
+    def on_send_error(self, socket_id: int, xs: int, err: Exception):
+        asyncio.create_task(self.ticket_send_failed(socket_id, xs, err))
+
+    async def ticket_send_failed(self, socket_id: int, xs: int, err: Exception):
+        ticket = self.find_ticket_by_xs(socket_id, xs)
+        if ticket is not None:
+            logger.warning(f'[{self.user.username}:{ticket.game_id}] [{ticket.player}] ticket not sent {err}')
+            # Never reached the provider, nothing counts against the socket health or the send rates
+            self.pool.release(socket_id)
+            self.limiter.refund()
+            global_limiter.refund()
+            if self.buffer_tickets:
+                if self.ticket_lock.locked():
+                    self.ticket_lock.release()
+            # Rescheduled by the status change
+            ticket.status = Ticket.FAILED
 
     async def resolve_demo_ticket(self, ticket: Ticket):
         status, amount = await self.user.account_manager.borrow(ticket.stake)
@@ -412,6 +542,13 @@ class TicketManager:
         await self.check_pending_tickets(ticket.game_id)
 
     async def ticket_success(self, ticket: Ticket):
+        elapsed = time.time() - ticket.sent_time
+        self.pool.release(ticket.socket_id, elapsed)
+        self.limiter.success()
+        global_limiter.success()
+        if registry.enabled:
+            ACK_TIME.observe(elapsed, ('success',))
+            self.update_rate_metrics()
         ticket.status = Ticket.SUCCESS
         await self.user.register_competition_ticket(ticket)
         await self.poll_ticket()
@@ -421,6 +558,19 @@ class TicketManager:
         await self.check_pending_tickets(ticket.game_id)
 
     async def ticket_failed(self, error_code: int, ticket: Ticket):
+        # Only server side errors count against the socket health
+        throttled = error_code in self.THROTTLE_CODES
+        elapsed = time.time() - ticket.sent_time
+        self.pool.release(ticket.socket_id, elapsed, failed=throttled)
+        if throttled:
+            self.limiter.throttle()
+            global_limiter.throttle()
+            logger.warning(f'[{self.user.username}:{ticket.game_id}] throttled [{error_code}] rate : '
+                           f'{self.limiter.rate:.2f}/s global : {global_limiter.rate:.2f}/s')
+        if registry.enabled:
+            ACK_TIME.observe(elapsed, ('failed',))
+            ERRORS.inc(1, (error_code,))
+            self.update_rate_metrics()
         # Assign error code
         if error_code == 602:
             ticket.status = Ticket.VOID
@@ -432,7 +582,7 @@ class TicketManager:
             ticket.status = Ticket.FAILED
 
         # Retry sending
-        if error_code in [604, 500]:
+        if throttled:
             await self.poll_ticket()
 
         if self.buffer_tickets:
@@ -441,40 +591,33 @@ class TicketManager:
 
         # Invalid block to place ticket
         if error_code == 602:
+            self.count_window(ticket.game_id, 'missed')
             await self.check_pending_tickets(ticket.game_id)
 
         if error_code == 603:
             await self.poll_ticket()
 
     async def poll_ticket(self):
-        for game_id, competition_tickets in self.active_tickets.items():
-            for ticket_key, t in competition_tickets.items():
-                if t.status == Ticket.READY or t.status == Ticket.FAILED:
-                    if self.user.competition_align:
-                        if await self.user.is_next_game_id(t.game_id):
-                            if self.ticket_queue.qsize() < 50:
-                                await self.ticket_queue.put((t.game_id, t.ticket_key))
-                                t.status = Ticket.WAITING
-                    else:
-                        if self.ticket_queue.qsize() < 50:
-                            await self.ticket_queue.put((t.game_id, t.ticket_key))
-                            t.status = Ticket.WAITING
-
-    async def add_ticket(self, ticket: Ticket):
-        async with self.pool_lock:
-            competition_tickets = self.active_tickets.get(ticket.game_id, {})
-            competition_tickets[ticket.ticket_key] = ticket
-            self.active_tickets[ticket.game_id] = competition_tickets
-
-    async def remove_ticket(self, ticket: Ticket):
+        # Only tickets that can be queued are visited, status changes schedule the rest
+        for status in [Ticket.READY, Ticket.FAILED]:
+            for ticket in list(self.status_index.get(status, ())):
+                if self.ticket_queue.qsize() >= settings.TICKET_QUEUE_SIZE:
+                    return
+                self.schedule_ticket(ticket)
+
+    async def add_tickets(self, tickets: List[Ticket]):
+        # Replace degraded sockets before the tickets for this block are sent
+        self.pool.maintain()
         async with self.pool_lock:
-            competition_tickets = self.active_tickets.get(ticket.game_id, {})
-            if competition_tickets:
-                try:
-                    competition_tickets.pop(ticket.ticket_key)
-                except KeyError:
-                    pass
-            self.active_tickets[ticket.game_id] = competition_tickets
+            for ticket in tickets:
+                competition_tickets = self.active_tickets.get(ticket.game_id, {})
+                competition_tickets[ticket.ticket_key] = ticket
+                self.active_tickets[ticket.game_id] = competition_tickets
+        # Queued together so the listener picks up the block as one batch
+        for ticket in tickets:
+            ticket.listener = self.on_ticket_status
+            self.status_index.setdefault(ticket.status, {})[ticket] = None
+            self.schedule_ticket(ticket)
 
     async def find_ticket(self, game_id: int, ticket_key: int) -> Optional[Ticket]:
         async with self.pool_lock:
@@ -483,24 +626,34 @@ class TicketManager:
                 ticket = competition_tickets.get(ticket_key, None)
                 return ticket
 
-    async def find_ticket_by_xs(self, socket_id, xs: int) -> Optional[Ticket]:
-        async with self.send_lock:
-            socket_map = self.socket_map.get(socket_id, {})
-            try:
-                game_id = socket_map.pop(xs)
-                if socket_map:
-                    self.socket_map[socket_id] = socket_map
-                else:
-                    self.socket_map.pop(socket_id)
-            except KeyError:
-                pass
-            else:
-                if not self._ticket_wait.is_set():
-                    self._ticket_wait.set()
-                competition_tickets = self.active_tickets.get(game_id, {})
-                for ticket_key, ticket in competition_tickets.items():
-                    if ticket.xs == xs and ticket.socket_id == socket_id:
-                        return ticket
+    def find_ticket_by_xs(self, socket_id: int, xs: int) -> Optional[Ticket]:
+        socket_tickets = self.xs_index.get(socket_id, None)
+        if socket_tickets is not None:
+            return socket_tickets.pop(xs, None)
+
+    async def drop_socket_tickets(self, socket_id: int):
+        """
+        Responses of a lost connection never arrive. Written tickets may have been placed so they are voided, frames
+        still queued never reached the provider and are sent again.
+        """
+        socket_tickets = self.xs_index.pop(socket_id, {})
+        game_ids = set()
+        for xs, ticket in socket_tickets.items():
+            if ticket.status != Ticket.SENT or ticket.socket_id != socket_id:
+                continue
+            if not ticket.written:
+                self.pool.release(socket_id)
+                self.limiter.refund()
+                global_limiter.refund()
+                # Rescheduled by the status change
+                ticket.status = Ticket.FAILED
+                continue
+            logger.warning(f'[{self.user.username}:{ticket.game_id}] [{ticket.player}] ticket {xs} lost with '
+                           f'socket {socket_id}')
+            ticket.status = Ticket.VOID
+            game_ids.add(ticket.game_id)
+        for game_id in game_ids:
+            await self.check_pending_tickets(game_id)
 
     async def check_pending_tickets(self, game_id: int):
         competition_tickets = self.active_tickets.get(game_id)
@@ -525,79 +678,133 @@ class TicketManager:
 
     async def validate_competition_tickets(self, game_id: int):
         competition_tickets = self.active_tickets.get(game_id, {})
-        if competition_tickets:
-            results, winning_ids = self.user.get_competition_results(game_id)
-            for ticket in competition_tickets.values():
-                if ticket.status == Ticket.SUCCESS and not ticket.resolved:
-                    validation_data = ticket.can_resolve(results, winning_ids)
-                    if validation_data:
-                        ticket.resolve(validation_data)
-                        ticket.resolved = True
-                        await self.user.resolved_competition_ticket(ticket)
-                        credit = await self.user.account_manager.credit
-                        bonus_level = self.user.account_manager.bonus_level
-                        jackpot_val = self.user.account_manager.jackpot_value
-                        jackpot_amount = self.user.account_manager.jackpot_amount
-                        total_stake = self.user.account_manager.total_stake
-
-                        credit_str = f'{credit:.2f}'
-                        credit_str = credit_str.ljust(9)
-                        jackpot_val_str = f'{jackpot_val:.2f}%'
-                        jackpot_val_str = jackpot_val_str.ljust(6)
-                        jackpot_amount_str = f'{jackpot_amount:.2f}'
-                        jackpot_amount_str = jackpot_amount_str.ljust(7)
-                        bonus_level_str = f'L{bonus_level + 1}'
-                        account_str = f'[Ksh : {credit_str}] [{bonus_level_str} : {jackpot_val_str} : {jackpot_amount_str}]'
-                        stake_str = f'{ticket.stake:.2f}'
-                        stake_str = stake_str.ljust(9)
-                        won_str = f'{ticket.total_won:.2f}'
-                        won_str = won_str.ljust(9)
-                        total_stake_str = f'{total_stake:.2f}'
-                        total_stake_str = total_stake_str.ljust(9)
-                        bet_str = f'[stake : {stake_str} won : {won_str} total : {total_stake_str}]'
-                        logger.info(f'[{self.user.username}:{game_id}] {ticket.player} {account_str} {bet_str}')
-
-    async def wait_ticket_interval(self):
-        if self.user.jackpot_ready:
-            self.last_ticket_time = time.time()
+        if not competition_tickets:
             return
-        else:
-            ticket_interval = self.demo_ticket_interval if self.user.demo else self.ticket_interval
-        now = time.time()
-        gap = now - self.last_ticket_time
-        if ticket_interval > 0:
-            to_sleep = ticket_interval - gap
+        pending = [ticket for ticket in competition_tickets.values()
+                   if ticket.status == Ticket.SUCCESS and not ticket.resolved]
+        if not pending:
+            return
+        results, winning_ids = self.user.get_competition_results(game_id)
+        weeks = {}
+        for ticket in pending:
+            for event in ticket.events:
+                if event.week not in weeks and event.week in results:
+                    weeks[event.week] = WeekSettlement(results[event.week], winning_ids.get(event.week, {}))
+        log_resolved = logger.isEnabledFor(logging.INFO)
+        for ticket in pending:
+            if ticket.settle(weeks):
+                ticket.resolved = True
+                self.discard_ticket(ticket)
+                await self.user.resolved_competition_ticket(ticket)
+                if log_resolved:
+                    await self.log_resolved_ticket(game_id, ticket)
+
+    async def log_resolved_ticket(self, game_id: int, ticket: Ticket):
+        credit = await self.user.account_manager.credit
+        bonus_level = self.user.account_manager.bonus_level
+        jackpot_val = self.user.account_manager.jackpot_value
+        jackpot_amount = self.user.account_manager.jackpot_amount
+        total_stake = self.user.account_manager.total_stake
+
+        credit_str = f'{credit:.2f}'
+        credit_str = credit_str.ljust(9)
+        jackpot_val_str = f'{jackpot_val:.2f}%'
+        jackpot_val_str = jackpot_val_str.ljust(6)
+        jackpot_amount_str = f'{jackpot_amount:.2f}'
+        jackpot_amount_str = jackpot_amount_str.ljust(7)
+        bonus_level_str = f'L{bonus_level + 1}'
+        account_str = f'[Ksh : {credit_str}] [{bonus_level_str} : {jackpot_val_str} : {jackpot_amount_str}]'
+        stake_str = f'{ticket.stake:.2f}'
+        stake_str = stake_str.ljust(9)
+        won_str = f'{ticket.total_won:.2f}'
+        won_str = won_str.ljust(9)
+        total_stake_str = f'{total_stake:.2f}'
+        total_stake_str = total_stake_str.ljust(9)
+        bet_str = f'[stake : {stake_str} won : {won_str} total : {total_stake_str}]'
+        logger.info(f'[{self.user.username}:{game_id}] {ticket.player} {account_str} {bet_str}')
+
+    def get_window_stats(self, game_id: int) -> Dict[str, int]:
+        stats = self.window_stats.get(game_id, None)
+        if stats is None:
+            stats = {'sent': 0, 'dropped': 0, 'missed': 0}
+            self.window_stats[game_id] = stats
+        return stats
+
+    def count_window(self, game_id: int, state: str) -> Dict[str, int]:
+        stats = self.get_window_stats(game_id)
+        stats[state] += 1
+        if registry.enabled:
+            WINDOW.inc(1, (game_id, state))
+        return stats
+
+    @staticmethod
+    def is_window_missed(ticket: Ticket) -> bool:
+        return ticket.deadline is not None and time.time() + settings.TICKET_DEADLINE_MARGIN > ticket.deadline
+
+    async def drop_ticket(self, ticket: Ticket):
+        stats = self.count_window(ticket.game_id, 'dropped')
+        logger.warning(f'[{self.user.username}:{ticket.game_id}] [{ticket.player}] ticket dropped, block window '
+                       f'closed {time.time() - ticket.deadline:.2f}s ago [dropped: {stats["dropped"]} missed: '
+                       f'{stats["missed"]}]')
+        ticket.status = Ticket.VOID
+        await self.check_pending_tickets(ticket.game_id)
+
+    async def wait_ticket_interval(self, ticket: Ticket):
+        if self.user.demo:
+            # Simulated locally, nothing reaches the provider
+            if self.user.jackpot_ready:
+                self.last_ticket_time = time.time()
+                return
+            to_sleep = self.demo_ticket_interval - (time.time() - self.last_ticket_time)
             if to_sleep > 0:
                 await asyncio.sleep(to_sleep)
+            self.last_ticket_time = time.time()
+            return
+        max_wait = math.inf
+        if ticket.deadline is not None:
+            # Share the time left in the block window between the tickets still queued
+            slack = ticket.deadline - settings.TICKET_DEADLINE_MARGIN - time.time()
+            max_wait = max(settings.TICKET_MIN_INTERVAL, slack / (self.ticket_queue.qsize() + 1))
+        await self.limiter.acquire(max_wait)
+        await global_limiter.acquire(max_wait)
         self.last_ticket_time = time.time()
 
-    async def get_available_socket(self) -> Socket:
-        sockets = [socket for socket in self.sockets.values() if socket.authorized]
-        if sockets:
-            socket = sorted(sockets, key=attrgetter('last_used'))[0]
-            socket.last_used = time.time()
-            return socket
+    async def wait_batch_interval(self, batch: List[Ticket]):
+        await self.wait_ticket_interval(batch[0])
+        if not self.user.demo:
+            # The rest of the block goes back to back, borrowing from the following tokens
+            for _ in batch[1:]:
+                await self.limiter.acquire(0)
+                await global_limiter.acquire(0)
+
+    def get_rate_stats(self) -> Dict:
+        return {
+            'user': self.limiter.stats,
+            'global': global_limiter.stats,
+            'queue': self.ticket_queue.qsize()
+        }
+
+    def update_rate_metrics(self):
+        USER_RATE.set(self.limiter.rate, (self.user.username,))
+        GLOBAL_RATE.set(global_limiter.rate)
+        QUEUE_DEPTH.set(self.ticket_queue.qsize(), (self.user.username,))
 
     async def socket_online(self, socket_id: int):
-        if not self._ticket_wait.is_set():
-            self._ticket_wait.set()
+        self.pool.on_online(socket_id)
+
+    async def socket_lost(self, socket_id: int):
+        await self.drop_socket_tickets(socket_id)
 
     async def socket_offline(self, socket_id: int):
-        socket = self.sockets.get(socket_id, None)
-        if socket:
-            self.sockets.pop(socket_id)
-        if not self.sockets:
+        await self.drop_socket_tickets(socket_id)
+        if self.pool.on_offline(socket_id):
             self.user.close_event.set()
 
     def setup_jackpot(self):
-        for i in range(0, self.min_sockets):
-            socket = Socket(self.user, i, mode=TICKET_SOCKET)
-            self.sockets[i] = socket
-            socket.connect()
+        self.pool.start()
 
     def close_sockets(self):
-        for socket in self.sockets.values():
-            future = asyncio.create_task(socket.exit())
+        self.pool.close()
 
     def generate_ticket_key(self):
         self._ticket_key += 1
@@ -605,5 +812,4 @@ class TicketManager:
 
     def exit(self):
         self.close_sockets()
-        self.ticket_scanner_future.cancel()
         self.ticket_sender_future.cancel()
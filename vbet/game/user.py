@@ -7,9 +7,10 @@ import aiofile
 import aiohttp
 
 from vbet.core import settings
-from vbet.game.socket import Socket
+from vbet.game.socket import Request, Socket
+from vbet.utils import exceptions
 from vbet.utils.log import get_logger
-from vbet.utils.parser import decode_json, encode_json, get_ticket_timestamp, Resource
+from vbet.utils.parser import decode_json, encode_json, encode_json_bytes, get_ticket_timestamp, Resource
 from .accounts import AccountManager
 from .competition import LeagueCompetition
 from .tickets import Ticket, TicketManager
@@ -124,6 +125,7 @@ class User:
         self.active_event: asyncio.Event = asyncio.Event()
         self.close_event: asyncio.Event = asyncio.Event()
         self.sockets: Dict[int, Socket] = {}
+        self.game_sockets: Dict[int, int] = {}
         self.competitions: Dict[int, LeagueCompetition] = {}
         self.games: List[int] = []
         self.settings: GameSettings = GameSettings()
@@ -142,6 +144,7 @@ class User:
                 self.active_event.set()
             asyncio.ensure_future(self.read_user_data())
             self.install_competitions(self.games)
+            self.install_standby_sockets()
             self.ticket_manager.setup_jackpot()
 
     def offline(self):
@@ -271,9 +274,9 @@ class User:
                 await self.process_session_status(session_status)
 
     async def ticket_callback(self, game_id: int, xs: int, valid_response: bool, body: Dict):
-        ticket = await self.ticket_manager.find_ticket_by_xs(game_id, xs)  # type: Union[Ticket, None]
+        ticket = self.ticket_manager.find_ticket_by_xs(game_id, xs)  # type: Union[Ticket, None]
         if not ticket:
-            print(f'{game_id}, {xs}, {valid_response}, {self.ticket_manager.socket_map}')
+            logger.warning(f'[{self.username}:{game_id}] unknown ticket response {xs} {valid_response}')
         else:
             pass
             # logger.debug(f'[{self.username}:{ticket.game_id}] {ticket.player} ticket response \n{ticket}')
@@ -317,22 +320,32 @@ class User:
 
     # Sockets configuration
     async def socket_online(self, socket_id: int):
-        competition = self.get_competition(socket_id)
-        if competition:
+        for competition in self.get_socket_competitions(socket_id):
             competition.online = True
 
     async def socket_lost(self, socket_id: int):
-        competition = self.get_competition(socket_id)
-        if competition:
+        socket_competitions = self.get_socket_competitions(socket_id)
+        for competition in socket_competitions:
             competition.lost = True
+        standby = self.get_standby_socket()
+        if socket_competitions and standby:
+            # Promote the logged in standby socket, the lost socket reconnects and becomes a standby
+            for competition in socket_competitions:
+                self.game_sockets[competition.game_id] = standby.socket_id
+            logger.info(f'[{self.username}:{socket_id}] standby socket {standby.socket_id} promoted')
+            await self.socket_online(standby.socket_id)
 
     async def socket_offline(self, socket_id: int):
-        competition = self.get_competition(socket_id)
-        if competition:
+        socket_competitions = self.get_socket_competitions(socket_id)
+        for competition in socket_competitions:
             competition.online = False
+        if socket_competitions:
             for competition in self.competitions.values():
                 if competition.online or competition.lost:
                     return
+            for socket in self.sockets.values():
+                if not self.get_socket_competitions(socket.socket_id):
+                    asyncio.create_task(socket.exit())
             await self.http.close()
             if not self.ticket_manager.sockets:
                 self.close_event.set()
@@ -368,6 +381,8 @@ class User:
                 self.game_map = self.game_map[1:]
             await self.write_user_data()
             ticket.registered = True
+            # Tickets of the next game were left ready while it was not its turn
+            await self.ticket_manager.poll_ticket()
 
     async def resume_competition(self, game_id: int) -> bool:
         return await self.ticket_manager.resume_competition_tickets(game_id)
@@ -383,6 +398,52 @@ class User:
     def get_socket(self, socket_id: int) -> Optional[Socket]:
         return self.sockets.get(socket_id, None)  # type: Union[Socket, None]
 
+    def get_competition_socket(self, game_id: int) -> Optional[Socket]:
+        return self.sockets.get(self.game_sockets.get(game_id, None), None)  # type: Union[Socket, None]
+
+    def get_socket_competitions(self, socket_id: int) -> List[LeagueCompetition]:
+        return [self.competitions[game_id] for game_id, _socket_id in self.game_sockets.items()
+                if _socket_id == socket_id and game_id in self.competitions]
+
+    def get_standby_socket(self) -> Optional[Socket]:
+        for socket_id, socket in self.sockets.items():
+            if socket.authorized and socket.alive and socket_id not in self.game_sockets.values():
+                return socket
+
+    def install_standby_sockets(self):
+        # Standby sockets use negative ids so they never clash with game ids
+        for i in range(1, settings.STANDBY_SOCKETS + 1):
+            if -i not in self.sockets:
+                socket = Socket(self, -i)
+                self.sockets[-i] = socket
+                socket.connect()
+
+    def assign_socket(self, game_id: int) -> Socket:
+        # Playlists share a competition socket up to PLAYLISTS_PER_SOCKET, the socket id is its first game id
+        for socket_id, socket in self.sockets.items():
+            if not socket.alive:
+                continue
+            games = [_game_id for _game_id, _socket_id in self.game_sockets.items() if _socket_id == socket_id]
+            # Standby sockets carry no playlist and are kept free for promotion
+            if games and len(games) < settings.PLAYLISTS_PER_SOCKET:
+                self.game_sockets[game_id] = socket_id
+                if socket.authorized:
+                    asyncio.create_task(self.socket_online(socket_id))
+                return socket
+        socket = Socket(self, game_id)
+        self.sockets[game_id] = socket
+        self.game_sockets[game_id] = game_id
+        socket.connect()
+        return socket
+
+    async def release_socket(self, game_id: int):
+        socket = self.get_competition_socket(game_id)
+        if socket:
+            for competition in self.get_socket_competitions(socket.socket_id):
+                if not competition.closing:
+                    return
+            await socket.exit()
+
     def create_competition(self, game_id: int) -> Tuple[bool, LeagueCompetition]:
         state = False
         competition = self.get_competition(game_id)
@@ -411,19 +472,21 @@ class User:
                 state, competition = self.create_competition(competition_id)
                 if state:
                     logger.debug(f'[{self.username}:{competition_id}] installing competition')
-                    socket = self.get_socket(competition_id)
-                    if not socket:
-                        socket = Socket(self, competition_id)
-                        self.sockets[competition_id] = socket
-                        socket.connect()
+                    self.assign_socket(competition_id)
                     competition.init()
 
-    def send(self, socket_id: int, resource: str, body: Dict) -> int:
-        socket = self.get_socket(socket_id)
+    def send(self, game_id: int, resource: str, body: Dict) -> int:
+        socket = self.get_competition_socket(game_id)
         if socket:
             return socket.send(resource, body)
         return -1
 
+    def request(self, game_id: int, resource: str, body: Dict) -> Request:
+        socket = self.get_competition_socket(game_id)
+        if socket:
+            return socket.request(resource, body)
+        raise exceptions.SocketClosed(game_id, resource)
+
     async def receive(self, socket_id: int, xs: int, resource: str, valid_response: bool, body: Dict):
         if resource == Resource.SYNC:
             await self.sync_callback(xs, valid_response, body)
@@ -432,8 +495,8 @@ class User:
         elif resource == Resource.TICKETS_FIND_BY_ID:
             await self.tickets_find_by_id_callback(xs, valid_response, body)
         else:
-            competition = self.get_competition(socket_id)
-            if competition:
+            # Late or unsolicited responses, competitions ignore xs they did not send
+            for competition in self.get_socket_competitions(socket_id):
                 await competition.receive(xs, resource, body)
 
     def get_competition_results(self, game_id: int) -> Tuple[Dict, Dict]:
@@ -471,8 +534,8 @@ class User:
 
     async def store_competition(self, game_id: int, league: int,  data: Dict):
         event_loop = asyncio.get_event_loop()
-        dump_data = await event_loop.run_in_executor(None, encode_json, data)
-        async with aiofile.AIOFile(f'{settings.CACHE_DIR}/{game_id}/{self.username}_{league}.json', 'w') as afp:
+        dump_data = await event_loop.run_in_executor(None, encode_json_bytes, data)
+        async with aiofile.AIOFile(f'{settings.CACHE_DIR}/{game_id}/{self.username}_{league}.json', 'wb') as afp:
             await afp.write(dump_data)
         logger.debug(f'[{self.username}:{game_id}] uploaded data  League: [{league}:{len(data)}]')
 
@@ -0,0 +1,3 @@
+from vbet.simulator.server import ProviderSimulator
+
+__all__ = ['ProviderSimulator']
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Dict, List
+
+from vbet.core import settings
+from vbet.simulator.server import ProviderSimulator
+
+
+def parse_errors(values: List[str]) -> Dict[int, float]:
+    errors = {}
+    for value in values:
+        code, probability = value.split('=')
+        errors[int(code)] = float(probability)
+    return errors
+
+
+def vsim(args: List[str]):
+    arg_parser = argparse.ArgumentParser(description='Local Golden Race provider simulator')
+    arg_parser.add_argument('--host', default=settings.SIMULATOR_HOST, help=f'Listen host. Default '
+                                                                             f'{settings.SIMULATOR_HOST}')
+    arg_parser.add_argument('-p', '--port', default=settings.SIMULATOR_PORT, type=int, help=f'Listen port. Default '
+                                                                                            f'{settings.SIMULATOR_PORT}')
+    arg_parser.add_argument('-s', '--seed', default=0, type=int, help='League seed. Default 0')
+    arg_parser.add_argument('-b', '--block-time', default=0, type=float, help='Minimum seconds per block. Default 0')
+    arg_parser.add_argument('--scheduled', action='store_true', help='Play blocks on a clock and send eventTime')
+    arg_parser.add_argument('--start-week', default=None, type=int, help='First week played. Default seeded')
+    arg_parser.add_argument('-l', '--latency', default=[0, 0], nargs=2, type=float, metavar=('MIN', 'MAX'),
+                            help='Response latency range in seconds. Default 0 0')
+    arg_parser.add_argument('-e', '--error', default=[], action='append', metavar='CODE=P',
+                            help='Ticket error probability, repeatable e.g. -e 604=0.05')
+    args = arg_parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    async def serve():
+        simulator = ProviderSimulator(args.host, args.port, args.seed, args.block_time, args.scheduled,
+                                      args.start_week, tuple(args.latency), parse_errors(args.error))
+        await simulator.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    vsim(sys.argv[1:])
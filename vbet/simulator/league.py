@@ -0,0 +1,290 @@
+import math
+import random
+import string
+from typing import Dict, List, Optional, Tuple
+
+from vbet.core import settings
+from vbet.game.markets import MarketIndex
+
+# Odd values are indexed by the market key, see vbet.game.markets
+ODD_COUNT = max(info.odd_index for info in MarketIndex.values()) + 1
+
+MAX_GOALS = 6
+
+MARGIN = 0.92
+
+FIRST_HALF = 0.45
+
+
+def poisson(rng: random.Random, rate: float) -> int:
+    limit = math.exp(-rate)
+    goals, p = 0, rng.random()
+    while p > limit and goals < MAX_GOALS:
+        goals += 1
+        p *= rng.random()
+    return goals
+
+
+def draw_score(rng: random.Random, home_rate: float, away_rate: float) -> Tuple[int, int]:
+    # Correct score markets stop at MAX_GOALS goals in total, higher scores are drawn again
+    while True:
+        home, away = poisson(rng, home_rate), poisson(rng, away_rate)
+        if home + away <= MAX_GOALS:
+            return home, away
+
+
+def score_pmf(home_rate: float, away_rate: float) -> Dict[Tuple[int, int], float]:
+    # Probabilities of the scores draw_score returns
+    home_pmf, away_pmf = poisson_pmf(home_rate), poisson_pmf(away_rate)
+    scores = {(home, away): home_pmf[home] * away_pmf[away] for home in range(MAX_GOALS + 1)
+              for away in range(MAX_GOALS + 1 - home)}
+    total = sum(scores.values())
+    return {score: p / total for score, p in scores.items()}
+
+
+def poisson_pmf(rate: float) -> List[float]:
+    pmf = [math.exp(-rate) * rate ** goals / math.factorial(goals) for goals in range(MAX_GOALS)]
+    pmf.append(max(0.0, 1 - sum(pmf)))
+    return pmf
+
+
+def outcome(home: int, away: int) -> str:
+    if home > away:
+        return 'Home'
+    if home < away:
+        return 'Away'
+    return 'Draw'
+
+
+def settle_market(market_type: str, name: str, goal_line: Optional[float], score: Tuple[int, int],
+                  half: Tuple[int, int]) -> Optional[bool]:
+    """
+    True when the market is won, False when lost and None when the stake is refunded. Handicap markets are not
+    simulated and always lose.
+    """
+    home, away = score
+    total = home + away
+    result = outcome(home, away)
+    if market_type == 'Match_Result':
+        return name == result
+    if market_type == 'Double_Result':
+        return name == outcome(*half) + result
+    if market_type == 'Double_Chance':
+        return result in name.split('_')
+    if market_type == 'Correct_Score':
+        return name == f'_{home}_{away}'
+    if market_type == 'Total_Goals':
+        return min(total, MAX_GOALS) == goal_line
+    if market_type == 'GoalGoal_NoGoal':
+        return (name == 'gg') == (home > 0 and away > 0)
+    if market_type == 'Multigoal':
+        low, high = name[1:].split('_')[0].split('-')
+        return int(low) <= total <= int(high)
+    if market_type == 'First_Half':
+        return name == f'1H_{outcome(*half)}'
+    if market_type.startswith('HomeAwayScores_'):
+        goals = home if name.startswith('Home') else away
+        return goals > goal_line if 'Over' in name else goals < goal_line
+    if market_type.startswith('_1x2Scores_'):
+        if not name.startswith(f'_1x2{result}'):
+            return False
+        return total > goal_line if 'Over' in name else total < goal_line
+    if market_type.startswith('Over_Under_'):
+        if total == goal_line:
+            return None
+        return total > goal_line if name.startswith('over') else total < goal_line
+    return False
+
+
+def settle(score: Tuple[int, int], half: Tuple[int, int]) -> Tuple[List[str], List[str]]:
+    won, refund = [], []
+    for market_id, info in MarketIndex.items():
+        state = settle_market(info.market_type, info.name, info.goal_line, score, half)
+        if state:
+            won.append(market_id)
+        elif state is None:
+            refund.append(market_id)
+    return won, refund
+
+
+class Team:
+    __slots__ = ('team_id', 'code', 'attack', 'defence')
+
+    def __init__(self, team_id: int, code: str, attack: float, defence: float):
+        self.team_id: int = team_id
+        self.code: str = code
+        self.attack: float = attack
+        self.defence: float = defence
+
+    @property
+    def participant(self) -> Dict:
+        return {'id': str(self.team_id), 'fifaCode': self.code, 'name': self.code}
+
+
+class Match:
+    __slots__ = ('event_id', 'home', 'away', 'score', 'half', '_odds', '_result')
+
+    def __init__(self, event_id: int, home: Team, away: Team, score: Tuple[int, int], half: Tuple[int, int]):
+        self.event_id: int = event_id
+        self.home: Team = home
+        self.away: Team = away
+        self.score: Tuple[int, int] = score
+        self.half: Tuple[int, int] = half
+        self._odds: Optional[List[str]] = None
+        self._result: Optional[Dict] = None
+
+    @property
+    def rates(self) -> Tuple[float, float]:
+        return 1.4 * self.home.attack * self.away.defence, 1.1 * self.away.attack * self.home.defence
+
+    @property
+    def odds(self) -> List[str]:
+        # Priced on first use from the goal rates, half time markets assume independent halves
+        if self._odds is None:
+            home_rate, away_rate = self.rates
+            scores = score_pmf(home_rate, away_rate)
+            half_home, half_away = poisson_pmf(home_rate * FIRST_HALF), poisson_pmf(away_rate * FIRST_HALF)
+            probabilities = [0.0] * ODD_COUNT
+            for score, p in scores.items():
+                for market_id, info in MarketIndex.items():
+                    if info.market_type in ('Double_Result', 'First_Half'):
+                        continue
+                    if settle_market(info.market_type, info.name, info.goal_line, score, (0, 0)):
+                        probabilities[info.odd_index] += p
+            half_results = {'Home': 0.0, 'Draw': 0.0, 'Away': 0.0}
+            full_results = {'Home': 0.0, 'Draw': 0.0, 'Away': 0.0}
+            for home in range(MAX_GOALS + 1):
+                for away in range(MAX_GOALS + 1):
+                    half_results[outcome(home, away)] += half_home[home] * half_away[away]
+            for (home, away), p in scores.items():
+                full_results[outcome(home, away)] += p
+            for market_id, info in MarketIndex.items():
+                if info.market_type == 'First_Half':
+                    probabilities[info.odd_index] = half_results[info.name[3:]]
+                elif info.market_type == 'Double_Result':
+                    first = next(result for result in half_results if info.name.startswith(result))
+                    probabilities[info.odd_index] = half_results[first] * full_results[info.name[len(first):]]
+            self._odds = [f'{min(500.0, max(1.01, MARGIN / p)):.2f}' if p > 0 else '1.00' for p in probabilities]
+        return self._odds
+
+    def event(self, e_block_id: int, league_id: int, week: int, played: bool) -> Dict:
+        data = {
+            'eventId': self.event_id,
+            'eBlockId': e_block_id,
+            'data': {
+                'classType': 'FootballEventData',
+                'participants': [self.home.participant, self.away.participant],
+                'oddValues': self.odds,
+                'leagueId': league_id,
+                'matchDay': week,
+                'stats': {}
+            }
+        }
+        if played:
+            data['result'] = self.result
+        return data
+
+    @property
+    def result(self) -> Dict:
+        if self._result is None:
+            self._result = self.build_result()
+        return self._result
+
+    def build_result(self) -> Dict:
+        won, refund = settle(self.score, self.half)
+        return {
+            'wonMarkets': won,
+            'data': {
+                'classType': 'FootballEventResultData',
+                'videoURL': f'https://simulator/video/{self.home.team_id}/{self.away.team_id}',
+                'halfLostMarkets': [],
+                'halfWonMarkets': [],
+                'refundMarkets': refund
+            }
+        }
+
+
+class Playlist:
+    """
+    Seeded leagues of one playlist, every block is derived from (seed, playlist, block index) so they can be built
+    in any order and rebuilt identically.
+    """
+    def __init__(self, playlist_id: int, seed: int):
+        self.playlist_id: int = playlist_id
+        self.seed: int = seed
+        self.max_week: int = 34 if playlist_id in [settings.BUNDESLIGA, settings.KPL] else 38
+        self.team_count: int = self.max_week // 2 + 1
+        rng = random.Random(f'{seed}:{playlist_id}')
+        codes = set()
+        while len(codes) < self.team_count:
+            codes.add(''.join(rng.choice(string.ascii_uppercase) for _ in range(3)))
+        self.teams: List[Team] = [Team(playlist_id * 100 + index, code, rng.uniform(0.7, 1.3), rng.uniform(0.7, 1.3))
+                                  for index, code in enumerate(sorted(codes))]
+        self.blocks: Dict[int, List[Match]] = {}
+
+    def e_block_id(self, block_index: int) -> int:
+        return self.playlist_id * 1000000 + block_index
+
+    def block_index(self, e_block_id: int) -> Optional[int]:
+        if e_block_id is None or e_block_id // 1000000 != self.playlist_id:
+            return None
+        return e_block_id % 1000000
+
+    def league_week(self, block_index: int) -> Tuple[int, int]:
+        league, week = divmod(block_index, self.max_week)
+        return self.playlist_id * 1000 + league, week + 1
+
+    def fixtures(self, league: int) -> List[List[Tuple[Team, Team]]]:
+        # Circle method round robin, the second half of the season swaps home and away
+        rng = random.Random(f'{self.seed}:{self.playlist_id}:{league}')
+        teams = list(self.teams)
+        rng.shuffle(teams)
+        rounds = []
+        for _ in range(self.team_count - 1):
+            pairs = []
+            for index in range(self.team_count // 2):
+                pairs.append((teams[index], teams[-index - 1]))
+            rounds.append(pairs)
+            teams.insert(1, teams.pop())
+        return rounds + [[(away, home) for home, away in pairs] for pairs in rounds]
+
+    def matches(self, block_index: int) -> List[Match]:
+        matches = self.blocks.get(block_index, None)
+        if matches is None:
+            league, week = divmod(block_index, self.max_week)
+            rng = random.Random(f'{self.seed}:{self.playlist_id}:{block_index}')
+            e_block_id = self.e_block_id(block_index)
+            matches = []
+            for index, (home, away) in enumerate(self.fixtures(league)[week]):
+                match = Match(e_block_id * 100 + index, home, away, (0, 0), (0, 0))
+                home_rate, away_rate = match.rates
+                match.score = draw_score(rng, home_rate, away_rate)
+                match.half = tuple(sum(rng.random() < FIRST_HALF for _ in range(goals)) for goals in match.score)
+                matches.append(match)
+            self.blocks[block_index] = matches
+        return matches
+
+    def block(self, block_index: int, played: bool, event_time: Optional[int] = None) -> Dict:
+        e_block_id = self.e_block_id(block_index)
+        league, week = self.league_week(block_index)
+        return {
+            'eBlockId': e_block_id,
+            'eventTime': event_time,
+            'data': {'classType': 'FootballLeagueData', 'leagueId': league, 'matchDay': week},
+            'events': [match.event(e_block_id, league, week, played) for match in self.matches(block_index)]
+        }
+
+    def results(self, block_index: int) -> Dict:
+        e_block_id = self.e_block_id(block_index)
+        return {
+            'eBlockId': e_block_id,
+            'events': [{'eventId': match.event_id, 'result': match.result} for match in self.matches(block_index)]
+        }
+
+    def find_match(self, event_id: int) -> Optional[Match]:
+        block_index = self.block_index(event_id // 100)
+        if block_index is None:
+            return None
+        for match in self.matches(block_index):
+            if match.event_id == event_id:
+                return match
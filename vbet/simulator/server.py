@@ -0,0 +1,285 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+import websockets
+
+from vbet.core import settings
+from vbet.simulator.league import Playlist
+from vbet.utils.log import get_logger
+from vbet.utils.parser import decode_json, encode_json, Resource
+
+logger = get_logger('simulator')
+
+
+class Unit:
+    """
+    Simulated account, keyed by the online hash used to log in.
+    """
+    def __init__(self, unit_id: int, credit: float):
+        self.unit_id: int = unit_id
+        self.credit: float = credit
+        self.tickets: int = 0
+        # ticket id -> (stake, [(playlist_id, event_id, odd_id, odd_value)])
+        self.open_tickets: Dict[int, Tuple[float, list]] = {}
+
+
+class PlaylistClock:
+    """
+    Current block of a playlist.
+
+    On demand blocks are played by the first results request once they are at least block_time old. Scheduled
+    blocks are played every block_time seconds and carry their eventTime.
+    """
+    def __init__(self, playlist: Playlist, start_index: int, block_time: float, scheduled: bool):
+        self.playlist: Playlist = playlist
+        self.start_index: int = start_index
+        self.block_time: float = block_time
+        self.scheduled: bool = scheduled
+        self.start_time: float = time.time()
+        self.current: int = start_index
+        self.current_time: float = self.start_time
+
+    def tick(self):
+        if self.scheduled:
+            current = self.start_index + int((time.time() - self.start_time) / self.block_time)
+            if current != self.current:
+                self.current = current
+                self.current_time = self.start_time + (current - self.start_index) * self.block_time
+
+    @property
+    def event_time(self) -> Optional[int]:
+        if self.scheduled:
+            return int(self.current_time + self.block_time)
+        return None
+
+    async def play(self, block_index: int):
+        self.tick()
+        if block_index != self.current:
+            return
+        delay = self.current_time + self.block_time - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not self.scheduled and block_index == self.current:
+            self.current += 1
+            self.current_time = time.time()
+        self.tick()
+
+
+class ProviderSimulator:
+    """
+    Local stand in for the Golden Race websocket proxy. It answers the frames built by Socket with seeded leagues
+    and injects latency and ticket errors.
+    """
+    def __init__(self, host: str = settings.SIMULATOR_HOST, port: int = settings.SIMULATOR_PORT, seed: int = 0,
+                 block_time: float = 0, scheduled: bool = False, start_week: Optional[int] = None,
+                 latency: Tuple[float, float] = (0, 0), errors: Optional[Dict[int, float]] = None,
+                 credit: float = 100000):
+        self.host: str = host
+        self.port: int = port
+        self.seed: int = seed
+        self.block_time: float = block_time
+        self.scheduled: bool = scheduled
+        self.start_week: Optional[int] = start_week
+        self.latency: Tuple[float, float] = latency
+        self.errors: Dict[int, float] = errors or {}
+        self.credit: float = credit
+        self.rng: random.Random = random.Random(seed)
+        self.clocks: Dict[int, PlaylistClock] = {}
+        self.units: Dict[str, Unit] = {}
+        self.clients: Set[websockets.WebSocketServerProtocol] = set()
+        self.server: Optional[Any] = None
+        self.frames: int = 0
+        self.handlers = {
+            Resource.LOGIN: self.login,
+            Resource.SYNC: self.sync,
+            Resource.EVENTS: self.events,
+            Resource.RESULTS: self.results,
+            Resource.HISTORY: self.history,
+            Resource.STATS: self.stats,
+            Resource.TICKETS: self.tickets,
+            Resource.TICKETS_FIND_BY_ID: self.find_tickets
+        }
+
+    @property
+    def url(self) -> str:
+        return f'ws://{self.host}:{self.port}/vs'
+
+    async def start(self):
+        self.server = await websockets.serve(self.handler, self.host, self.port)
+        if not self.port:
+            self.port = list(self.server.sockets)[0].getsockname()[1]
+        logger.info(f'Simulator listening on {self.url} [seed: {self.seed} block_time: {self.block_time} '
+                    f'scheduled: {self.scheduled}]')
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def get_clock(self, playlist_id: int) -> PlaylistClock:
+        clock = self.clocks.get(playlist_id, None)
+        if clock is None:
+            playlist = Playlist(playlist_id, self.seed)
+            rng = random.Random(f'{self.seed}:{playlist_id}:start')
+            week = self.start_week if self.start_week is not None else rng.randint(1, playlist.max_week)
+            clock = PlaylistClock(playlist, playlist.max_week + week - 1, self.block_time, self.scheduled)
+            self.clocks[playlist_id] = clock
+        clock.tick()
+        return clock
+
+    # Connection
+    async def handler(self, websocket, path: str = None):
+        self.clients.add(websocket)
+        session: Dict = {}
+        try:
+            async for message in websocket:
+                frame = decode_json(message)
+                if not isinstance(frame, dict) or not isinstance(frame.get('req'), dict):
+                    continue
+                self.frames += 1
+                asyncio.ensure_future(self.respond(websocket, session, frame))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(websocket)
+
+    async def respond(self, websocket, session: Dict, frame: Dict):
+        request = frame.get('req')
+        resource = request.get('resource')
+        handler = self.handlers.get(resource, None)
+        if handler is None:
+            return
+        payload = request.get('query') if request.get('method') == 'GET' else request.get('body')
+        valid_response, body = await handler(session, payload or {})
+        low, high = self.latency
+        if high > 0:
+            await asyncio.sleep(self.rng.uniform(low, high))
+        response = {
+            'type': 'RESPONSE',
+            'xs': frame.get('xs'),
+            'ts': int(time.time() * 1000),
+            'res': {'statusCode': 200, 'validResponse': valid_response, 'resource': resource, 'body': body}
+        }
+        try:
+            await websocket.send(encode_json(response))
+        except websockets.ConnectionClosed:
+            pass
+
+    # Resources
+    def session_status(self, unit: Unit) -> Dict:
+        return {'credit': round(unit.credit, 2), 'jackpots': [{'bonusLevel': 0, 'amount': 0.0}]}
+
+    async def login(self, session: Dict, query: Dict) -> Tuple[bool, Any]:
+        online_hash = query.get('onlineHash', None)
+        if not online_hash:
+            return False, {'message': 'Invalid hash'}
+        unit = self.units.get(online_hash, None)
+        if unit is None:
+            unit = Unit(len(self.units) + 1, self.credit)
+            self.units[online_hash] = unit
+        session['unit'] = unit
+        return True, {
+            'clientId': f'sim-{unit.unit_id}-{self.frames}',
+            'sessionStatus': self.session_status(unit),
+            'displays': [{'content': {'playlistId': playlist_id}} for playlist_id in settings.LIVE_GAMES],
+            'gameSettings': [{'gameType': {'val': 'ME'}, 'limits': [{'currencyCode': 'KES', 'maxStake': 20000,
+                                                                     'minStake': 10, 'maxPayout': 200000}]}],
+            'auth': {'unit': {'id': unit.unit_id, 'extId': unit.unit_id, 'name': f'unit{unit.unit_id}'}},
+            'localization': {'currencySett': {'currency': 'KES'}},
+            'taxesSettings': 1,
+            'extData': None,
+            'oddSettingsId': 1
+        }
+
+    async def sync(self, session: Dict, payload: Dict) -> Tuple[bool, Any]:
+        unit = session.get('unit', None)
+        if unit is None:
+            return False, None
+        return True, {'sessionStatus': self.session_status(unit)}
+
+    async def events(self, session: Dict, payload: Dict) -> Tuple[bool, Any]:
+        clock = self.get_clock(payload.get('contentId'))
+        return True, [clock.playlist.block(clock.current, False, clock.event_time)]
+
+    async def results(self, session: Dict, payload: Dict) -> Tuple[bool, Any]:
+        clock = self.get_clock(payload.get('contentId'))
+        block_index = clock.playlist.block_index(payload.get('eBlockId', None))
+        if block_index is None:
+            block_index = clock.current
+        if block_index > clock.current:
+            return False, None
+        if block_index == clock.current:
+            await clock.play(block_index)
+            self.settle(clock, block_index)
+        return True, [clock.playlist.results(block_index)]
+
+    async def history(self, session: Dict, payload: Dict) -> Tuple[bool, Any]:
+        clock = self.get_clock(payload.get('contentId'))
+        block_index = clock.playlist.block_index(payload.get('eBlockId', None))
+        n = payload.get('n') or 0
+        if block_index is None:
+            return False, None
+        if n < 0:
+            indexes = range(block_index - 1, max(-1, block_index + n - 1), -1)
+        else:
+            indexes = range(block_index + 1, block_index + n + 1)
+        return True, [clock.playlist.block(index, index < clock.current) for index in indexes]
+
+    async def stats(self, session: Dict, payload: Dict) -> Tuple[bool, Any]:
+        return True, []
+
+    async def find_tickets(self, session: Dict, payload: Dict) -> Tuple[bool, Any]:
+        return True, []
+
+    async def tickets(self, session: Dict, body: Dict) -> Tuple[bool, Any]:
+        unit = session.get('unit', None)
+        if unit is None:
+            return False, {'errorCode': 500, 'message': 'Not logged in'}
+        for error_code, probability in self.errors.items():
+            if self.rng.random() < probability:
+                return False, {'errorCode': error_code, 'message': 'Injected error'}
+        details = body.get('details', {})
+        events = details.get('events', [])
+        stake = sum(system_bet.get('stake', 0) for system_bet in details.get('systemBets', []))
+        selections = []
+        for event in events:
+            event_id = event.get('eventId')
+            playlist_id = event.get('playlistId')
+            clock = self.clocks.get(playlist_id, None)
+            if clock is not None:
+                clock.tick()
+            if clock is None or clock.playlist.block_index(event_id // 100) != clock.current:
+                return False, {'errorCode': 602, 'message': 'Invalid block'}
+            for bet in event.get('bets', []):
+                selections.append((playlist_id, event_id, str(bet.get('oddId')), bet.get('oddValue')))
+        if not selections:
+            return False, {'errorCode': 603, 'message': 'Invalid ticket'}
+        if stake > unit.credit:
+            return False, {'errorCode': 605, 'message': 'Insufficient credit'}
+        unit.credit -= stake
+        unit.tickets += 1
+        unit.open_tickets[unit.tickets] = (stake, selections)
+        return True, {
+            'ticket': {'ticketId': unit.tickets, 'stake': stake},
+            'transaction': {'newCredit': round(unit.credit, 2)}
+        }
+
+    def settle(self, clock: PlaylistClock, block_index: int):
+        # Accumulators pay the product of the odds, every selection of the played block must be won
+        for unit in self.units.values():
+            for ticket_id, (stake, selections) in list(unit.open_tickets.items()):
+                if not all(playlist_id == clock.playlist.playlist_id and
+                           clock.playlist.block_index(event_id // 100) == block_index
+                           for playlist_id, event_id, odd_id, odd_value in selections):
+                    continue
+                unit.open_tickets.pop(ticket_id)
+                total_odd = 1
+                for playlist_id, event_id, odd_id, odd_value in selections:
+                    match = clock.playlist.find_match(event_id)
+                    if odd_id not in match.result.get('wonMarkets'):
+                        break
+                    total_odd *= odd_value
+                else:
+                    unit.credit += round(stake * total_odd, 2)
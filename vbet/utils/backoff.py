@@ -0,0 +1,21 @@
+import random
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter, attempt n waits between half and all of min(maximum, base * factor ** n).
+    """
+    def __init__(self, base: float, maximum: float, factor: float = 2):
+        self.base: float = base
+        self.maximum: float = maximum
+        self.factor: float = factor
+        self.attempts: int = 0
+
+    def next(self) -> float:
+        delay = min(self.maximum, self.base * self.factor ** self.attempts)
+        if delay < self.maximum:
+            self.attempts += 1
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.attempts = 0
@@ -0,0 +1,78 @@
+"""
+Json codec backends. The fastest installed backend is selected at import, stdlib json is always available.
+Callers should go through the module (codec.loads) so that select_backend() is picked up.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+ORJSON = 'orjson'
+UJSON = 'ujson'
+STDLIB = 'json'
+
+BACKENDS: List[str] = [ORJSON, UJSON, STDLIB]
+
+
+def _orjson_dumps(data: Any) -> bytes:
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _ujson_dumps(data: Any) -> bytes:
+    return ujson.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data).encode('utf-8')
+
+
+_dumps: Dict[str, Callable[[Any], bytes]] = {ORJSON: _orjson_dumps, UJSON: _ujson_dumps, STDLIB: _json_dumps}
+_loads: Dict[str, Callable[[Union[str, bytes]], Any]] = {
+    ORJSON: orjson.loads if orjson else None,
+    UJSON: ujson.loads if ujson else None,
+    STDLIB: json.loads
+}
+
+BACKEND: str = STDLIB
+dumps: Callable[[Any], bytes] = _json_dumps
+loads: Callable[[Union[str, bytes]], Any] = json.loads
+
+
+def available_backends() -> List[str]:
+    return [name for name in BACKENDS if _loads.get(name) is not None]
+
+
+def select_backend(name: Optional[str] = None) -> str:
+    """
+    Switch the module level dumps/loads to the given backend or the fastest installed one.
+    """
+    global BACKEND, dumps, loads
+    backends = available_backends()
+    if name is None:
+        name = backends[0]
+    elif name not in backends:
+        raise ValueError(f'Json backend {name} is not installed')
+    BACKEND = name
+    dumps = _dumps[name]
+    loads = _loads[name]
+    return BACKEND
+
+
+def dumps_str(data: Any) -> str:
+    try:
+        return dumps(data).decode('utf-8')
+    except TypeError:
+        # Objects only the stdlib encoder knows how to handle
+        return json.dumps(data)
+
+
+select_backend()
@@ -68,3 +68,34 @@ class InvalidHistory(VError):
 
     def __str__(self):
         return f'{self.e_block_id} | {self.n | self.retry_count}'
+
+
+class SocketClosed(VError):
+    def __init__(self, socket_id: int, resource: str):
+        self.socket_id: int = socket_id
+        self.resource: str = resource
+
+    def __str__(self):
+        return f'Socket {self.socket_id} closed | {self.resource}'
+
+
+class RequestTimeout(VError):
+    def __init__(self, socket_id: int, xs: int, resource: str, timeout: float):
+        self.socket_id: int = socket_id
+        self.xs: int = xs
+        self.resource: str = resource
+        self.timeout: float = timeout
+
+    def __str__(self):
+        return f'Request {self.xs} {self.resource} timeout after {self.timeout}s on socket {self.socket_id}'
+
+
+class SendFailed(VError):
+    def __init__(self, socket_id: int, xs: int, resource: str, reason: str):
+        self.socket_id: int = socket_id
+        self.xs: int = xs
+        self.resource: str = resource
+        self.reason: str = reason
+
+    def __str__(self):
+        return f'Send {self.xs} {self.resource} failed on socket {self.socket_id} | {self.reason}'
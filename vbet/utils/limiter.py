@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Dict
+
+
+class AimdLimiter:
+    """
+    Token bucket whose refill rate grows additively on healthy responses and shrinks multiplicatively when the
+    provider throttles.
+    """
+    def __init__(self, rate: float, minimum: float, maximum: float, increase: float = 0.05, decrease: float = 0.5,
+                 burst: float = 1):
+        self.rate: float = rate
+        self.minimum: float = minimum
+        self.maximum: float = maximum
+        self.increase: float = increase
+        self.decrease: float = decrease
+        self.burst: float = burst
+        self.tokens: float = burst
+        self.waiting: int = 0
+        self.last_refill: float = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def delay(self) -> float:
+        self.refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self, max_wait: float = float('inf')):
+        """
+        Take a token, waiting at most max_wait for it. A token taken early is borrowed from the next ones.
+        """
+        self.waiting += 1
+        try:
+            deadline = time.monotonic() + max_wait
+            while True:
+                delay = self.delay()
+                remaining = deadline - time.monotonic()
+                if delay <= 0 or remaining <= 0:
+                    break
+                await asyncio.sleep(min(delay, remaining))
+            self.tokens -= 1
+        finally:
+            self.waiting -= 1
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def success(self):
+        self.rate = min(self.maximum, self.rate + self.increase)
+
+    def throttle(self):
+        self.rate = max(self.minimum, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 0)
+
+    @property
+    def stats(self) -> Dict:
+        self.refill()
+        return {'rate': round(self.rate, 3), 'tokens': round(self.tokens, 3), 'waiting': self.waiting}
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Optional
+
+from vbet.core import settings
+from vbet.utils.log import get_logger
+from vbet.utils.metrics import Histogram, registry
+from vbet.utils.profiler import SlowCallbacks
+
+logger = get_logger('loop')
+
+# Seconds a sleep of LOOP_MONITOR_INTERVAL overran, the time ready callbacks waited for the loop
+LOOP_LAG = registry.histogram('loop_lag_seconds', 'Event loop lag', Histogram.FAST_BUCKETS)
+
+SLOW_CALLBACKS = registry.counter('loop_slow_callbacks_total', 'Slow loop callbacks by owner', ['owner'])
+
+SLOW_CALLBACK_TIME = registry.counter('loop_slow_callback_seconds_total', 'Time spent in slow loop callbacks',
+                                      ['owner'])
+
+
+class LoopMonitor:
+    """
+    Continuous loop lag sampler. Callbacks slower than slow_callback are attributed to the coroutine that owns them
+    and its [username:game_id], then logged and counted. Attribution times every callback, unless always on it only
+    runs for window seconds after a lag warning.
+    """
+    def __init__(self, interval: float = settings.LOOP_MONITOR_INTERVAL, lag: float = settings.LOOP_LAG_WARNING,
+                 slow_callback: float = settings.LOOP_SLOW_CALLBACK,
+                 window: float = settings.LOOP_SLOW_CALLBACKS_WINDOW):
+        self.interval: float = interval
+        self.lag_warning: float = lag
+        self.window: float = window
+        self.slow_callbacks: SlowCallbacks = SlowCallbacks(slow_callback, self.on_slow_callback)
+        self.sampler_future: Optional[asyncio.Future] = None
+        self.always_attribute: bool = False
+        self.attribute_until: Optional[float] = None
+        self.lag: float = 0
+        self.max_lag: float = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop, slow_callbacks: bool = False):
+        if self.sampler_future is None:
+            self.sampler_future = loop.create_task(self.sampler())
+        self.always_attribute = slow_callbacks
+        if slow_callbacks:
+            self.slow_callbacks.install()
+
+    def stop(self):
+        self.attribute_until = None
+        self.slow_callbacks.uninstall()
+        if self.sampler_future is not None:
+            self.sampler_future.cancel()
+            self.sampler_future = None
+
+    async def sampler(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                start = loop.time()
+                await asyncio.sleep(self.interval)
+                self.on_lag(max(0.0, loop.time() - start - self.interval))
+        except asyncio.CancelledError:
+            pass
+
+    def on_lag(self, lag: float):
+        self.lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if registry.enabled:
+            LOOP_LAG.observe(lag)
+        if lag > self.lag_warning:
+            logger.warning(f'event loop lag {lag:.3f}s')
+            self.attribute()
+        elif self.attribute_until is not None and time.monotonic() > self.attribute_until:
+            self.attribute_until = None
+            self.slow_callbacks.uninstall()
+            logger.info('slow callback attribution off')
+
+    def attribute(self):
+        if self.always_attribute:
+            return
+        if not self.slow_callbacks.installed:
+            self.slow_callbacks.install()
+            logger.info(f'slow callback attribution on for {self.window}s')
+        self.attribute_until = time.monotonic() + self.window
+
+    def on_slow_callback(self, owner: str, elapsed: float):
+        if registry.enabled:
+            SLOW_CALLBACKS.inc(1, (owner,))
+            SLOW_CALLBACK_TIME.inc(elapsed, (owner,))
+        logger.warning(f'slow callback {owner} blocked the loop for {elapsed:.3f}s')
+
+    @property
+    def stats(self):
+        return {'lag': round(self.lag, 6), 'max_lag': round(self.max_lag, 6),
+                'slow_callbacks': self.slow_callbacks.report(settings.PROFILE_LIMIT)}
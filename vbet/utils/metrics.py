@@ -0,0 +1,186 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from vbet.core import settings
+
+
+class Metric:
+    """
+    Named metric with optional label names, one value is kept per tuple of label values.
+    """
+    kind: str = 'untyped'
+
+    def __init__(self, name: str, description: str = '', labels: Sequence[str] = ()):
+        self.name: str = name
+        self.description: str = description
+        self.labels: Tuple[str, ...] = tuple(labels)
+        self.values: Dict[Tuple, object] = {}
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [(self.name, self.label_map(key), value) for key, value in self.values.items()]
+
+    def label_map(self, key: Tuple) -> Dict[str, str]:
+        return {name: str(value) for name, value in zip(self.labels, key)}
+
+    def snapshot(self) -> Dict:
+        return {'type': self.kind, 'description': self.description,
+                'values': [{'labels': self.label_map(key), 'value': self.snapshot_value(value)}
+                           for key, value in self.values.items()]}
+
+    def snapshot_value(self, value):
+        return value
+
+    def reset(self):
+        self.values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, labels: Tuple = ()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, labels: Tuple = ()) -> float:
+        return self.values.get(labels, 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, labels: Tuple = ()):
+        self.values[labels] = value
+
+    def inc(self, amount: float = 1, labels: Tuple = ()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, labels: Tuple = ()):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def get(self, labels: Tuple = ()) -> float:
+        return self.values.get(labels, 0)
+
+
+class HistogramValue:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        self.counts: List[int] = [0] * size
+        self.sum: float = 0
+        self.count: int = 0
+
+
+class Histogram(Metric):
+    """
+    Cumulative bucket histogram, buckets are upper bounds in seconds with an implicit +Inf bucket.
+    """
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+    def __init__(self, name: str, description: str = '', buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 labels: Sequence[str] = ()):
+        super(Histogram, self).__init__(name, description, labels)
+        self.buckets: Sequence[float] = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Tuple = ()):
+        data = self.values.get(labels, None)
+        if data is None:
+            data = self.values[labels] = HistogramValue(len(self.buckets) + 1)
+        data.counts[bisect_left(self.buckets, value)] += 1
+        data.sum += value
+        data.count += 1
+
+    def get(self, labels: Tuple = ()) -> Optional[HistogramValue]:
+        return self.values.get(labels, None)
+
+    def snapshot_value(self, value: HistogramValue) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ['+Inf'], value.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {'count': value.count, 'sum': value.sum, 'buckets': buckets}
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, value in self.values.items():
+            labels = self.label_map(key)
+            for bound, cumulative in self.snapshot_value(value)['buckets'].items():
+                samples.append((f'{self.name}_bucket', {**labels, 'le': str(bound)}, cumulative))
+            samples.append((f'{self.name}_sum', labels, value.sum))
+            samples.append((f'{self.name}_count', labels, value.count))
+        return samples
+
+
+M = TypeVar('M', bound=Metric)
+
+
+class Registry:
+    """
+    Process wide metrics. Hot paths check enabled before timing anything so a disabled registry costs one
+    attribute lookup.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled: bool = enabled
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        current = self.metrics.get(metric.name, None)
+        if current is not None:
+            if type(current) is not type(metric) or current.labels != metric.labels:
+                raise ValueError(f'Metric {metric.name} already registered as {current.kind} {current.labels}')
+            return current
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str = '', labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str = '', labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str = '', buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS,
+                  labels: Sequence[str] = ()) -> Histogram:
+        return self.register(Histogram(name, description, buckets, labels))
+
+    def snapshot(self) -> Dict:
+        return {name: metric.snapshot() for name, metric in sorted(self.metrics.items())}
+
+    def exposition(self) -> str:
+        # Prometheus text format 0.0.4
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            if metric.description:
+                lines.append(f'# HELP {name} {escape(metric.description, False)}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample_name, labels, value in metric.samples():
+                if labels:
+                    label_str = ','.join(f'{key}="{escape(label, True)}"' for key, label in labels.items())
+                    lines.append(f'{sample_name}{{{label_str}}} {format_value(value)}')
+                else:
+                    lines.append(f'{sample_name} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+
+def escape(value: str, quote: bool) -> str:
+    value = value.replace('\\', '\\\\').replace('\n', '\\n')
+    if quote:
+        value = value.replace('"', '\\"')
+    return value
+
+
+def format_value(value: float) -> str:
+    if isinstance(value, float):
+        if value != value:
+            return 'NaN'
+        if value in (float('inf'), float('-inf')):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+registry = Registry(settings.METRICS)
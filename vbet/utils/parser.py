@@ -1,23 +1,57 @@
-import json
+import asyncio
 import os
-from typing import Dict, Any, Tuple, Optional, Union, List
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 import pytz
 
+from vbet.core import settings
+from vbet.utils import codec
+
+_decode_executor: Optional[Executor] = None
+
 
 def encode_json(data: Dict) -> str:
-    return json.dumps(data)
+    return codec.dumps_str(data)
+
+
+def encode_json_bytes(data: Dict) -> bytes:
+    return codec.dumps(data)
 
 
 def decode_json(data: Any) -> Union[Dict, List, None]:
-    if isinstance(data, str):
+    if isinstance(data, (str, bytes)):
         try:
-            return json.loads(data)
+            return codec.loads(data)
         except ValueError:
             return None
     return None
 
 
+def get_decode_executor() -> Executor:
+    global _decode_executor
+    if _decode_executor is None:
+        if settings.DECODE_EXECUTOR == 'process':
+            _decode_executor = ProcessPoolExecutor(max_workers=settings.DECODE_WORKERS)
+        else:
+            _decode_executor = ThreadPoolExecutor(max_workers=settings.DECODE_WORKERS,
+                                                  thread_name_prefix='decode')
+    return _decode_executor
+
+
+def shutdown_decode_executor():
+    global _decode_executor
+    if _decode_executor is not None:
+        _decode_executor.shutdown(wait=False)
+        _decode_executor = None
+
+
+async def decode_json_pool(data: Any) -> Union[Dict, List, None]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_decode_executor(), decode_json, data)
+
+
 def inspect_ws_server_payload(payload: Dict) -> Optional[Tuple[str, Dict]]:
     uri: Optional[str] = payload.get('uri', None)
     body: Optional[Any] = payload.get('body', None)
@@ -32,13 +66,8 @@ def inspect_websocket_response(payload: Dict) -> Optional[Tuple[int, str, int, b
     valid_response: bool = res.get('validResponse', False)
     resource: Optional[str] = res.get('resource', None)
     body: Optional[Any] = res.get('body', None)
-    _resource: Optional[str] = None
-    for k, v in Resources.items():
-        if v == resource:
-            _resource = k
-            break
+    _resource: Optional[str] = ResourcePaths.get(resource, None)
     if _resource:
-        _resource = resource
         return xs, _resource, status_code, valid_response, body
 
 
@@ -74,5 +103,20 @@ Resources = {
 }
 
 
-def map_resource_to_name(resource: str):
-    return list(Resources.keys())[list(Resources.values()).index(resource)]
+# Reverse registry built once at import. Incoming resource paths are swapped for the interned constants so that
+# later comparisons against Resource.* are identity checks.
+ResourceNames: Dict[str, str] = {sys.intern(path): name for name, path in Resources.items()}
+ResourcePaths: Dict[str, str] = {path: path for path in ResourceNames}
+
+
+def map_resource_to_name(resource: str) -> Optional[str]:
+    return ResourceNames.get(resource, None)
+
+
+def bind_resource_callbacks(target: Any, suffix: str = '_callback') -> Dict[str, Callable]:
+    callbacks = {}
+    for path, name in ResourceNames.items():
+        callback = getattr(target, f'{name}{suffix}', None)
+        if callback is not None:
+            callbacks[path] = callback
+    return callbacks
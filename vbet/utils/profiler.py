@@ -0,0 +1,175 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+from asyncio import events
+from typing import Any, Callable, Dict, List, Optional
+
+from vbet.core import settings
+
+
+def callback_owner(handle: asyncio.Handle, frame: Any = None) -> str:
+    """
+    Name of the coroutine a loop callback steps, or of the callback itself when no task owns it.
+    """
+    callback = handle._callback
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        return coroutine_owner(owner.get_coro(), frame)
+    callback = getattr(callback, 'func', callback)
+    name = getattr(callback, '__qualname__', repr(callback))
+    context = owner_context(getattr(callback, '__self__', None))
+    return f'{name} {context}' if context else name
+
+
+def coroutine_owner(coro: Any, frame: Any = None) -> str:
+    name = getattr(coro, '__qualname__', type(coro).__name__)
+    frame = frame or getattr(coro, 'cr_frame', None)
+    context = owner_context(frame.f_locals.get('self', None)) if frame is not None else ''
+    return f'{name} {context}' if context else name
+
+
+def owner_context(instance: Any) -> str:
+    # [username:game_id] of competitions and players, [username:socket_id] of sockets, as in the logs
+    if instance is None:
+        return ''
+    user = getattr(instance, 'user', None)
+    username = getattr(user, 'username', None) or getattr(instance, 'username', None)
+    key = getattr(instance, 'game_id', None)
+    if key is None:
+        key = getattr(instance, 'socket_id', None)
+    parts = [str(part) for part in (username, key) if part is not None]
+    return f'[{":".join(parts)}]' if parts else ''
+
+
+def task_stats() -> Dict[str, int]:
+    # Alive tasks per coroutine, most common first
+    tasks: Dict[str, int] = {}
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        name = getattr(coro, '__qualname__', type(coro).__name__)
+        tasks[name] = tasks.get(name, 0) + 1
+    return dict(sorted(tasks.items(), key=lambda item: item[1], reverse=True))
+
+
+_handle_run = events.Handle._run
+
+_recorders: List['SlowCallbacks'] = []
+
+
+def _timed_run(handle: asyncio.Handle):
+    # Taken before the step, a coroutine returning in it drops its frame and the owner context with it
+    owner = getattr(handle._callback, '__self__', None)
+    frame = getattr(owner.get_coro(), 'cr_frame', None) if isinstance(owner, asyncio.Task) else None
+    start = time.perf_counter()
+    _handle_run(handle)
+    elapsed = time.perf_counter() - start
+    for recorder in _recorders:
+        if elapsed > recorder.threshold:
+            recorder.record(handle, elapsed, frame)
+
+
+class SlowCallbacks:
+    """
+    Aggregates loop callbacks slower than threshold per owner. Installed recorders share one Handle._run wrapper
+    which is removed with the last of them.
+    """
+    def __init__(self, threshold: float, on_slow: Optional[Callable[[str, float], None]] = None):
+        self.threshold: float = threshold
+        self.on_slow: Optional[Callable[[str, float], None]] = on_slow
+        # owner -> [count, total seconds, max seconds]
+        self.callbacks: Dict[str, List[float]] = {}
+
+    @property
+    def installed(self) -> bool:
+        return self in _recorders
+
+    def install(self):
+        if self not in _recorders:
+            _recorders.append(self)
+            events.Handle._run = _timed_run
+
+    def uninstall(self):
+        if self in _recorders:
+            _recorders.remove(self)
+            if not _recorders:
+                events.Handle._run = _handle_run
+
+    def record(self, handle: asyncio.Handle, elapsed: float, frame: Any = None):
+        owner = callback_owner(handle, frame)
+        data = self.callbacks.get(owner, None)
+        if data is None:
+            self.callbacks[owner] = [1, elapsed, elapsed]
+        else:
+            data[0] += 1
+            data[1] += elapsed
+            data[2] = max(data[2], elapsed)
+        if self.on_slow is not None:
+            self.on_slow(owner, elapsed)
+
+    def report(self, limit: int) -> List[Dict]:
+        slowest = sorted(self.callbacks.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'owner': owner, 'count': count, 'total': round(total, 6), 'max': round(longest, 6)}
+                for owner, (count, total, longest) in slowest]
+
+    def reset(self):
+        self.callbacks.clear()
+
+
+class Profiler:
+    """
+    cProfile session over the running loop, toggled from the control websocket. Slow callbacks are recorded
+    while the session runs.
+    """
+    SORT_KEYS = pstats.Stats.sort_arg_dict_default
+
+    def __init__(self, slow_callback: float = settings.PROFILE_SLOW_CALLBACK):
+        self.profile: Optional[cProfile.Profile] = None
+        self.start_time: Optional[float] = None
+        self.duration: float = 0
+        self.slow_callbacks: SlowCallbacks = SlowCallbacks(slow_callback)
+
+    @property
+    def running(self) -> bool:
+        return self.start_time is not None
+
+    def start(self) -> bool:
+        if self.running:
+            return False
+        self.profile = cProfile.Profile()
+        self.slow_callbacks.reset()
+        self.slow_callbacks.install()
+        self.start_time = time.time()
+        self.duration = 0
+        self.profile.enable()
+        return True
+
+    def stop(self) -> bool:
+        if not self.running:
+            return False
+        self.profile.disable()
+        self.slow_callbacks.uninstall()
+        self.duration = time.time() - self.start_time
+        self.start_time = None
+        return True
+
+    def dump(self, limit: int = settings.PROFILE_LIMIT, sort: str = 'cumulative') -> Dict:
+        report = {
+            'running': self.running,
+            'duration': round(time.time() - self.start_time if self.running else self.duration, 3),
+            'tasks': task_stats(),
+            'slow_callbacks': self.slow_callbacks.report(limit)
+        }
+        if self.profile is not None:
+            # Collecting the stats disables the profiler, a running session is resumed after
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profile, stream=stream)
+            stats.sort_stats(sort if sort in self.SORT_KEYS else 'cumulative').print_stats(limit)
+            path = f'{settings.TMP_DIR}/vbet-{int(time.time())}.prof'
+            stats.dump_stats(path)
+            if self.running:
+                self.profile.enable()
+            report['stats'] = stream.getvalue()
+            report['file'] = path
+        return report